@@ -3,4 +3,6 @@ from core.model.CeleryConfiguration import *
 
 inclModules.append('maxent.model.MaxEntRequestCelery')
 app.conf.include = inclModules
-                       
\ No newline at end of file
+
+# TaskCollector times tasks from the STARTED state, not from submission.
+app.conf.task_track_started = True
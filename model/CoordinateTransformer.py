@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy
+
+from osgeo.osr import CoordinateTransformation
+
+
+# -----------------------------------------------------------------------------
+# class CoordinateTransformer
+#
+# This transforms whole arrays of coordinates with one call into OSR, instead
+# of one SWIG call per point.  Building an osr.CoordinateTransformation is
+# not free, so one is cached for each (source, target) SRS pair.  OSR
+# transformations are not safe to share across threads, so the cache is kept
+# per thread.
+# -----------------------------------------------------------------------------
+class CoordinateTransformer(object):
+
+    # Coordinates are passed to OSR in chunks of this many points, which
+    # bounds the size of the temporary Python lists OSR requires.
+    CHUNK_SIZE = 1000000
+
+    _cache = threading.local()
+
+    # -------------------------------------------------------------------------
+    # transform
+    #
+    # This returns new x and y arrays; the inputs are not modified.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def transform(xs, ys, fromSRS, toSRS):
+
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+
+        if len(xs) != len(ys):
+            raise RuntimeError('X and Y arrays must be the same length.')
+
+        newXs = numpy.empty_like(xs)
+        newYs = numpy.empty_like(ys)
+
+        if not len(xs):
+            return newXs, newYs
+
+        transform = CoordinateTransformer.transformation(fromSRS, toSRS)
+        chunkSize = CoordinateTransformer.CHUNK_SIZE
+
+        for start in range(0, len(xs), chunkSize):
+
+            end = min(start + chunkSize, len(xs))
+
+            points = numpy.column_stack((xs[start:end],
+                                         ys[start:end])).tolist()
+
+            transformed = numpy.array(transform.TransformPoints(points))
+            newXs[start:end] = transformed[:, 0]
+            newYs[start:end] = transformed[:, 1]
+
+        return newXs, newYs
+
+    # -------------------------------------------------------------------------
+    # transformation
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def transformation(fromSRS, toSRS):
+
+        if not hasattr(CoordinateTransformer._cache, 'transforms'):
+            CoordinateTransformer._cache.transforms = {}
+
+        transforms = CoordinateTransformer._cache.transforms
+
+        key = (CoordinateTransformer._srsKey(fromSRS),
+               CoordinateTransformer._srsKey(toSRS))
+
+        if key not in transforms:
+            transforms[key] = CoordinateTransformation(fromSRS, toSRS)
+
+        return transforms[key]
+
+    # -------------------------------------------------------------------------
+    # _srsKey
+    #
+    # GDAL 3 lets an SRS swap its axis order, which changes the result of a
+    # transformation, so the strategy is part of the key.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _srsKey(srs):
+
+        strategy = None
+
+        if hasattr(srs, 'GetAxisMappingStrategy'):
+            strategy = srs.GetAxisMappingStrategy()
+
+        return (srs.ExportToWkt(), strategy)
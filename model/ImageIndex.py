@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+
+from osgeo import gdal
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.ObservationCache import ObservationCache
+
+
+# -----------------------------------------------------------------------------
+# class ImageIndex
+#
+# This keeps the metadata of every image in a directory, so a request can
+# start without opening thousands of files on a network file system.  Each
+# entry holds a file's size, modification time, SRS, bounds, resolution,
+# shape, band count and subdatasets, or the error opening it.
+#
+# update lists the directory, and only opens files that are new or whose
+# size or modification time changed.  The index is saved as JSON in the
+# directory's .maxent_cache, like ObservationCache's entries, or under
+# MAXENT_CACHE_DIR or the temporary directory when that is not writable.
+# -----------------------------------------------------------------------------
+class ImageIndex(object):
+
+    INDEX_FILE = 'images.json'
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, directory, pattern='*.nc'):
+
+        self._directory = os.path.realpath(directory)
+        self._pattern = pattern
+        self._indexPath = self._findIndexPath()
+        self._entries = self._load()
+        self._numOpened = 0
+
+    # -------------------------------------------------------------------------
+    # entries
+    #
+    # This returns file name to metadata for every indexed image.
+    # -------------------------------------------------------------------------
+    def entries(self):
+
+        return self._entries
+
+    # -------------------------------------------------------------------------
+    # _findIndexPath
+    # -------------------------------------------------------------------------
+    def _findIndexPath(self):
+
+        digest = hashlib.sha1(self._directory.encode('utf-8')).hexdigest()
+        name = digest[:16] + '.' + ImageIndex.INDEX_FILE
+
+        if os.environ.get(ObservationCache.CACHE_DIR_ENV):
+
+            return os.path.join(os.environ[ObservationCache.CACHE_DIR_ENV],
+                                'images',
+                                name)
+
+        sidecar = os.path.join(self._directory, ObservationCache.SIDECAR_DIR)
+
+        if os.path.isdir(sidecar) or os.access(self._directory, os.W_OK):
+            return os.path.join(sidecar, ImageIndex.INDEX_FILE)
+
+        return os.path.join(tempfile.gettempdir(),
+                            'maxent_cache',
+                            'images',
+                            name)
+
+    # -------------------------------------------------------------------------
+    # images
+    #
+    # This returns an IndexedImage for each valid image, in file name order,
+    # with its bounds and resolution.  Images without their own SRS, like
+    # MERRA NetCDFs, take defaultSrs.
+    # -------------------------------------------------------------------------
+    def images(self, defaultSrs):
+
+        self.validate()
+
+        return [IndexedImage(os.path.join(self._directory, name),
+                             self._entries[name]['srs'] or
+                             defaultSrs.ExportToWkt(),
+                             self._entries[name]['bounds'],
+                             self._entries[name]['resolution'])
+                for name in sorted(self._entries)]
+
+    # -------------------------------------------------------------------------
+    # indexPath
+    # -------------------------------------------------------------------------
+    def indexPath(self):
+
+        return self._indexPath
+
+    # -------------------------------------------------------------------------
+    # _load
+    # -------------------------------------------------------------------------
+    def _load(self):
+
+        try:
+            with open(self._indexPath) as indexFile:
+                index = json.load(indexFile)
+
+            if index['version'] == ImageIndex.VERSION and \
+               index['directory'] == self._directory:
+
+                return index['entries']
+
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        return {}
+
+    # -------------------------------------------------------------------------
+    # numOpened
+    #
+    # This is the number of files the last update opened.
+    # -------------------------------------------------------------------------
+    def numOpened(self):
+
+        return self._numOpened
+
+    # -------------------------------------------------------------------------
+    # readMetadata
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def readMetadata(path):
+
+        dataset = gdal.Open(path)
+
+        if dataset is None:
+            return {'error': 'Unable to open ' + path}
+
+        geoTransform = dataset.GetGeoTransform()
+        cols = dataset.RasterXSize
+        rows = dataset.RasterYSize
+
+        return {'srs': dataset.GetProjection() or None,
+                'bounds': [geoTransform[0],
+                           geoTransform[3],
+                           geoTransform[0] + cols * geoTransform[1],
+                           geoTransform[3] + rows * geoTransform[5]],
+                'resolution': [geoTransform[1], abs(geoTransform[5])],
+                'cols': cols,
+                'rows': rows,
+                'bands': dataset.RasterCount,
+                'subdatasets': [name for name, desc in
+                                dataset.GetSubDatasets()]}
+
+    # -------------------------------------------------------------------------
+    # _save
+    #
+    # Failing to write the index is not an error; the next update opens the
+    # files again.
+    # -------------------------------------------------------------------------
+    def _save(self):
+
+        index = {'version': ImageIndex.VERSION,
+                 'directory': self._directory,
+                 'entries': self._entries}
+
+        tempPath = self._indexPath + '.' + str(os.getpid()) + '.tmp'
+
+        try:
+            if not os.path.isdir(os.path.dirname(self._indexPath)):
+                os.makedirs(os.path.dirname(self._indexPath))
+
+            with open(tempPath, 'w') as indexFile:
+                json.dump(index, indexFile)
+
+            os.rename(tempPath, self._indexPath)
+
+        except (IOError, OSError):
+            pass
+
+    # -------------------------------------------------------------------------
+    # update
+    #
+    # This brings the index up to date with the directory, opening only new
+    # and changed files, and returns the index.
+    # -------------------------------------------------------------------------
+    def update(self):
+
+        entries = {}
+        self._numOpened = 0
+
+        for dirEntry in os.scandir(self._directory):
+
+            if not dirEntry.is_file() or \
+               not fnmatch.fnmatch(dirEntry.name, self._pattern):
+
+                continue
+
+            fileStat = dirEntry.stat()
+            entry = self._entries.get(dirEntry.name)
+
+            if entry is None or entry['size'] != fileStat.st_size or \
+               entry['mtime'] != fileStat.st_mtime:
+
+                entry = ImageIndex.readMetadata(dirEntry.path)
+                entry['size'] = fileStat.st_size
+                entry['mtime'] = fileStat.st_mtime
+                self._numOpened += 1
+
+            entries[dirEntry.name] = entry
+
+        changed = entries != self._entries
+        self._entries = entries
+
+        if changed:
+            self._save()
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # validate
+    #
+    # This raises an error naming every image that could not be opened or
+    # has no raster band, like a NetCDF file of several variables, whose
+    # subdatasets must be named instead.
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        if not self._entries:
+
+            raise RuntimeError('No images match ' + self._pattern + ' in ' +
+                               self._directory)
+
+        invalid = []
+
+        for name in sorted(self._entries):
+
+            entry = self._entries[name]
+
+            if 'error' in entry:
+                invalid.append(name + ': ' + entry['error'])
+
+            elif not entry['bands']:
+
+                invalid.append(name + ': no raster bands; subdatasets ' +
+                               ', '.join(entry['subdatasets']))
+
+        if invalid:
+            raise RuntimeError('Invalid images: ' + '; '.join(invalid))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.CoordinateTransformer import CoordinateTransformer
+
+
+# -----------------------------------------------------------------------------
+# class IndexedImage
+#
+# This stands in for a GeospatialImageFile built from an ImageIndex entry.
+# It offers the fileName and srs requests use, without opening the file,
+# which is only read when its layer is prepared.  The SRS is kept as WKT, so
+# it pickles for process pools.
+#
+# The entry's bounds and resolution, when given, let TargetGrid plan the
+# grid without opening the image either.
+# -----------------------------------------------------------------------------
+class IndexedImage(object):
+
+    # Points transformed along each edge of the bounds to estimate the
+    # resolution in another SRS
+    EDGE_POINTS = 21
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # bounds is [ulx, uly, lrx, lry] and resolution is [x, y], in the image's
+    # SRS, as in ImageIndex entries.
+    # -------------------------------------------------------------------------
+    def __init__(self, path, srsWkt, bounds=None, resolution=None):
+
+        self._path = path
+        self._srsWkt = srsWkt
+        self._bounds = bounds
+        self._resolution = resolution
+
+    # -------------------------------------------------------------------------
+    # bounds
+    # -------------------------------------------------------------------------
+    def bounds(self):
+
+        return self._bounds
+
+    # -------------------------------------------------------------------------
+    # fileName
+    # -------------------------------------------------------------------------
+    def fileName(self):
+
+        return self._path
+
+    # -------------------------------------------------------------------------
+    # naturalResolution
+    #
+    # This returns the square cell size of the image in srs, or None without
+    # bounds and resolution.  In its own SRS, that is the finer of its two
+    # cell sizes.  In another, it is estimated like GDAL's suggested warp
+    # output: the diagonal of the transformed bounds over the diagonal of
+    # the image in cells.
+    # -------------------------------------------------------------------------
+    def naturalResolution(self, srs):
+
+        if not self._bounds or not self._resolution:
+            return None
+
+        if srs.IsSame(self.srs()):
+            return min(abs(self._resolution[0]), abs(self._resolution[1]))
+
+        ulx, uly, lrx, lry = self._bounds
+        steps = numpy.linspace(0, 1, IndexedImage.EDGE_POINTS)
+        edgeXs = ulx + steps * (lrx - ulx)
+        edgeYs = uly + steps * (lry - uly)
+
+        xs = numpy.r_[edgeXs, edgeXs, numpy.full(len(steps), ulx),
+                      numpy.full(len(steps), lrx)]
+
+        ys = numpy.r_[numpy.full(len(steps), uly),
+                      numpy.full(len(steps), lry), edgeYs, edgeYs]
+
+        xs, ys = CoordinateTransformer.transform(xs, ys, self.srs(), srs)
+
+        cols = abs(lrx - ulx) / abs(self._resolution[0])
+        rows = abs(uly - lry) / abs(self._resolution[1])
+
+        return math.hypot(xs.max() - xs.min(), ys.max() - ys.min()) / \
+            math.hypot(cols, rows)
+
+    # -------------------------------------------------------------------------
+    # resolution
+    # -------------------------------------------------------------------------
+    def resolution(self):
+
+        return self._resolution
+
+    # -------------------------------------------------------------------------
+    # srs
+    # -------------------------------------------------------------------------
+    def srs(self):
+
+        srs = SpatialReference()
+        srs.ImportFromWkt(self._srsWkt)
+
+        return srs
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+
+from maxent.model.SwdSampler import SwdSampler
+from maxent.model.TargetGrid import TargetGrid
+
+
+# -----------------------------------------------------------------------------
+# class JvmPlanner
+#
+# This chooses maxent.jar's heap size, -Xmx, and its threads= option.  The
+# heap estimate is based on what maxent.jar holds in memory:
+#
+# - every layer, as 4-byte floats, unless it reads samples with data;
+# - a feature vector for each sample and background point, which grows with
+#   the number of layers;
+# - a fixed base for the JVM itself.
+#
+# The estimate is scaled by HEADROOM.  Threads are divided evenly among
+# concurrent JVMs.  Either choice may be overridden; an overridden heap
+# below the estimate is used as given, with a warning.  plan refuses a run
+# that would not fit in the host's available memory, so it fails before
+# the JVM starts rather than with an OutOfMemoryError hours in.
+# -----------------------------------------------------------------------------
+class JvmPlanner(object):
+
+    BASE_MB = 256
+    BYTES_PER_CELL = 4
+    BYTES_PER_POINT_LAYER = 160
+    HEADROOM = 1.5
+    MIN_HEAP_MB = 512
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # heapMb and threads, when given, override the planned values.
+    # -------------------------------------------------------------------------
+    def __init__(self, heapMb=None, threads=None):
+
+        self._heapMb = heapMb
+        self._threads = threads
+
+    # -------------------------------------------------------------------------
+    # availableMb
+    #
+    # This is the memory available to new processes, from MemAvailable on
+    # Linux or free pages elsewhere.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def availableMb():
+
+        try:
+            with open('/proc/meminfo') as memInfo:
+
+                for line in memInfo:
+
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) // 1024
+
+        except (IOError, OSError):
+            pass
+
+        return os.sysconf('SC_AVPHYS_PAGES') * \
+            os.sysconf('SC_PAGE_SIZE') // (1024 ** 2)
+
+    # -------------------------------------------------------------------------
+    # estimateMb
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def estimateMb(numCells, numLayers, numPoints):
+
+        numBytes = numCells * numLayers * JvmPlanner.BYTES_PER_CELL + \
+            numPoints * numLayers * JvmPlanner.BYTES_PER_POINT_LAYER
+
+        estimate = JvmPlanner.BASE_MB + \
+            int(numBytes * JvmPlanner.HEADROOM / 1024 ** 2)
+
+        return max(JvmPlanner.MIN_HEAP_MB, estimate)
+
+    # -------------------------------------------------------------------------
+    # gridShape
+    #
+    # This reads the rows and columns from an ASCII grid's header, without
+    # reading its data.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gridShape(ascPath):
+
+        header = TargetGrid.readHeader(ascPath)
+
+        return int(header['nrows']), int(header['ncols'])
+
+    # -------------------------------------------------------------------------
+    # plan
+    #
+    # This returns (heapMb, threads, numJvms) for numJvms concurrent
+    # maxent.jar processes modeling numSamples presence points on the layers.
+    # When loadGrids is false, maxent.jar reads samples with data and holds
+    # only the points.  With fitJvms, numJvms is a maximum, and fewer JVMs
+    # run when that many would not fit.
+    # -------------------------------------------------------------------------
+    def plan(self,
+             layerPaths,
+             numSamples,
+             numJvms=1,
+             numBackground=SwdSampler.DEFAULT_NUM_BACKGROUND,
+             loadGrids=True,
+             fitJvms=False):
+
+        if not layerPaths:
+            raise RuntimeError('There are no layers to plan for.')
+
+        numLayers = len(layerPaths)
+        rows, cols = JvmPlanner.gridShape(layerPaths[0])
+        numCells = rows * cols if loadGrids else 0
+
+        estimateMb = JvmPlanner.estimateMb(numCells,
+                                           numLayers,
+                                           numSamples + numBackground)
+
+        heapMb = self._heapMb or estimateMb
+        availableMb = JvmPlanner.availableMb()
+        numJvms = max(numJvms, 1)
+
+        if fitJvms:
+            numJvms = max(1, min(numJvms, availableMb // heapMb))
+
+        threads = self._threads or \
+            max(1, multiprocessing.cpu_count() // numJvms)
+
+        print('JVM plan: ' + str(numJvms) + ' x -Xmx' + str(heapMb) +
+              'm threads=' + str(threads) + ' for ' + str(numLayers) +
+              ' layers of ' + str(rows) + ' x ' + str(cols) + ' and ' +
+              str(numSamples) + ' samples; estimated ' + str(estimateMb) +
+              ' MB each, ' + str(availableMb) + ' MB available')
+
+        # An explicit heap is the user's call, even below the estimate.
+        if heapMb < estimateMb:
+
+            print('Warning: a heap of ' + str(heapMb) + ' MB is less than ' +
+                  'the ' + str(estimateMb) + ' MB maxent.jar is estimated ' +
+                  'to need.')
+
+        if heapMb * numJvms > availableMb:
+
+            raise RuntimeError(str(numJvms) + ' JVMs of ' + str(heapMb) +
+                               ' MB will not fit in the ' +
+                               str(availableMb) + ' MB available.  Use ' +
+                               'fewer layers, a smaller envelope or fewer ' +
+                               'concurrent JVMs.')
+
+        return heapMb, threads, numJvms
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from maxent.model.LayerPreparer import LayerPreparer
+
+
+# -----------------------------------------------------------------------------
+# class LayerCache
+#
+# This is a content-addressed cache of prepared layers shared by requests
+# and workers.  An entry is keyed on the source file's identity (real path,
+# size and modification time), the target SRS, the envelope, the resolution
+# and the no-data policy, so a layer prepared for another envelope or SRS is
+# never reused by mistake.  Requests link cached layers into their asc
+# directories instead of preparing them again.
+#
+# Each entry is a directory holding layer.asc and its sidecar files.  Entries
+# are built in a temporary directory and renamed into place while holding a
+# per-key lock, so concurrent workers preparing the same layer do the work
+# once.  When the cache grows beyond its size limit, the least recently used
+# entries are removed.  Layers already linked into asc directories survive
+# eviction when hard links are possible.
+#
+# The cache directory must be on a file system every worker can reach.
+# -----------------------------------------------------------------------------
+class LayerCache(object):
+
+    CACHE_DIR_ENV = 'MAXENT_LAYER_CACHE'
+    DEFAULT_MAX_BYTES = 50 * 1024 ** 3
+    LAYER_FILE = 'layer.asc'
+    LOCK_DIR = '.locks'
+    META_FILE = 'meta.json'
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, cacheDir=None, maxBytes=DEFAULT_MAX_BYTES):
+
+        if not cacheDir:
+
+            cacheDir = os.environ.get(LayerCache.CACHE_DIR_ENV) or \
+                os.path.join(os.path.expanduser('~'),
+                             '.cache',
+                             'maxent',
+                             'layers')
+
+        self._cacheDir = cacheDir
+        self._maxBytes = maxBytes
+        self._hits = 0
+        self._misses = 0
+
+        for path in (self._cacheDir,
+                     os.path.join(self._cacheDir, LayerCache.LOCK_DIR)):
+
+            try:
+                os.makedirs(path)
+
+            except OSError:
+
+                # Do not complain, if the directory exists.
+                if not os.path.isdir(path):
+                    raise
+
+    # -------------------------------------------------------------------------
+    # addCounts
+    #
+    # This adds hits and misses counted by another copy of this cache, like
+    # one in a worker process.
+    # -------------------------------------------------------------------------
+    def addCounts(self, hits, misses):
+
+        self._hits += hits
+        self._misses += misses
+
+    # -------------------------------------------------------------------------
+    # cacheDir
+    # -------------------------------------------------------------------------
+    def cacheDir(self):
+
+        return self._cacheDir
+
+    # -------------------------------------------------------------------------
+    # contains
+    # -------------------------------------------------------------------------
+    def contains(self, key):
+
+        return os.path.exists(self.entryPath(key))
+
+    # -------------------------------------------------------------------------
+    # entryDir
+    # -------------------------------------------------------------------------
+    def entryDir(self, key):
+
+        return os.path.join(self._cacheDir, key)
+
+    # -------------------------------------------------------------------------
+    # entryPath
+    # -------------------------------------------------------------------------
+    def entryPath(self, key, fileName=LAYER_FILE):
+
+        return os.path.join(self.entryDir(key), fileName)
+
+    # -------------------------------------------------------------------------
+    # evict
+    #
+    # This removes the least recently used entries until the cache fits in
+    # its size limit.  The entry named by keep is never removed.
+    # -------------------------------------------------------------------------
+    def evict(self, keep=None):
+
+        with self._lock('evict'):
+
+            entries = []
+            totalBytes = 0
+
+            for key in os.listdir(self._cacheDir):
+
+                entryDir = self.entryDir(key)
+
+                if key.startswith('.') or not os.path.isdir(entryDir):
+                    continue
+
+                size = sum(os.path.getsize(os.path.join(entryDir, f))
+                           for f in os.listdir(entryDir))
+
+                entries.append((os.path.getmtime(entryDir), key, size))
+                totalBytes += size
+
+            for mtime, key, size in sorted(entries):
+
+                if totalBytes <= self._maxBytes:
+                    break
+
+                if key == keep:
+                    continue
+
+                with self._lock(key):
+                    shutil.rmtree(self.entryDir(key), ignore_errors=True)
+
+                totalBytes -= size
+
+    # -------------------------------------------------------------------------
+    # hits
+    # -------------------------------------------------------------------------
+    def hits(self):
+
+        return self._hits
+
+    # -------------------------------------------------------------------------
+    # key
+    #
+    # Resolution None means the square cell size LayerPreparer chooses.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def key(imagePath, srs, envelope, resolution=None):
+
+        realPath = os.path.realpath(imagePath)
+        fileStat = os.stat(realPath)
+
+        identity = json.dumps([LayerCache.VERSION,
+                               realPath,
+                               fileStat.st_size,
+                               fileStat.st_mtime,
+                               srs.ExportToWkt(),
+                               [envelope.ulx(),
+                                envelope.uly(),
+                                envelope.lrx(),
+                                envelope.lry()],
+                               resolution,
+                               LayerPreparer.NO_DATA])
+
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    # -------------------------------------------------------------------------
+    # link
+    #
+    # This hard links a cached file to path, falling back to a symbolic link
+    # across file systems.  An existing file at path is replaced.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def link(cachedPath, path):
+
+        if os.path.lexists(path):
+            os.remove(path)
+
+        try:
+            os.link(cachedPath, path)
+
+        except OSError:
+            os.symlink(os.path.abspath(cachedPath), path)
+
+    # -------------------------------------------------------------------------
+    # _lock
+    # -------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _lock(self, name):
+
+        lockPath = os.path.join(self._cacheDir,
+                                LayerCache.LOCK_DIR,
+                                name + '.lock')
+
+        with open(lockPath, 'a') as lockFile:
+
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+
+            try:
+                yield
+
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    # -------------------------------------------------------------------------
+    # maxBytes
+    # -------------------------------------------------------------------------
+    def maxBytes(self):
+
+        return self._maxBytes
+
+    # -------------------------------------------------------------------------
+    # misses
+    # -------------------------------------------------------------------------
+    def misses(self):
+
+        return self._misses
+
+    # -------------------------------------------------------------------------
+    # prepare
+    #
+    # This links the cached layer for these inputs to ascImagePath, preparing
+    # and caching it first on a miss.
+    # -------------------------------------------------------------------------
+    def prepare(self, imagePath, srs, envelope, ascImagePath, resolution=None):
+
+        key = LayerCache.key(imagePath, srs, envelope, resolution)
+        entryDir = self.entryDir(key)
+
+        with self._lock(key):
+
+            if os.path.isdir(entryDir):
+
+                self._hits += 1
+
+                # Touch the entry for LRU eviction.
+                os.utime(entryDir, None)
+
+            else:
+
+                self._misses += 1
+                tempDir = tempfile.mkdtemp(prefix='.' + key,
+                                           dir=self._cacheDir)
+
+                try:
+                    LayerPreparer.prepare(
+                        imagePath,
+                        srs,
+                        envelope,
+                        os.path.join(tempDir, LayerCache.LAYER_FILE),
+                        resolution)
+
+                    with open(os.path.join(tempDir, LayerCache.META_FILE),
+                              'w') as metaFile:
+
+                        json.dump({'source': os.path.realpath(imagePath),
+                                   'created': time.time()},
+                                  metaFile)
+
+                    os.rename(tempDir, entryDir)
+
+                except Exception:
+
+                    shutil.rmtree(tempDir, ignore_errors=True)
+                    raise
+
+            LayerCache.link(self.entryPath(key), ascImagePath)
+            prjPath = self.entryPath(key, 'layer.prj')
+
+            if os.path.exists(prjPath):
+
+                LayerCache.link(prjPath,
+                                os.path.splitext(ascImagePath)[0] + '.prj')
+
+        if self._maxBytes is not None:
+            self.evict(keep=key)
+
+        return ascImagePath
+
+    # -------------------------------------------------------------------------
+    # report
+    # -------------------------------------------------------------------------
+    def report(self):
+
+        return 'Layer cache ' + self._cacheDir + ': ' + \
+               str(self._hits) + ' hits, ' + \
+               str(self._misses) + ' misses'
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import uuid
+
+import numpy
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from maxent.model.RunTrace import RunTrace
+
+
+# -----------------------------------------------------------------------------
+# class LayerPreparer
+#
+# This prepares one environmental layer for maxent.jar in a single streaming
+# pass.  The source is never copied.  Instead, GDAL warps it into a virtual
+# (VRT) dataset clipped to the observation envelope, reprojected and
+# resampled to square cells.  Reading the VRT block by block pulls only the
+# source pixels inside the envelope, and each block is written straight to a
+# Float32 ASCII grid with NaNs already mapped to the no-data value.
+#
+# This replaces copying the source, clipping, resampling, running
+# gdal_translate and rewriting the ASCII grid to fix NaNs, which were five
+# full passes over each layer.
+#
+# A very large layer may instead be prepared in tiles of whole rows, each by
+# a different process, then mosaicked.  Tiles are multiples of BLOCK_ROWS,
+# so they read exactly the windows a whole-layer pass does, and the mosaic
+# is identical to the whole layer.
+# -----------------------------------------------------------------------------
+class LayerPreparer(object):
+
+    BLOCK_ROWS = 256
+    NO_DATA = -9999.0
+
+    # -------------------------------------------------------------------------
+    # mosaic
+    #
+    # This writes the grid header, then the tiles in order, and removes the
+    # tiles.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def mosaic(imagePath,
+               srs,
+               envelope,
+               tilePaths,
+               ascImagePath,
+               resolution=None):
+
+        with RunTrace.stage('mosaicTiles', image=imagePath):
+
+            warped = LayerPreparer.warp(imagePath, srs, envelope, resolution)
+            tempPath = LayerPreparer.tempPath(ascImagePath)
+
+            with open(tempPath, 'w') as ascFile:
+
+                LayerPreparer.writeAsciiHeader(ascFile,
+                                               warped.RasterXSize,
+                                               warped.RasterYSize,
+                                               warped.GetGeoTransform())
+
+                for tilePath in tilePaths:
+
+                    with open(tilePath) as tileFile:
+                        shutil.copyfileobj(tileFile, ascFile)
+
+            os.rename(tempPath, ascImagePath)
+
+            LayerPreparer.writePrj(warped.GetProjection(), ascImagePath)
+
+            for tilePath in tilePaths:
+                os.remove(tilePath)
+
+        return ascImagePath
+
+    # -------------------------------------------------------------------------
+    # naturalResolution
+    #
+    # This is the cell size GDAL chooses to reproject the image to srs within
+    # the envelope, squared to the finer of its two sizes.  Only metadata is
+    # read.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def naturalResolution(imagePath, srs, envelope):
+
+        source = LayerPreparer._open(imagePath)
+
+        clipped = gdal.Warp('',
+                            source,
+                            format='VRT',
+                            srcSRS=LayerPreparer._sourceSrs(source, srs),
+                            dstSRS=srs.ExportToWkt(),
+                            outputBounds=LayerPreparer._outputBounds(envelope))
+
+        return LayerPreparer.squareScale(clipped.GetGeoTransform())
+
+    # -------------------------------------------------------------------------
+    # _open
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _open(imagePath):
+
+        source = gdal.Open(imagePath)
+
+        if source is None:
+            raise RuntimeError('Unable to open ' + str(imagePath))
+
+        return source
+
+    # -------------------------------------------------------------------------
+    # _outputBounds
+    #
+    # This returns an envelope as GDAL's (minX, minY, maxX, maxY).
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _outputBounds(envelope):
+
+        return (envelope.ulx(), envelope.lry(), envelope.lrx(), envelope.uly())
+
+    # -------------------------------------------------------------------------
+    # prepare
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def prepare(imagePath, srs, envelope, ascImagePath, resolution=None):
+
+        with RunTrace.stage('prepareLayer', image=imagePath):
+
+            warped = LayerPreparer.warp(imagePath, srs, envelope, resolution)
+            LayerPreparer.writeAsciiGrid(warped, ascImagePath)
+
+    # -------------------------------------------------------------------------
+    # prepareTile
+    #
+    # This writes numRows rows of the prepared layer, starting at row, as
+    # headerless ASCII grid rows.  See mosaic.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def prepareTile(imagePath,
+                    srs,
+                    envelope,
+                    tilePath,
+                    row,
+                    numRows,
+                    resolution=None):
+
+        with RunTrace.stage('prepareTile', image=imagePath, row=row):
+
+            warped = LayerPreparer.warp(imagePath, srs, envelope, resolution)
+            tempPath = LayerPreparer.tempPath(tilePath)
+
+            with open(tempPath, 'w') as tileFile:
+                LayerPreparer.writeAsciiRows(warped, tileFile, row, numRows)
+
+            os.rename(tempPath, tilePath)
+
+        return tilePath
+
+    # -------------------------------------------------------------------------
+    # _sourceSrs
+    #
+    # Files like MERRA NetCDFs carry no SRS; they are in the request's.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _sourceSrs(source, srs):
+
+        if not source.GetProjection():
+            return srs.ExportToWkt()
+
+        return None
+
+    # -------------------------------------------------------------------------
+    # squareScale
+    #
+    # This returns the finer of the two cell sizes in a geotransform, so the
+    # resampled cells are square.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def squareScale(geoTransform):
+
+        return min(abs(geoTransform[1]), abs(geoTransform[5]))
+
+    # -------------------------------------------------------------------------
+    # tempPath
+    #
+    # This returns a unique temporary name beside a path, so concurrent
+    # copies of a task, as when a straggler is resubmitted, never write the
+    # same file.  The last rename wins, and every copy writes the same grid.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tempPath(path):
+
+        return path + '.' + uuid.uuid4().hex + '.tmp'
+
+    # -------------------------------------------------------------------------
+    # tileRanges
+    #
+    # This returns the (row, numRows) of each tile of a grid.  The tile size
+    # is rounded up to a multiple of BLOCK_ROWS.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tileRanges(rows, tileRows):
+
+        blocks = max(1, -(-tileRows // LayerPreparer.BLOCK_ROWS))
+        tileRows = blocks * LayerPreparer.BLOCK_ROWS
+
+        return [(row, min(tileRows, rows - row))
+                for row in range(0, rows, tileRows)]
+
+    # -------------------------------------------------------------------------
+    # warp
+    #
+    # This returns a virtual dataset of the image clipped to the envelope,
+    # reprojected to srs and resampled to square cells.  The cell size is
+    # resolution, when given, or else naturalResolution.  With a TargetGrid's
+    # envelope and resolution, the dataset is exactly that grid.  No pixels
+    # are read until the dataset is.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def warp(imagePath, srs, envelope, resolution=None):
+
+        with RunTrace.step('open'):
+            source = LayerPreparer._open(imagePath)
+
+        scale = resolution
+
+        if not scale:
+            scale = LayerPreparer.naturalResolution(imagePath, srs, envelope)
+
+        # Sources without a no-data value use NaN for missing data.
+        srcNodata = None
+
+        if source.GetRasterBand(1).GetNoDataValue() is None:
+            srcNodata = 'nan'
+
+        with RunTrace.step('warp'):
+
+            return gdal.Warp(
+                '',
+                source,
+                format='VRT',
+                srcSRS=LayerPreparer._sourceSrs(source, srs),
+                dstSRS=srs.ExportToWkt(),
+                outputBounds=LayerPreparer._outputBounds(envelope),
+                xRes=scale,
+                yRes=scale,
+                outputType=gdal.GDT_Float32,
+                srcNodata=srcNodata,
+                dstNodata=LayerPreparer.NO_DATA)
+
+    # -------------------------------------------------------------------------
+    # writeAsciiGrid
+    #
+    # This writes band 1 of a dataset as an ESRI ASCII grid, reading
+    # BLOCK_ROWS rows at a time.  The grid is written to a temporary file then
+    # renamed, so a partly written grid never appears under its final name.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def writeAsciiGrid(dataset, ascImagePath):
+
+        cols = dataset.RasterXSize
+        rows = dataset.RasterYSize
+        geoTransform = dataset.GetGeoTransform()
+        tempPath = LayerPreparer.tempPath(ascImagePath)
+
+        with open(tempPath, 'w') as ascFile:
+
+            LayerPreparer.writeAsciiHeader(ascFile, cols, rows, geoTransform)
+            LayerPreparer.writeAsciiRows(dataset, ascFile, 0, rows)
+
+        os.rename(tempPath, ascImagePath)
+
+        LayerPreparer.writePrj(dataset.GetProjection(), ascImagePath)
+
+    # -------------------------------------------------------------------------
+    # fixNoData
+    #
+    # This returns a Float32 copy of a block with NaNs and the band's own
+    # no-data value replaced by NO_DATA.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def fixNoData(block, bandNoData=None):
+
+        block = block.astype(numpy.float32)
+        missing = numpy.isnan(block)
+
+        if bandNoData is not None and not numpy.isnan(bandNoData):
+            missing |= block == numpy.float32(bandNoData)
+
+        block[missing] = LayerPreparer.NO_DATA
+
+        return block
+
+    # -------------------------------------------------------------------------
+    # writeAsciiBlock
+    #
+    # This writes rows of a grid whose no-data values are already NO_DATA.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def writeAsciiBlock(ascFile, block):
+
+        numpy.savetxt(ascFile, block, fmt='%.9g', delimiter=' ')
+
+    # -------------------------------------------------------------------------
+    # writeAsciiHeader
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def writeAsciiHeader(ascFile, cols, rows, geoTransform):
+
+        ascFile.write('ncols        ' + str(cols) + '\n')
+        ascFile.write('nrows        ' + str(rows) + '\n')
+        ascFile.write('xllcorner    ' + repr(geoTransform[0]) + '\n')
+
+        ascFile.write('yllcorner    ' +
+                      repr(geoTransform[3] + rows * geoTransform[5]) +
+                      '\n')
+
+        ascFile.write('cellsize     ' + repr(geoTransform[1]) + '\n')
+
+        ascFile.write('NODATA_value ' +
+                      '%.9g' % LayerPreparer.NO_DATA +
+                      '\n')
+
+    # -------------------------------------------------------------------------
+    # writeAsciiRows
+    #
+    # This writes numRows rows of band 1, starting at firstRow, reading
+    # BLOCK_ROWS rows at a time.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def writeAsciiRows(dataset, ascFile, firstRow, numRows):
+
+        band = dataset.GetRasterBand(1)
+        cols = dataset.RasterXSize
+        bandNoData = band.GetNoDataValue()
+        endRow = firstRow + numRows
+
+        for row in range(firstRow, endRow, LayerPreparer.BLOCK_ROWS):
+
+            blockRows = min(LayerPreparer.BLOCK_ROWS, endRow - row)
+
+            # Reading the warped dataset reprojects and resamples the block.
+            with RunTrace.step('readResample'):
+                block = band.ReadAsArray(0, row, cols, blockRows)
+
+            with RunTrace.step('fixNoData'):
+                block = LayerPreparer.fixNoData(block, bandNoData)
+
+            with RunTrace.step('writeAscii'):
+                LayerPreparer.writeAsciiBlock(ascFile, block)
+
+    # -------------------------------------------------------------------------
+    # writePrj
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def writePrj(wkt, ascImagePath):
+
+        if not wkt:
+            return
+
+        srs = SpatialReference()
+        srs.ImportFromWkt(wkt)
+        srs.MorphToESRI()
+
+        with open(os.path.splitext(ascImagePath)[0] + '.prj', 'w') as prj:
+            prj.write(srs.ExportToWkt())
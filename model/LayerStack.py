@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import uuid
+
+import numpy
+
+from osgeo import gdal
+
+from maxent.model.LayerPreparer import LayerPreparer
+
+
+# -----------------------------------------------------------------------------
+# class LayerStack
+#
+# This holds a request's prepared layers as one aligned binary stack, so
+# Python-side work on them, like sampling points or projecting a model,
+# never parses the ASCII grids again.  A stack is a directory of:
+#
+# - layers.npy: a layers x rows x cols Float32 array, with no data as
+#               LayerPreparer.NO_DATA, in the layers' sorted name order
+# - mask.npy:   a rows x cols boolean array of the cells with data in every
+#               layer
+# - stack.json: the layer names, geotransform and SRS
+#
+# The arrays are .npy files opened as read-only memory maps, so any number
+# of processes can open a stack without copying it: they share the
+# operating system's cached pages, and reading a window or a set of cells
+# only touches the pages holding them.
+#
+# A stack is written to a temporary directory then renamed into place, so
+# readers never see a partial stack.
+# -----------------------------------------------------------------------------
+class LayerStack(object):
+
+    HEADER_FILE = 'stack.json'
+    LAYERS_FILE = 'layers.npy'
+    MASK_FILE = 'mask.npy'
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, stackDir):
+
+        with open(os.path.join(stackDir, LayerStack.HEADER_FILE)) as hFile:
+            header = json.load(hFile)
+
+        if header.get('version') != LayerStack.VERSION:
+
+            raise RuntimeError('Unsupported layer stack version in ' +
+                               str(stackDir))
+
+        self._stackDir = stackDir
+        self._names = header['names']
+        self._geoTransform = tuple(header['geoTransform'])
+        self._srsWkt = header['srs']
+
+        self._layers = numpy.load(os.path.join(stackDir,
+                                               LayerStack.LAYERS_FILE),
+                                  mmap_mode='r')
+
+        self._mask = numpy.load(os.path.join(stackDir, LayerStack.MASK_FILE),
+                                mmap_mode='r')
+
+    # -------------------------------------------------------------------------
+    # build
+    #
+    # This writes a stack of ASCII grids, which must share one grid, reading
+    # each BLOCK_ROWS rows at a time, and returns it.  An existing stack in
+    # stackDir is replaced.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def build(ascPaths, stackDir):
+
+        if not ascPaths:
+            raise RuntimeError('At least one layer must be specified.')
+
+        ascPaths = sorted(ascPaths)
+        datasets = []
+
+        for ascPath in ascPaths:
+
+            dataset = gdal.Open(ascPath)
+
+            if dataset is None:
+                raise RuntimeError('Unable to open ' + str(ascPath))
+
+            datasets.append(dataset)
+
+        first = datasets[0]
+        rows = first.RasterYSize
+        cols = first.RasterXSize
+        geoTransform = first.GetGeoTransform()
+
+        for ascPath, dataset in zip(ascPaths, datasets):
+
+            if dataset.GetGeoTransform() != geoTransform or \
+               dataset.RasterXSize != cols or \
+               dataset.RasterYSize != rows:
+
+                raise RuntimeError('Layer ' + ascPath +
+                                   ' is not on the same grid as ' +
+                                   ascPaths[0])
+
+        tempDir = stackDir + '.' + uuid.uuid4().hex + '.tmp'
+        os.makedirs(tempDir)
+
+        try:
+            layers = numpy.lib.format.open_memmap(
+                os.path.join(tempDir, LayerStack.LAYERS_FILE),
+                mode='w+',
+                dtype=numpy.float32,
+                shape=(len(datasets), rows, cols))
+
+            mask = numpy.lib.format.open_memmap(
+                os.path.join(tempDir, LayerStack.MASK_FILE),
+                mode='w+',
+                dtype=bool,
+                shape=(rows, cols))
+
+            mask[:] = True
+
+            for i, dataset in enumerate(datasets):
+
+                band = dataset.GetRasterBand(1)
+                bandNoData = band.GetNoDataValue()
+
+                for row in range(0, rows, LayerPreparer.BLOCK_ROWS):
+
+                    numRows = min(LayerPreparer.BLOCK_ROWS, rows - row)
+
+                    block = LayerPreparer.fixNoData(
+                        band.ReadAsArray(0, row, cols, numRows),
+                        bandNoData)
+
+                    layers[i, row:row + numRows] = block
+                    mask[row:row + numRows] &= block != LayerPreparer.NO_DATA
+
+            layers.flush()
+            mask.flush()
+            del layers, mask
+
+            header = {'version': LayerStack.VERSION,
+                      'names': [os.path.splitext(os.path.basename(path))[0]
+                                for path in ascPaths],
+                      'geoTransform': list(geoTransform),
+                      'srs': first.GetProjection(),
+                      'noData': LayerPreparer.NO_DATA}
+
+            with open(os.path.join(tempDir, LayerStack.HEADER_FILE),
+                      'w') as hFile:
+
+                json.dump(header, hFile, indent=1)
+
+            # Readers of a replaced stack keep their maps of its files.
+            if os.path.exists(stackDir):
+                shutil.rmtree(stackDir)
+
+            os.rename(tempDir, stackDir)
+
+        except Exception:
+
+            shutil.rmtree(tempDir, ignore_errors=True)
+            raise
+
+        return LayerStack(stackDir)
+
+    # -------------------------------------------------------------------------
+    # cellIndexes
+    #
+    # This returns the row and column of each point, and a mask of the points
+    # inside the grid.
+    # -------------------------------------------------------------------------
+    def cellIndexes(self, xs, ys):
+
+        cols = numpy.floor((numpy.asarray(xs) - self._geoTransform[0]) /
+                           self._geoTransform[1]).astype(numpy.int64)
+
+        rows = numpy.floor((numpy.asarray(ys) - self._geoTransform[3]) /
+                           self._geoTransform[5]).astype(numpy.int64)
+
+        inside = (rows >= 0) & (rows < self.rows()) & \
+                 (cols >= 0) & (cols < self.cols())
+
+        return rows, cols, inside
+
+    # -------------------------------------------------------------------------
+    # cols
+    # -------------------------------------------------------------------------
+    def cols(self):
+
+        return self._layers.shape[2]
+
+    # -------------------------------------------------------------------------
+    # extract
+    #
+    # This returns a cells x layers array of the layers' values at the cells,
+    # and a mask of the cells with data in every layer.
+    # -------------------------------------------------------------------------
+    def extract(self, rows, cols):
+
+        return self._layers[:, rows, cols].T, self._mask[rows, cols]
+
+    # -------------------------------------------------------------------------
+    # geoTransform
+    # -------------------------------------------------------------------------
+    def geoTransform(self):
+
+        return self._geoTransform
+
+    # -------------------------------------------------------------------------
+    # index
+    #
+    # This returns the position of a layer in the stack.
+    # -------------------------------------------------------------------------
+    def index(self, name):
+
+        if name not in self._names:
+
+            raise RuntimeError('Layer ' + str(name) + ' is not in the stack ' +
+                               str(self._stackDir))
+
+        return self._names.index(name)
+
+    # -------------------------------------------------------------------------
+    # isStack
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def isStack(directory):
+
+        return os.path.exists(os.path.join(directory, LayerStack.HEADER_FILE))
+
+    # -------------------------------------------------------------------------
+    # layerNames
+    # -------------------------------------------------------------------------
+    def layerNames(self):
+
+        return list(self._names)
+
+    # -------------------------------------------------------------------------
+    # layers
+    #
+    # This returns the read-only, memory-mapped layers x rows x cols array.
+    # -------------------------------------------------------------------------
+    def layers(self):
+
+        return self._layers
+
+    # -------------------------------------------------------------------------
+    # mask
+    #
+    # This returns the read-only, memory-mapped mask of the cells with data
+    # in every layer.
+    # -------------------------------------------------------------------------
+    def mask(self):
+
+        return self._mask
+
+    # -------------------------------------------------------------------------
+    # read
+    #
+    # This returns numRows rows of every layer, as a layers x numRows x cols
+    # array, or a list of the named layers' numRows x cols windows.  Either
+    # way, the windows are views of the map, not copies.
+    # -------------------------------------------------------------------------
+    def read(self, row, numRows, names=None):
+
+        window = self._layers[:, row:row + numRows]
+
+        if names is None:
+            return window
+
+        return [window[self.index(name)] for name in names]
+
+    # -------------------------------------------------------------------------
+    # rows
+    # -------------------------------------------------------------------------
+    def rows(self):
+
+        return self._layers.shape[1]
+
+    # -------------------------------------------------------------------------
+    # srs
+    #
+    # This returns the layers' SRS as WKT.
+    # -------------------------------------------------------------------------
+    def srs(self):
+
+        return self._srsWkt
@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import shutil
+
+import numpy
+
+from core.model.Envelope import Envelope
+from core.model.SystemCommand import SystemCommand
+
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.ObservationStream import ObservationStream
+from maxent.model.RunTrace import RunTrace
+from maxent.model.TargetGrid import TargetGrid
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntBatchRequest
+#
+# This models many species against one set of images.  The observation file
+# must have a species column.  One pass over it splits the presence points
+# by species and writes a single multi-species samples file.  The layers are
+# prepared once, over the envelope of every species' points, and shared by
+# every model.  A MaxEntRequest without an observation file prepares them,
+# so they are only prepared again when the RunManifest shows the images, SRS
+# or target grid changed, and a MaxEntRequestParallel or MaxEntRequestCelery
+# may prepare them instead.  A requested species with no presence points is
+# an error.
+#
+# With one JVM, maxent.jar trains every species in a single invocation, and
+# each species' outputs are then moved to its own subdirectory.  With more,
+# each species runs in its own maxent.jar, at most numJvms at a time, writing
+# directly to its subdirectory.
+#
+# Like MaxEntRequest's, each stage is recorded in the RunManifest, and is
+# skipped when run again with the same inputs: the split of the observations,
+# and maxent.jar, as one stage with one JVM or one stage per species with
+# more.  The split's counts and envelope are kept in SPECIES_FILE, so a
+# skipped split does not read the observation file.
+# -----------------------------------------------------------------------------
+class MaxEntBatchRequest(object):
+
+    SAMPLES_FILE = 'samples.csv'
+    SPECIES_FILE = 'species.json'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # Species None means every species in the observation file.  layerRequest
+    # prepares the layers, and is a MaxEntRequest, or one of its subclasses,
+    # built without an observation file on the same images and output
+    # directory.  By default, it prepares them serially.
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 observationFilePath,
+                 listOfImages,
+                 outputDirectory,
+                 species=None,
+                 layerCache=None,
+                 numJvms=1,
+                 layerRequest=None):
+
+        # The layer request checks the output directory and the images' SRS.
+        self._layerRequest = layerRequest or \
+            MaxEntRequest(None, listOfImages, outputDirectory, layerCache)
+
+        self._images = listOfImages
+        self._imageSRS = self._images[0].srs()
+        self._observationFilePath = observationFilePath
+        self._outputDirectory = outputDirectory
+        self._ascDir = self._layerRequest.layerDirectory()
+        self._manifest = self._layerRequest.manifest()
+        self._jvmPlanner = JvmPlanner()
+        self._numJvms = max(numJvms, 1)
+        self._requestedSpecies = species
+        self._resolution = None
+        self._targetGrid = None
+        self._counts = None
+        self._envelope = None
+        self._speciesNames = None
+
+        self._samplesFile = os.path.join(self._outputDirectory,
+                                         MaxEntBatchRequest.SAMPLES_FILE)
+
+        self._speciesFile = os.path.join(self._outputDirectory,
+                                         MaxEntBatchRequest.SPECIES_FILE)
+
+    # -------------------------------------------------------------------------
+    # envelope
+    #
+    # This is the envelope of every species' presence points.
+    # -------------------------------------------------------------------------
+    def envelope(self):
+
+        if self._envelope is None:
+            self.formatObservations()
+
+        return self._envelope
+
+    # -------------------------------------------------------------------------
+    # formatObservations
+    #
+    # This splits the observations, unless the observation file, species, SRS
+    # and number of JVMs are those they were last split with.
+    # -------------------------------------------------------------------------
+    def formatObservations(self):
+
+        inputs = {'observations':
+                  self._manifest.digest(self._observationFilePath),
+                  'species': self._requestedSpecies,
+                  'srs': self._imageSRS.ExportToWkt(),
+                  'perSpecies': self._numJvms > 1}
+
+        if self._manifest.isCurrent('observations', inputs):
+
+            print('Observations are unchanged, so ' + self._samplesFile +
+                  ' is reused.')
+
+            with open(self._speciesFile) as speciesFile:
+                split = json.load(speciesFile)
+
+        else:
+
+            with RunTrace.stage('splitObservations'):
+                split = self._splitObservations()
+
+            with open(self._speciesFile, 'w') as speciesFile:
+                json.dump(split, speciesFile, indent=1, sort_keys=True)
+
+            outputPaths = [self._samplesFile, self._speciesFile]
+
+            if self._numJvms > 1:
+
+                outputPaths += [self.speciesSamplesFile(name)
+                                for name in split['counts']]
+
+            self._manifest.record('observations', inputs, outputPaths)
+
+        bounds = split['bounds']
+        self._counts = split['counts']
+        self._speciesNames = sorted(self._counts)
+        self._envelope = Envelope()
+        self._envelope.addPoint(bounds[0], bounds[1], 0, self._imageSRS)
+        self._envelope.addPoint(bounds[2], bounds[3], 0, self._imageSRS)
+
+        return self._samplesFile
+
+    # -------------------------------------------------------------------------
+    # _maxEntInputs
+    #
+    # These are the manifest inputs of a maxent.jar stage, like
+    # MaxEntRequest's: the hashes of the jar, the samples file and the
+    # layers, and the arguments.
+    # -------------------------------------------------------------------------
+    def _maxEntInputs(self, jarFile, samplesFile):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+
+        return {'jar': self._manifest.digest(jarFile),
+                'samples': self._manifest.digest(samplesFile),
+                'environment': self._manifest.digests(ascPaths),
+                'arguments': MaxEntRequest.maxEntCommand('', '', '', '')}
+
+    # -------------------------------------------------------------------------
+    # _maxEntOutputs
+    #
+    # These are the existing results file in resultsDirectory and the
+    # species' .lambdas files, the manifest outputs of a maxent.jar stage.
+    # -------------------------------------------------------------------------
+    def _maxEntOutputs(self, names, resultsDirectory):
+
+        outputPaths = [os.path.join(resultsDirectory,
+                                    MaxEntRequest.RESULTS_FILE)] + \
+            [os.path.join(self.speciesDirectory(name), name + '.lambdas')
+             for name in names]
+
+        return [path for path in outputPaths if os.path.exists(path)]
+
+    # -------------------------------------------------------------------------
+    # _moveSpeciesOutputs
+    #
+    # maxent.jar names each species' outputs after it, so they are moved to
+    # the species' subdirectory by prefix.  Longer names are moved first, so
+    # a species whose name begins with another's keeps its own files.  Only
+    # files are moved, as the prefix also matches those species' directories.
+    # -------------------------------------------------------------------------
+    def _moveSpeciesOutputs(self):
+
+        plotsDir = os.path.join(self._outputDirectory, 'plots')
+
+        for name in sorted(self.species(), key=len, reverse=True):
+
+            speciesDir = self.speciesDirectory(name)
+
+            for directory, destination in \
+                    ((self._outputDirectory, speciesDir),
+                     (plotsDir, os.path.join(speciesDir, 'plots'))):
+
+                paths = [path for path in
+                         glob.glob(os.path.join(directory, glob.escape(name)) +
+                                   '[._]*')
+                         if os.path.isfile(path)]
+
+                if paths and not os.path.exists(destination):
+                    os.makedirs(destination)
+
+                for path in paths:
+
+                    shutil.move(path,
+                                os.path.join(destination,
+                                             os.path.basename(path)))
+
+    # -------------------------------------------------------------------------
+    # numPresences
+    # -------------------------------------------------------------------------
+    def numPresences(self, name):
+
+        if self._counts is None:
+            self.formatObservations()
+
+        return self._counts[name]
+
+    # -------------------------------------------------------------------------
+    # _openSpeciesSamples
+    # -------------------------------------------------------------------------
+    def _openSpeciesSamples(self, name):
+
+        speciesDir = self.speciesDirectory(name)
+
+        if not os.path.exists(speciesDir):
+            os.makedirs(speciesDir)
+
+        speciesFile = open(self.speciesSamplesFile(name), 'w')
+        writer = csv.writer(speciesFile, delimiter=',')
+        writer.writerow(['species', 'x', 'y'])
+
+        return speciesFile, writer
+
+    # -------------------------------------------------------------------------
+    # prepareLayers
+    #
+    # This prepares the layers on the target grid with the layer request.
+    # See MaxEntRequest.prepareLayers.
+    # -------------------------------------------------------------------------
+    def prepareLayers(self):
+
+        self._layerRequest.setTargetGrid(self.targetGrid())
+
+        return self._layerRequest.prepareLayers()
+
+    # -------------------------------------------------------------------------
+    # run
+    # -------------------------------------------------------------------------
+    def run(self, jarFile=MaxEntRequest.MAX_ENT_JAR):
+
+        self.formatObservations()
+        self.prepareLayers()
+
+        self.targetGrid().checkAlignment(
+            sorted(glob.glob(os.path.join(self._ascDir, '*.asc'))))
+
+        self.runMaxEntJar(jarFile)
+
+    # -------------------------------------------------------------------------
+    # runMaxEntJar
+    # -------------------------------------------------------------------------
+    def runMaxEntJar(self, jarFile=MaxEntRequest.MAX_ENT_JAR):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+        names = self.species()
+
+        if self._numJvms == 1:
+
+            inputs = self._maxEntInputs(jarFile, self._samplesFile)
+
+            if self._manifest.isCurrent('maxent', inputs):
+
+                print('MaxEnt\'s inputs are unchanged, so its outputs in ' +
+                      self._outputDirectory + ' are reused.')
+
+                return
+
+            heapMb, threads, numJvms = self._jvmPlanner.plan(
+                ascPaths,
+                sum(self._counts.values()))
+
+            print('Running MaxEnt on ' + str(len(names)) + ' species.')
+
+            with RunTrace.stage('maxent',
+                                numSpecies=len(names),
+                                heapMb=heapMb,
+                                threads=threads):
+
+                SystemCommand(MaxEntRequest.maxEntCommand(
+                                  jarFile,
+                                  self._samplesFile,
+                                  self._ascDir,
+                                  self._outputDirectory,
+                                  '',
+                                  heapMb,
+                                  threads),
+                              None,
+                              True)
+
+            self._moveSpeciesOutputs()
+
+            self._manifest.record('maxent',
+                                  inputs,
+                                  self._maxEntOutputs(names,
+                                                      self._outputDirectory))
+
+            return
+
+        # Each species is its own stage, so only those whose inputs changed
+        # run again.
+        speciesInputs = {}
+
+        for name in names:
+
+            inputs = self._maxEntInputs(jarFile,
+                                        self.speciesSamplesFile(name))
+
+            if not self._manifest.isCurrent('maxent ' + name, inputs):
+                speciesInputs[name] = inputs
+
+        if not speciesInputs:
+
+            print('MaxEnt\'s inputs are unchanged for every species, so ' +
+                  'their outputs are reused.')
+
+            return
+
+        heapMb, threads, numJvms = self._jvmPlanner.plan(
+            ascPaths,
+            max(self._counts.values()),
+            self._numJvms)
+
+        print('Running MaxEnt on ' + str(len(speciesInputs)) + ' of ' +
+              str(len(names)) + ' species in ' + str(self._numJvms) +
+              ' JVMs.')
+
+        with RunTrace.stage('maxent',
+                            numSpecies=len(speciesInputs),
+                            heapMb=heapMb,
+                            threads=threads), \
+                concurrent.futures.ThreadPoolExecutor(self._numJvms) as pool:
+
+            futures = {pool.submit(SystemCommand,
+                                   MaxEntRequest.maxEntCommand(
+                                       jarFile,
+                                       self.speciesSamplesFile(name),
+                                       self._ascDir,
+                                       self.speciesDirectory(name),
+                                       '',
+                                       heapMb,
+                                       threads),
+                                   None,
+                                   True): name
+                       for name in sorted(speciesInputs)}
+
+            # Each species is recorded as it finishes, so a failure does not
+            # lose the others.
+            for future in concurrent.futures.as_completed(futures):
+
+                future.result()
+                name = futures[future]
+
+                self._manifest.record(
+                    'maxent ' + name,
+                    speciesInputs[name],
+                    self._maxEntOutputs([name],
+                                        self.speciesDirectory(name)))
+
+    # -------------------------------------------------------------------------
+    # setForce
+    #
+    # See MaxEntRequest.setForce.
+    # -------------------------------------------------------------------------
+    def setForce(self, force):
+
+        self._manifest.setForce(force)
+
+    # -------------------------------------------------------------------------
+    # setJvmPlanner
+    #
+    # See MaxEntRequest.setJvmPlanner.
+    # -------------------------------------------------------------------------
+    def setJvmPlanner(self, jvmPlanner):
+
+        self._jvmPlanner = jvmPlanner
+
+    # -------------------------------------------------------------------------
+    # setResolution
+    #
+    # See MaxEntRequest.setResolution.
+    # -------------------------------------------------------------------------
+    def setResolution(self, resolution):
+
+        self._resolution = resolution
+        self._targetGrid = None
+
+    # -------------------------------------------------------------------------
+    # species
+    #
+    # This returns the names of the species modeled, with blanks replaced by
+    # underscores as maxent.jar requires.
+    # -------------------------------------------------------------------------
+    def species(self):
+
+        if self._speciesNames is None:
+            self.formatObservations()
+
+        return self._speciesNames
+
+    # -------------------------------------------------------------------------
+    # speciesDirectory
+    # -------------------------------------------------------------------------
+    def speciesDirectory(self, name):
+
+        return os.path.join(self._outputDirectory, name.replace(os.sep, '_'))
+
+    # -------------------------------------------------------------------------
+    # speciesSamplesFile
+    # -------------------------------------------------------------------------
+    def speciesSamplesFile(self, name):
+
+        return os.path.join(self.speciesDirectory(name),
+                            MaxEntBatchRequest.SAMPLES_FILE)
+
+    # -------------------------------------------------------------------------
+    # _splitObservations
+    #
+    # This streams the presence points into the multi-species samples file
+    # and, when each species runs in its own JVM, into per-species samples
+    # files.  Only the counts and the bounds are kept in memory, and they are
+    # returned as {'counts': {name: count}, 'bounds': [ulx, uly, lrx, lry]}.
+    # It raises an error naming every requested species without presence
+    # points.
+    # -------------------------------------------------------------------------
+    def _splitObservations(self):
+
+        stream = ObservationStream(self._observationFilePath,
+                                   self._requestedSpecies,
+                                   response=ObservationStream.PRESENCE,
+                                   srs=self._imageSRS)
+
+        counts = {}
+        speciesFiles = {}
+        bounds = None
+
+        try:
+            with open(self._samplesFile, 'w') as csvFile:
+
+                meWriter = csv.writer(csvFile, delimiter=',')
+                meWriter.writerow(['species', 'x', 'y'])
+
+                for labels, xs, ys, responses in stream.labeledChunks():
+
+                    names = numpy.array([label.replace(' ', '_')
+                                         for label in labels],
+                                        dtype=object)
+
+                    meWriter.writerows(zip(names, xs.tolist(), ys.tolist()))
+
+                    chunkBounds = (xs.min(), ys.max(), xs.max(), ys.min())
+
+                    bounds = chunkBounds if bounds is None else \
+                        (min(bounds[0], chunkBounds[0]),
+                         max(bounds[1], chunkBounds[1]),
+                         max(bounds[2], chunkBounds[2]),
+                         min(bounds[3], chunkBounds[3]))
+
+                    for name in numpy.unique(names):
+
+                        isName = names == name
+                        count = int(isName.sum())
+                        counts[name] = counts.get(name, 0) + count
+
+                        if self._numJvms > 1:
+
+                            if name not in speciesFiles:
+                                speciesFiles[name] = \
+                                    self._openSpeciesSamples(name)
+
+                            speciesFiles[name][1].writerows(zip(
+                                names[isName],
+                                xs[isName].tolist(),
+                                ys[isName].tolist()))
+
+        finally:
+
+            for speciesFile, writer in speciesFiles.values():
+                speciesFile.close()
+
+        if not counts:
+
+            raise RuntimeError('No presence points were found in ' +
+                               str(self._observationFilePath))
+
+        missing = [name for name in self._requestedSpecies or []
+                   if name.replace(' ', '_') not in counts]
+
+        if missing:
+
+            raise RuntimeError('No presence points were found for ' +
+                               ', '.join(missing) + ' in ' +
+                               str(self._observationFilePath))
+
+        return {'counts': counts,
+                'bounds': [float(bound) for bound in bounds]}
+
+    # -------------------------------------------------------------------------
+    # targetGrid
+    #
+    # See MaxEntRequest.targetGrid.
+    # -------------------------------------------------------------------------
+    def targetGrid(self):
+
+        if self._targetGrid is None:
+
+            self._targetGrid = TargetGrid.plan(
+                self._images,
+                self._imageSRS,
+                self.envelope(),
+                self._resolution)
+
+            print('Target grid: ' + str(self._targetGrid))
+
+        return self._targetGrid
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+
+import numpy
+
+from osgeo import gdal
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.LayerStack import LayerStack
+
+# The layers projectRows has opened in this process, by path, as ((size,
+# modification time), dataset).  Pool workers open each layer once, not once
+# per block, and GDAL keeps its row offsets between blocks.
+_openLayers = {}
+
+
+# -----------------------------------------------------------------------------
+# projectBlock
+#
+# This is the process pool's entry point.  It must be a module-level function
+# for the pool to pickle it.  It returns the projected rows of one block.
+# -----------------------------------------------------------------------------
+def projectBlock(args):
+
+    projector, layerPaths, row, numRows, outputFormat = args
+
+    return projector.projectRows(layerPaths, row, numRows, outputFormat)
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntProjector
+#
+# This projects a model trained by maxent.jar onto a set of layers without
+# starting a JVM.  It reads the .lambdas file maxent.jar writes beside each
+# model and evaluates its features in NumPy:
+#
+# - linear:        var
+# - quadratic:     var^2
+# - product:       var1*var2
+# - threshold:     (knot<var)
+# - categorical:   (var=value)
+# - hinge:         'var
+# - reverse hinge: `var
+#
+# Each feature line holds the feature, its lambda, and its minimum and
+# maximum over the training background.  The trailing lines hold the
+# linearPredictorNormalizer, densityNormalizer and entropy.  Like
+# maxent.jar's default, features are clamped to their training range.
+#
+# Layers are read in blocks of rows, so memory use is bounded by the block
+# size, and blocks may be spread over a process pool.  Each process opens a
+# layer once and reads all of its blocks from that dataset.  When the layers
+# are a LayerStack, each process maps the stack and reads its blocks from the
+# shared pages instead of parsing every layer's ASCII grid.
+# -----------------------------------------------------------------------------
+class MaxEntProjector(object):
+
+    CLOGLOG = 'cloglog'
+    LOGISTIC = 'logistic'
+    RAW = 'raw'
+
+    CATEGORICAL = 'categorical'
+    HINGE = 'hinge'
+    LINEAR = 'linear'
+    PRODUCT = 'product'
+    QUADRATIC = 'quadratic'
+    REVERSE_HINGE = 'reverseHinge'
+    THRESHOLD = 'threshold'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, lambdasFile, clamp=True):
+
+        self._lambdasFile = lambdasFile
+        self._clamp = clamp
+        self._features = []
+        self._constants = {}
+
+        self._parse()
+
+        for key in ('linearPredictorNormalizer',
+                    'densityNormalizer',
+                    'entropy'):
+
+            if key not in self._constants:
+
+                raise RuntimeError('The lambdas file, ' +
+                                   str(lambdasFile) +
+                                   ' has no ' + key + '.')
+
+    # -------------------------------------------------------------------------
+    # closeLayers
+    #
+    # This closes the layers projectRows opened in this process.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def closeLayers():
+
+        _openLayers.clear()
+
+    # -------------------------------------------------------------------------
+    # features
+    #
+    # This returns a list of (type, variables, value, lambda, min, max)
+    # tuples.  Value is the knot of a threshold feature or the category of a
+    # categorical feature, and None otherwise.
+    # -------------------------------------------------------------------------
+    def features(self):
+
+        return self._features
+
+    # -------------------------------------------------------------------------
+    # _featureValues
+    #
+    # This returns a feature's values, scaled to [0, 1] over its training
+    # range.
+    # -------------------------------------------------------------------------
+    def _featureValues(self, feature, variables):
+
+        featureType, names, value, lam, fMin, fMax = feature
+        span = fMax - fMin
+
+        if span == 0:
+            return numpy.zeros_like(variables[names[0]])
+
+        if featureType == MaxEntProjector.HINGE:
+
+            x = variables[names[0]]
+
+            if self._clamp:
+                x = numpy.minimum(x, fMax)
+
+            return numpy.where(x > fMin, (x - fMin) / span, 0.0)
+
+        if featureType == MaxEntProjector.REVERSE_HINGE:
+
+            x = variables[names[0]]
+
+            if self._clamp:
+                x = numpy.maximum(x, fMin)
+
+            return numpy.where(x < fMax, (fMax - x) / span, 0.0)
+
+        if featureType == MaxEntProjector.THRESHOLD:
+            raw = (variables[names[0]] > value).astype(numpy.float64)
+
+        elif featureType == MaxEntProjector.CATEGORICAL:
+            raw = (variables[names[0]] == value).astype(numpy.float64)
+
+        elif featureType == MaxEntProjector.QUADRATIC:
+            raw = variables[names[0]] ** 2
+
+        elif featureType == MaxEntProjector.PRODUCT:
+            raw = variables[names[0]] * variables[names[1]]
+
+        else:
+            raw = variables[names[0]]
+
+        if self._clamp:
+            raw = numpy.clip(raw, fMin, fMax)
+
+        return (raw - fMin) / span
+
+    # -------------------------------------------------------------------------
+    # _openLayer
+    #
+    # This returns the dataset of a layer, opening it only when this process
+    # has not, or when the file has changed since.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _openLayer(path):
+
+        fileStat = os.stat(path)
+        signature = (fileStat.st_size, fileStat.st_mtime_ns)
+        opened = _openLayers.get(path)
+
+        if opened is None or opened[0] != signature:
+
+            opened = (signature, gdal.Open(path))
+            _openLayers[path] = opened
+
+        return opened[1]
+
+    # -------------------------------------------------------------------------
+    # _parse
+    # -------------------------------------------------------------------------
+    def _parse(self):
+
+        with open(self._lambdasFile) as lambdasFile:
+
+            for line in lambdasFile:
+
+                fields = [field.strip() for field in line.split(',')]
+
+                if len(fields) == 2:
+                    self._constants[fields[0]] = float(fields[1])
+
+                elif len(fields) == 4:
+
+                    self._features.append(
+                        MaxEntProjector.parseFeature(fields[0]) +
+                        tuple(float(field) for field in fields[1:]))
+
+                elif line.strip():
+
+                    raise RuntimeError('Unable to parse the lambdas line: ' +
+                                       line.strip())
+
+        # Features with a zero lambda contribute nothing.
+        self._features = [f for f in self._features if f[3] != 0]
+
+    # -------------------------------------------------------------------------
+    # parseFeature
+    #
+    # This returns (type, variables, value) for a feature name.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def parseFeature(name):
+
+        if name.startswith("'"):
+            return (MaxEntProjector.HINGE, (name[1:],), None)
+
+        if name.startswith('`'):
+            return (MaxEntProjector.REVERSE_HINGE, (name[1:],), None)
+
+        if name.startswith('(') and '<' in name:
+
+            knot, var = name[1:-1].split('<')
+            return (MaxEntProjector.THRESHOLD, (var,), float(knot))
+
+        if name.startswith('(') and '=' in name:
+
+            var, category = name[1:-1].split('=')
+            return (MaxEntProjector.CATEGORICAL, (var,), float(category))
+
+        if name.endswith('^2'):
+            return (MaxEntProjector.QUADRATIC, (name[:-2],), None)
+
+        if '*' in name:
+
+            return (MaxEntProjector.PRODUCT,
+                    tuple(name.split('*')),
+                    None)
+
+        return (MaxEntProjector.LINEAR, (name,), None)
+
+    # -------------------------------------------------------------------------
+    # predict
+    #
+    # This returns the model's output for arrays of variable values, keyed by
+    # variable name.  All arrays must have the same shape.
+    # -------------------------------------------------------------------------
+    def predict(self, variables, outputFormat=CLOGLOG):
+
+        variables = dict((name, numpy.asarray(values, dtype=numpy.float64))
+                         for name, values in variables.items())
+
+        shape = numpy.shape(next(iter(variables.values())))
+        linearPredictor = numpy.zeros(shape)
+
+        for feature in self._features:
+            linearPredictor += feature[3] * \
+                self._featureValues(feature, variables)
+
+        raw = numpy.exp(linearPredictor -
+                        self._constants['linearPredictorNormalizer']) / \
+            self._constants['densityNormalizer']
+
+        if outputFormat == MaxEntProjector.RAW:
+            return raw
+
+        scaled = raw * numpy.exp(self._constants['entropy'])
+
+        if outputFormat == MaxEntProjector.LOGISTIC:
+            return scaled / (1.0 + scaled)
+
+        if outputFormat == MaxEntProjector.CLOGLOG:
+            return 1.0 - numpy.exp(-scaled)
+
+        raise RuntimeError('Invalid output format: ' + str(outputFormat))
+
+    # -------------------------------------------------------------------------
+    # project
+    #
+    # This writes the model's output over a set of layers to an ASCII grid.
+    # The layers are in layerDir, named for the model's variables, like the
+    # asc directory of a MaxEntRequest, or layerDir is a LayerStack, like its
+    # stack directory.  Cells with no data in any layer have no data in the
+    # output.
+    # -------------------------------------------------------------------------
+    def project(self,
+                layerDir,
+                outputPath,
+                outputFormat=CLOGLOG,
+                numProcesses=1,
+                blockRows=LayerPreparer.BLOCK_ROWS):
+
+        if LayerStack.isStack(layerDir):
+
+            # Workers open the stack themselves, so only its path is pickled.
+            layerPaths = layerDir
+            stack = LayerStack(layerDir)
+
+            for name in self.variables():
+                stack.index(name)
+
+            rows = stack.rows()
+            cols = stack.cols()
+            geoTransform = stack.geoTransform()
+            projection = stack.srs()
+
+        else:
+
+            layerPaths = dict((name, os.path.join(layerDir, name + '.asc'))
+                              for name in self.variables())
+
+            first = gdal.Open(layerPaths[self.variables()[0]])
+            rows = first.RasterYSize
+            cols = first.RasterXSize
+            geoTransform = first.GetGeoTransform()
+            projection = first.GetProjection()
+
+        blocks = [(self, layerPaths, row, min(blockRows, rows - row),
+                   outputFormat)
+                  for row in range(0, rows, blockRows)]
+
+        pool = None
+        tempPath = outputPath + '.tmp'
+
+        if numProcesses > 1:
+
+            # Workers must not inherit this process's open layers.
+            MaxEntProjector.closeLayers()
+            pool = multiprocessing.Pool(numProcesses)
+
+        try:
+            results = pool.imap(projectBlock, blocks) if pool else \
+                (projectBlock(block) for block in blocks)
+
+            with open(tempPath, 'w') as ascFile:
+
+                LayerPreparer.writeAsciiHeader(ascFile,
+                                               cols,
+                                               rows,
+                                               geoTransform)
+
+                for block in results:
+                    LayerPreparer.writeAsciiBlock(ascFile, block)
+
+        finally:
+
+            if pool:
+
+                pool.close()
+                pool.join()
+
+            MaxEntProjector.closeLayers()
+
+        os.rename(tempPath, outputPath)
+        LayerPreparer.writePrj(projection, outputPath)
+
+        return outputPath
+
+    # -------------------------------------------------------------------------
+    # projectRows
+    #
+    # This returns the model's output for one block of rows, as Float32 with
+    # no-data cells set to LayerPreparer.NO_DATA.  layerPaths maps variable
+    # names to layers, or is the directory of a LayerStack.
+    # -------------------------------------------------------------------------
+    def projectRows(self, layerPaths, row, numRows, outputFormat=CLOGLOG):
+
+        if not isinstance(layerPaths, dict):
+            return self._projectStackRows(layerPaths, row, numRows,
+                                          outputFormat)
+
+        variables = {}
+        missing = None
+
+        for name in self.variables():
+
+            dataset = MaxEntProjector._openLayer(layerPaths[name])
+            band = dataset.GetRasterBand(1)
+
+            values = band.ReadAsArray(0,
+                                      row,
+                                      dataset.RasterXSize,
+                                      numRows).astype(numpy.float64)
+
+            noData = numpy.isnan(values)
+
+            if band.GetNoDataValue() is not None:
+                noData |= values == band.GetNoDataValue()
+
+            missing = noData if missing is None else missing | noData
+            variables[name] = values
+
+        output = self.predict(variables, outputFormat).astype(numpy.float32)
+        output[missing] = LayerPreparer.NO_DATA
+
+        return output
+
+    # -------------------------------------------------------------------------
+    # _projectStackRows
+    #
+    # Like projectRows, only the model's layers mask the output, not the
+    # stack's mask of the cells with data in every layer.
+    # -------------------------------------------------------------------------
+    def _projectStackRows(self, stackDir, row, numRows, outputFormat):
+
+        names = self.variables()
+        stack = LayerStack(stackDir)
+        windows = stack.read(row, numRows, names)
+
+        variables = dict((name, window.astype(numpy.float64))
+                         for name, window in zip(names, windows))
+
+        missing = numpy.zeros((numRows, stack.cols()), dtype=bool)
+
+        for window in windows:
+            missing |= window == LayerPreparer.NO_DATA
+
+        output = self.predict(variables, outputFormat).astype(numpy.float32)
+        output[missing] = LayerPreparer.NO_DATA
+
+        return output
+
+    # -------------------------------------------------------------------------
+    # variables
+    #
+    # This returns the names of the layers the model uses, in order of first
+    # use.
+    # -------------------------------------------------------------------------
+    def variables(self):
+
+        names = []
+
+        for feature in self._features:
+
+            for name in feature[1]:
+
+                if name not in names:
+                    names.append(name)
+
+        return names
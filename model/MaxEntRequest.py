@@ -2,18 +2,43 @@
 # -*- coding: utf-8 -*-
 
 import csv
-import fileinput
+import glob
+import itertools
+import multiprocessing
 import os
 import pickle
-import shutil
-import sys
 
-from core.model.GeospatialImageFile import GeospatialImageFile
+import numpy
+
 from core.model.SystemCommand import SystemCommand
 
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.LayerStack import LayerStack
+from maxent.model.MaxEntProjector import MaxEntProjector
+from maxent.model.MxeConverter import MxeConverter
+from maxent.model.PointThinner import PointThinner
+from maxent.model.RunManifest import RunManifest
+from maxent.model.RunTrace import RunTrace
+from maxent.model.SwdSampler import SwdSampler
+from maxent.model.TargetGrid import TargetGrid
+
 
 # -----------------------------------------------------------------------------
 # class MaxEntRequest
+#
+# run formats the observations, prepares the layers, then runs maxent.jar.
+# Each stage is recorded in a RunManifest in the output directory, and is
+# skipped when run again with the same inputs, unless forced with setForce.
+# While a RunTrace is recording, each stage is traced.
+#
+# run is prepare, train, then finish, so a PipelineScheduler can overlap
+# one request's preparation with another's maxent.jar.
+#
+# Without an observation file, a request only prepares layers, on the grid
+# given to setTargetGrid.  A MaxEntBatchRequest prepares its layers with one,
+# so its images are prepared serially, in a process pool or by Celery like
+# any other request's.
 # -----------------------------------------------------------------------------
 class MaxEntRequest(object):
 
@@ -21,10 +46,16 @@ class MaxEntRequest(object):
                                'libraries',
                                'maxent.jar')
 
+    RESULTS_FILE = 'maxentResults.csv'
+
     # -------------------------------------------------------------------------
     # __init__
     # -------------------------------------------------------------------------
-    def __init__(self, observationFile, listOfImages, outputDirectory):
+    def __init__(self,
+                 observationFile,
+                 listOfImages,
+                 outputDirectory,
+                 layerCache=None):
 
         if not os.path.exists(outputDirectory):
 
@@ -46,13 +77,48 @@ class MaxEntRequest(object):
 
         self._imagesToProcess = self._images
         self._outputDirectory = outputDirectory
+        self._layerCache = layerCache
+        self._manifest = RunManifest(outputDirectory)
+        self._jvmPlanner = JvmPlanner()
+        self._numJvms = 1
+        self._useMxe = False
+        self._useStack = False
+        self._useSwd = False
+        self._swdNumBackground = SwdSampler.DEFAULT_NUM_BACKGROUND
+        self._swdSeed = 0
+        self._swdProject = False
+        self._numReplicates = 0
+        self._replicateType = None
+        self._replicateTestPercent = 25
+        self._replicateSeed = 0
+        self._resolution = None
+        self._targetGrid = None
+        self._pointThinner = None
+        self._presencePoints = None
+        self._projectionFormat = None
+        self._projectionProcesses = 1
 
         self._observationFile = observationFile
-        self._observationFile.transformTo(self._imageSRS)
-        self._maxEntSpeciesFile = self._formatObservations()
+        self._maxEntSpeciesFile = None
+
+        if self._observationFile is not None:
+
+            self._observationFile.transformTo(self._imageSRS)
+
+            self._maxEntSpeciesFile = os.path.join(
+                self._outputDirectory,
+                os.path.basename(self._observationFile.fileName()))
 
         # Create a directory for the ASC files.
         self._ascDir = os.path.join(self._outputDirectory, 'asc')
+        self._mxeDir = os.path.join(self._outputDirectory, 'mxe')
+        self._stackDir = os.path.join(self._outputDirectory, 'stack')
+
+        self._swdSamplesFile = os.path.join(self._outputDirectory,
+                                            'swd_samples.csv')
+
+        self._swdBackgroundFile = os.path.join(self._outputDirectory,
+                                               'swd_background.csv')
 
         try:
             os.mkdir(self._ascDir)
@@ -62,34 +128,355 @@ class MaxEntRequest(object):
             # Do not complain, if the directory exists.
             pass
 
+    # -------------------------------------------------------------------------
+    # ascImagePath
+    #
+    # This is the path of an image's prepared layer in ascDir.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def ascImagePath(imagePath, ascDir):
+
+        nameNoExtension = os.path.splitext(os.path.basename(imagePath))[0]
+
+        return os.path.join(ascDir, nameNoExtension + '.asc')
+
+    # -------------------------------------------------------------------------
+    # buildLayerStack
+    #
+    # This writes the prepared layers as one memory-mapped LayerStack,
+    # unless the layers are those it was last built from, and returns it.
+    # -------------------------------------------------------------------------
+    def buildLayerStack(self):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+        inputs = {'layers': self._manifest.digests(ascPaths)}
+
+        if self._manifest.isCurrent('stack', inputs):
+
+            print('Layers are unchanged, so the stack in ' + self._stackDir +
+                  ' is reused.')
+
+            return LayerStack(self._stackDir)
+
+        with RunTrace.stage('buildLayerStack', numLayers=len(ascPaths)):
+            stack = LayerStack.build(ascPaths, self._stackDir)
+
+        self._manifest.record('stack',
+                              inputs,
+                              [os.path.join(self._stackDir, name)
+                               for name in (LayerStack.HEADER_FILE,
+                                            LayerStack.LAYERS_FILE,
+                                            LayerStack.MASK_FILE)])
+
+        return stack
+
+    # -------------------------------------------------------------------------
+    # checkLayers
+    #
+    # This verifies that every prepared layer is on the target grid, before
+    # maxent.jar reads them.
+    # -------------------------------------------------------------------------
+    def checkLayers(self):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+
+        with RunTrace.stage('checkLayers', numLayers=len(ascPaths)):
+            self.targetGrid().checkAlignment(ascPaths)
+
+    # -------------------------------------------------------------------------
+    # convertLayers
+    #
+    # This converts the prepared ASCII grids to maxent.jar's binary .mxe
+    # grids, once.  See MxeConverter.
+    # -------------------------------------------------------------------------
+    def convertLayers(self, jarFile=MAX_ENT_JAR):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+
+        with RunTrace.stage('convertLayers', numLayers=len(ascPaths)):
+            return MxeConverter.convert(ascPaths, self._mxeDir, jarFile)
+
+    # -------------------------------------------------------------------------
+    # finish
+    #
+    # This post-processes maxent.jar's outputs.  With setProjection, the
+    # model is projected onto the prepared layers by MaxEntProjector, unless
+    # the model and layers are those it was last projected from.
+    # -------------------------------------------------------------------------
+    def finish(self):
+
+        if not self._projectionFormat:
+            return
+
+        if self._numReplicates:
+
+            raise RuntimeError('Projection requires one model, not ' +
+                               'replicates.')
+
+        speciesNoBlank = self._observationFile.species().replace(' ', '_')
+
+        lambdasPath = os.path.join(self._outputDirectory,
+                                   speciesNoBlank + '.lambdas')
+
+        outputPath = os.path.join(self._outputDirectory,
+                                  speciesNoBlank + '_' +
+                                  self._projectionFormat + '.asc')
+
+        layerDir = self._stackDir if self._useStack else self._ascDir
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+
+        inputs = {'lambdas': self._manifest.digest(lambdasPath),
+                  'layers': self._manifest.digests(ascPaths),
+                  'format': self._projectionFormat}
+
+        if self._manifest.isCurrent('projection', inputs):
+
+            print('The model and layers are unchanged, so ' + outputPath +
+                  ' is reused.')
+
+            return
+
+        with RunTrace.stage('project', outputFormat=self._projectionFormat):
+
+            MaxEntProjector(lambdasPath).project(layerDir,
+                                                 outputPath,
+                                                 self._projectionFormat,
+                                                 self._projectionProcesses)
+
+        print('Wrote ' + outputPath)
+        self._manifest.record('projection', inputs, [outputPath])
+
+    # -------------------------------------------------------------------------
+    # formatObservations
+    #
+    # This writes the samples file, unless the observation file, species,
+    # SRS and thinning are those it was last written from.
+    # -------------------------------------------------------------------------
+    def formatObservations(self):
+
+        inputs = {'observations':
+                  self._manifest.digest(self._observationFile.fileName()),
+                  'species': self._observationFile.species(),
+                  'srs': self._imageSRS.ExportToWkt()}
+
+        if self._pointThinner:
+
+            inputs['thinning'] = self._pointThinner.settings()
+
+            if self._pointThinner.mode() != PointThinner.DISTANCE:
+
+                grid = self.targetGrid()
+
+                inputs['grid'] = [grid.ulx(),
+                                  grid.uly(),
+                                  grid.cellSize(),
+                                  grid.cols(),
+                                  grid.rows()]
+
+        if self._manifest.isCurrent('observations', inputs):
+
+            print('Observations are unchanged, so ' +
+                  self._maxEntSpeciesFile + ' is reused.')
+
+            return self._maxEntSpeciesFile
+
+        with RunTrace.stage('formatObservations'):
+            self._formatObservations()
+
+        self._manifest.record('observations',
+                              inputs,
+                              [self._maxEntSpeciesFile])
+
+        return self._maxEntSpeciesFile
+
     # -------------------------------------------------------------------------
     # _formatObservations
+    #
+    # This writes the presence points to maxent.jar's samples file, one chunk
+    # at a time.  The observations default to the request's ObservationFile,
+    # but may be anything that yields (xs, ys, responses) chunks from
+    # chunks(), like an ObservationStream, so very large files can be written
+    # without holding every row.  Stream rows must already be in the images'
+    # SRS.  The request's own points are thinned, when set.
     # -------------------------------------------------------------------------
-    def _formatObservations(self):
+    def _formatObservations(self, observations=None):
 
-        path, name = os.path.split(self._observationFile.fileName())
-        samplesFile = os.path.join(self._outputDirectory, name)
+        if observations is not None:
+            chunks = observations.chunks()
+
+        elif self._pointThinner:
+
+            xs, ys = self.presencePoints()
+            chunks = [(xs, ys, numpy.ones(len(xs)))]
+
+        else:
+            chunks = self._observationFile.chunks()
 
-        meWriter = csv.writer(open(samplesFile, 'w'), delimiter=',')
-        meWriter.writerow(['species', 'x', 'y'])
+        samplesFile = self._maxEntSpeciesFile
+        speciesNoBlank = self._observationFile.species().replace(' ', '_')
 
-        for i in range(self._observationFile.numObservations()):
+        with open(samplesFile, 'w') as csvFile:
 
-            obs = self._observationFile.observation(i)
+            meWriter = csv.writer(csvFile, delimiter=',')
+            meWriter.writerow(['species', 'x', 'y'])
 
-            # Skip absence points.
-            if obs[1] > 0:
+            for xs, ys, responses in chunks:
 
-                speciesNoBlank = self._observationFile. \
-                                 species(). \
-                                 replace(' ', '_')
+                # Skip absence points.
+                presence = responses > 0
 
-                meWriter.writerow([speciesNoBlank,
-                                   obs[0].GetX(),
-                                   obs[0].GetY()])
+                meWriter.writerows(zip(
+                    itertools.repeat(speciesNoBlank),
+                    xs[presence].tolist(),
+                    ys[presence].tolist()))
 
         return samplesFile
 
+    # -------------------------------------------------------------------------
+    # layerDirectory
+    #
+    # This is the directory of layers maxent.jar reads.
+    # -------------------------------------------------------------------------
+    def layerDirectory(self):
+
+        return self._mxeDir if self._useMxe else self._ascDir
+
+    # -------------------------------------------------------------------------
+    # layerInputs
+    #
+    # This returns the RunManifest inputs of the 'layers' stage: each image's
+    # path, size and modification time, the SRS and the target grid.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def layerInputs(images, srs, grid):
+
+        imageStats = {}
+
+        for image in images:
+
+            fileStat = os.stat(image.fileName())
+
+            imageStats[os.path.abspath(image.fileName())] = \
+                [fileStat.st_size, fileStat.st_mtime]
+
+        return {'images': imageStats,
+                'grid': [grid.ulx(),
+                         grid.uly(),
+                         grid.cellSize(),
+                         grid.cols(),
+                         grid.rows()],
+                'srs': srs.ExportToWkt()}
+
+    # -------------------------------------------------------------------------
+    # manifest
+    #
+    # This is the RunManifest of the output directory.
+    # -------------------------------------------------------------------------
+    def manifest(self):
+
+        return self._manifest
+
+    # -------------------------------------------------------------------------
+    # maxEntCommand
+    #
+    # This returns the command line that runs maxent.jar on a samples file
+    # and a directory of layers or an SWD background file.  See JvmPlanner
+    # for choosing the heap size and threads.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def maxEntCommand(jarFile,
+                      samplesFile,
+                      environment,
+                      outputDirectory,
+                      extraArgs='',
+                      heapMb=1024,
+                      threads=1):
+
+        cmd = 'java -Xmx' + str(heapMb) + 'm -jar ' + \
+              jarFile + \
+              ' visible=false autorun -P -J writeplotdata ' + \
+              '"applythresholdrule=Equal training sensitivity and ' + \
+              'specificity" removeduplicates=false ' + \
+              '-s "' + samplesFile + '" ' + \
+              '-e "' + environment + '" ' + \
+              '-o "' + outputDirectory + '"'
+
+        if threads > 1:
+            cmd += ' threads=' + str(threads)
+
+        if extraArgs:
+            cmd += ' ' + extraArgs
+
+        return cmd
+
+    # -------------------------------------------------------------------------
+    # _maxEntInputs
+    #
+    # These are the manifest inputs of a maxent.jar stage: the hashes of the
+    # jar, the samples file and the environment's layers or background file,
+    # and the arguments.  The heap size and threads do not change the model,
+    # so the arguments are those of a command with the defaults.
+    # -------------------------------------------------------------------------
+    def _maxEntInputs(self, jarFile, samplesFile, environment, extraArgs):
+
+        if os.path.isdir(environment):
+
+            environmentPaths = \
+                sorted(glob.glob(os.path.join(environment, '*.asc')) +
+                       glob.glob(os.path.join(environment, '*.mxe')))
+
+        else:
+            environmentPaths = [environment]
+
+        return {'jar': self._manifest.digest(jarFile),
+                'samples': self._manifest.digest(samplesFile),
+                'environment': self._manifest.digests(environmentPaths),
+                'arguments': MaxEntRequest.maxEntCommand('', '', '', '',
+                                                         extraArgs)}
+
+    # -------------------------------------------------------------------------
+    # planJvm
+    #
+    # This plans the heap size and threads of numJvms concurrent maxent.jar
+    # processes on the prepared layers.  See JvmPlanner.
+    # -------------------------------------------------------------------------
+    def planJvm(self, numJvms=1, fitJvms=False):
+
+        ascPaths = sorted(glob.glob(os.path.join(self._ascDir, '*.asc')))
+        numSamples = len(self.presencePoints()[0])
+        numBackground = SwdSampler.DEFAULT_NUM_BACKGROUND
+
+        if self._useSwd:
+            numBackground = self._swdNumBackground
+
+        return self._jvmPlanner.plan(ascPaths,
+                                     numSamples,
+                                     numJvms,
+                                     numBackground,
+                                     not self._useSwd or self._swdProject,
+                                     fitJvms)
+
+    # -------------------------------------------------------------------------
+    # prepare
+    #
+    # This writes everything maxent.jar reads: the samples file and the
+    # layers, and the .mxe grids, stack and SWD files when set.
+    # -------------------------------------------------------------------------
+    def prepare(self, jarFile=MAX_ENT_JAR):
+
+        self.formatObservations()
+        self.prepareLayers()
+        self.checkLayers()
+
+        if self._useMxe:
+            self.convertLayers(jarFile)
+
+        if self._useStack:
+            self.buildLayerStack()
+
+        if self._useSwd:
+            self.writeSwdFiles()
+
     # -------------------------------------------------------------------------
     # prepareImage
     #
@@ -97,44 +484,69 @@ class MaxEntRequest(object):
     # this to control the preparation of a batch of images outside a single
     # MaxEntRequest.  MmxRequest will use this to prepare all images once,
     # instead of preparing a new set for each trial.
+    #
+    # With a LayerCache, the layer is linked from the cache, and an existing
+    # file in ascDir is replaced, because it may have been prepared for
+    # another envelope or SRS.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def prepareImage(image,
+                     srs,
+                     envelope,
+                     ascDir,
+                     layerCache=None,
+                     resolution=None):
+
+        return MaxEntRequest.prepareImagePath(image.fileName(),
+                                              srs,
+                                              envelope,
+                                              ascDir,
+                                              layerCache,
+                                              resolution)
+
+    # -------------------------------------------------------------------------
+    # prepareImagePath
+    #
+    # This is prepareImage given only the image's path, for callers, like
+    # Celery tasks, that do not open the image.
     # -------------------------------------------------------------------------
     @staticmethod
-    def prepareImage(image, srs, envelope, ascDir):
+    def prepareImagePath(imagePath,
+                         srs,
+                         envelope,
+                         ascDir,
+                         layerCache=None,
+                         resolution=None):
 
         # ---
-        # First, to preserve the original files, copy the input file to the
-        # output directory.
+        # The source file is read in place, not copied, and only within the
+        # envelope.  See LayerPreparer.
         # ---
-        baseName = os.path.basename(image.fileName())
-        nameNoExtension = os.path.splitext(baseName)[0]
-        ascImagePath = os.path.join(ascDir, nameNoExtension + '.asc')
+        baseName = os.path.basename(imagePath)
+        ascImagePath = MaxEntRequest.ascImagePath(imagePath, ascDir)
 
-        if not os.path.exists(ascImagePath):
+        with RunTrace.stage('prepareImage', image=imagePath):
 
-            copyPath = os.path.join(ascDir, baseName)
-            print ('Processing ' + copyPath)
-            shutil.copy(image.fileName(), copyPath)
-            imageCopy = GeospatialImageFile(copyPath, srs)
-            imageCopy.clipReproject(envelope)
+            if layerCache:
 
-            squareScale = imageCopy.getSquareScale()
-            imageCopy.resample(squareScale, squareScale)
+                layerCache.prepare(imagePath,
+                                   srs,
+                                   envelope,
+                                   ascImagePath,
+                                   resolution)
 
-            # Convert to ASCII Grid.
-            cmd = 'gdal_translate -ot Float32 -of AAIGrid -a_nodata -9999.0' +\
-                  ' "' + imageCopy.fileName() + '"' + \
-                  ' "' + ascImagePath + '"'
+            elif not os.path.exists(ascImagePath):
 
-            SystemCommand(cmd, None, True)
+                print ('Processing ' + imagePath)
 
-            # Fix NaNs.
-            for line in fileinput.FileInput(ascImagePath, inplace=1):
+                LayerPreparer.prepare(imagePath,
+                                      srs,
+                                      envelope,
+                                      ascImagePath,
+                                      resolution)
 
-                line = line.replace('nan', '-9999')
-                sys.stdout.write(line)
-
-        else:
-            print(baseName, 'was previously prepared.')
+            else:
+                print(baseName, 'was previously prepared.')
 
         return ascImagePath
 
@@ -146,44 +558,478 @@ class MaxEntRequest(object):
         ascGifs = []
         numLeft = len(self._imagesToProcess)
 
+        grid = self.targetGrid()
+
         for gif in self._imagesToProcess:
 
             ascGifs.append(MaxEntRequest.prepareImage(
                 gif,
                 self._imageSRS,
-                self._observationFile.envelope(),
-                self._ascDir))
+                grid.envelope(),
+                self._ascDir,
+                self._layerCache,
+                grid.cellSize()))
 
             numLeft -= 1
             print(numLeft, ' images remaining to process.')
 
+        if self._layerCache:
+            print(self._layerCache.report())
+
         return ascGifs
 
+    # -------------------------------------------------------------------------
+    # prepareLayers
+    #
+    # This prepares the layers, unless the images, SRS and target grid are
+    # those they were last prepared from.  Images are identified by path,
+    # size and modification time, because hashing them would read far more
+    # than preparing them does.
+    #
+    # prepareImage reuses existing layers, so an interrupted run resumes.
+    # When the manifest shows the layers were prepared from other inputs,
+    # or the run is forced, they are removed first instead.
+    # -------------------------------------------------------------------------
+    def prepareLayers(self):
+
+        inputs = MaxEntRequest.layerInputs(self._images,
+                                           self._imageSRS,
+                                           self.targetGrid())
+
+        if self._manifest.isCurrent('layers', inputs):
+
+            print('Images and target grid are unchanged, so the layers in ' +
+                  self._ascDir + ' are reused.')
+
+            return self._manifest.outputs('layers')
+
+        if self._manifest.outputs('layers') or self._manifest.isForced():
+
+            for image in self._images:
+
+                ascImagePath = MaxEntRequest.ascImagePath(image.fileName(),
+                                                          self._ascDir)
+
+                if os.path.lexists(ascImagePath):
+                    os.remove(ascImagePath)
+
+        with RunTrace.stage('prepareLayers', numImages=len(self._images)):
+            ascPaths = self.prepareImages()
+
+        self._manifest.record('layers', inputs, ascPaths)
+
+        return ascPaths
+
+    # -------------------------------------------------------------------------
+    # presencePoints
+    #
+    # This returns the coordinates of the presence points maxent.jar trains
+    # on, thinned when setPointThinner was given a PointThinner.
+    # -------------------------------------------------------------------------
+    def presencePoints(self):
+
+        if self._presencePoints is None:
+
+            presence = self._observationFile.responses() > 0
+            xs, ys = self._observationFile.coordinates()
+            xs = xs[presence]
+            ys = ys[presence]
+
+            if self._pointThinner:
+
+                grid = self.targetGrid()
+
+                with RunTrace.stage('thinPoints',
+                                    mode=self._pointThinner.mode()):
+
+                    keep = self._pointThinner.thin(xs, ys, grid)
+
+                print(self._pointThinner.report())
+                xs = xs[keep]
+                ys = ys[keep]
+
+            self._presencePoints = (xs, ys)
+
+        return self._presencePoints
+
     # -------------------------------------------------------------------------
     # run
     # -------------------------------------------------------------------------
     def run(self, jarFile=MAX_ENT_JAR):
 
-        self.prepareImages()
-        self.runMaxEntJar(jarFile)
+        self.prepare(jarFile)
+        self.train(jarFile)
+        self.finish()
 
     # -------------------------------------------------------------------------
     # runMaxEntJar
     # -------------------------------------------------------------------------
     def runMaxEntJar(self, jarFile=MAX_ENT_JAR):
 
+        if self._useSwd:
+
+            samplesFile = self._swdSamplesFile
+            environment = self._swdBackgroundFile
+            extraArgs = ''
+
+            if self._swdProject:
+
+                extraArgs = 'projectionlayers="' + \
+                            self.layerDirectory() + '"'
+
+        else:
+
+            samplesFile = self._maxEntSpeciesFile
+            environment = self.layerDirectory()
+            extraArgs = ''
+
+        inputs = self._maxEntInputs(jarFile,
+                                    samplesFile,
+                                    environment,
+                                    extraArgs)
+
+        if self._manifest.isCurrent('maxent', inputs):
+
+            print('MaxEnt\'s inputs are unchanged, so its outputs in ' +
+                  self._outputDirectory + ' are reused.')
+
+            return
+
         print ('Running MaxEnt.')
 
-        # Invoke maxent.jar.
-        baseCmd = 'java -Xmx1024m -jar ' + \
-                  jarFile + \
-                  ' visible=false autorun -P -J writeplotdata ' + \
-                  '"applythresholdrule=Equal training sensitivity and ' + \
-                  'specificity" removeduplicates=false '
+        heapMb, threads, numJvms = self.planJvm(self._numJvms)
+
+        cmd = MaxEntRequest.maxEntCommand(jarFile,
+                                          samplesFile,
+                                          environment,
+                                          self._outputDirectory,
+                                          extraArgs,
+                                          heapMb,
+                                          threads)
+
+        with RunTrace.stage('maxent', heapMb=heapMb, threads=threads):
+            SystemCommand(cmd, None, True)
+
+        speciesNoBlank = self._observationFile.species().replace(' ', '_')
+
+        outputPaths = [os.path.join(self._outputDirectory, name)
+                       for name in (MaxEntRequest.RESULTS_FILE,
+                                    speciesNoBlank + '.lambdas')]
+
+        self._manifest.record('maxent',
+                              inputs,
+                              [path for path in outputPaths
+                               if os.path.exists(path)])
+
+    # -------------------------------------------------------------------------
+    # runReplicates
+    #
+    # This fits the replicates set by setReplicates, each in its own
+    # maxent.jar, and aggregates them.  See ReplicateRunner.
+    # -------------------------------------------------------------------------
+    def runReplicates(self, jarFile=MAX_ENT_JAR, useCelery=False):
+
+        # ReplicateRunner builds its commands with this class.
+        from maxent.model.ReplicateRunner import ReplicateRunner
+
+        projectionLayers = None
+
+        if self._useSwd:
+
+            samplesFile = self._swdSamplesFile
+            environment = self._swdBackgroundFile
+
+            if self._swdProject:
+                projectionLayers = self.layerDirectory()
+
+        else:
+
+            samplesFile = self._maxEntSpeciesFile
+            environment = self.layerDirectory()
+
+        inputs = self._maxEntInputs(
+            jarFile,
+            samplesFile,
+            environment,
+            'projectionlayers="' + projectionLayers + '"'
+            if projectionLayers else '')
+
+        inputs['replicates'] = [self._numReplicates,
+                                self._replicateType,
+                                self._replicateTestPercent,
+                                self._replicateSeed]
+
+        if self._manifest.isCurrent('replicates', inputs):
+
+            print('Replicates\' inputs are unchanged, so their outputs in ' +
+                  self._outputDirectory + ' are reused.')
+
+            return
+
+        # Run as many replicates at once as there are cores and memory.
+        heapMb, threads, numJvms = self.planJvm(
+            min(self._numReplicates, multiprocessing.cpu_count()),
+            True)
+
+        runner = ReplicateRunner(samplesFile,
+                                 environment,
+                                 self._outputDirectory,
+                                 self._numReplicates,
+                                 self._replicateType,
+                                 self._replicateTestPercent,
+                                 self._replicateSeed,
+                                 heapMb,
+                                 threads,
+                                 numJvms,
+                                 projectionLayers)
+
+        with RunTrace.stage('replicates',
+                            numReplicates=self._numReplicates,
+                            heapMb=heapMb,
+                            threads=threads):
+
+            meanPath, stdevPath, summaryPath = runner.run(jarFile, useCelery)
+
+        print('Wrote replicate summary ' + summaryPath)
+        outputPaths = [summaryPath]
+
+        if meanPath:
+
+            print('Wrote ' + meanPath + ' and ' + stdevPath)
+            outputPaths += [meanPath, stdevPath]
+
+        self._manifest.record('replicates', inputs, outputPaths)
+
+    # -------------------------------------------------------------------------
+    # setForce
+    #
+    # When true, run re-runs every stage, even those whose inputs are
+    # unchanged.  See RunManifest.
+    # -------------------------------------------------------------------------
+    def setForce(self, force):
+
+        self._manifest.setForce(force)
+
+    # -------------------------------------------------------------------------
+    # setJvmPlanner
+    #
+    # This replaces the default JvmPlanner, for example with one overriding
+    # the heap size or threads.
+    # -------------------------------------------------------------------------
+    def setJvmPlanner(self, jvmPlanner):
+
+        self._jvmPlanner = jvmPlanner
+
+    # -------------------------------------------------------------------------
+    # setNumJvms
+    #
+    # This is the number of maxent.jar processes expected to run at once,
+    # like the workers of a MaxEntService, so each plans a share of the
+    # host's memory and threads.
+    # -------------------------------------------------------------------------
+    def setNumJvms(self, numJvms):
+
+        self._numJvms = max(numJvms, 1)
+
+    # -------------------------------------------------------------------------
+    # setPointThinner
+    #
+    # This thins the presence points before they are written to the samples
+    # file, or None to keep every point.  See PointThinner.
+    # -------------------------------------------------------------------------
+    def setPointThinner(self, pointThinner):
+
+        self._pointThinner = pointThinner
+        self._presencePoints = None
+
+    # -------------------------------------------------------------------------
+    # setProjection
+    #
+    # With an output format of MaxEntProjector's, finish projects the model
+    # onto the prepared layers, with numProcesses processes.  None turns
+    # projection off.
+    # -------------------------------------------------------------------------
+    def setProjection(self, outputFormat, numProcesses=1):
+
+        self._projectionFormat = outputFormat
+        self._projectionProcesses = numProcesses
+
+    # -------------------------------------------------------------------------
+    # setResolution
+    #
+    # This sets the cell size of the target grid, instead of the finest of
+    # the layers' natural resolutions.  It must be set before the grid is
+    # planned.
+    # -------------------------------------------------------------------------
+    def setResolution(self, resolution):
+
+        self._resolution = resolution
+        self._targetGrid = None
+        self._presencePoints = None
+
+    # -------------------------------------------------------------------------
+    # setReplicates
+    #
+    # When numReplicates is nonzero, run fits that many replicates instead of
+    # one model.  The replicate type is one of ReplicateRunner's.
+    # -------------------------------------------------------------------------
+    def setReplicates(self,
+                      numReplicates,
+                      replicateType='crossvalidate',
+                      testPercent=25,
+                      seed=0):
+
+        self._numReplicates = numReplicates
+        self._replicateType = replicateType
+        self._replicateTestPercent = testPercent
+        self._replicateSeed = seed
+
+    # -------------------------------------------------------------------------
+    # setSwd
+    #
+    # When true, run fits the model in samples-with-data mode: the layer
+    # values at the presence points and at numBackground seeded background
+    # points are written to CSV files, and maxent.jar reads those instead of
+    # the rasters.  With project, maxent.jar also projects the model onto the
+    # full grid.
+    # -------------------------------------------------------------------------
+    def setSwd(self,
+               useSwd,
+               numBackground=SwdSampler.DEFAULT_NUM_BACKGROUND,
+               seed=0,
+               project=False):
+
+        self._useSwd = useSwd
+        self._swdNumBackground = numBackground
+        self._swdSeed = seed
+        self._swdProject = project
+
+    # -------------------------------------------------------------------------
+    # setTargetGrid
+    #
+    # This sets the grid every layer is warped onto, instead of planning it
+    # from the observations' envelope.
+    # -------------------------------------------------------------------------
+    def setTargetGrid(self, targetGrid):
+
+        self._targetGrid = targetGrid
+        self._presencePoints = None
+
+    # -------------------------------------------------------------------------
+    # setUseMxe
+    #
+    # When true, run converts the prepared layers to .mxe grids, and
+    # maxent.jar reads those instead of parsing the ASCII grids.
+    # -------------------------------------------------------------------------
+    def setUseMxe(self, useMxe):
+
+        self._useMxe = useMxe
+
+    # -------------------------------------------------------------------------
+    # setUseStack
+    #
+    # When true, run also writes the prepared layers as a LayerStack in the
+    # stack directory, which SWD sampling then reads instead of the ASCII
+    # grids.
+    # -------------------------------------------------------------------------
+    def setUseStack(self, useStack):
+
+        self._useStack = useStack
+
+    # -------------------------------------------------------------------------
+    # targetGrid
+    #
+    # This plans the grid every layer is warped onto, once per request.  See
+    # TargetGrid.
+    # -------------------------------------------------------------------------
+    def targetGrid(self):
+
+        if self._targetGrid is None:
+
+            self._targetGrid = TargetGrid.plan(
+                self._images,
+                self._imageSRS,
+                self._observationFile.envelope(),
+                self._resolution)
+
+            print('Target grid: ' + str(self._targetGrid))
+
+        return self._targetGrid
+
+    # -------------------------------------------------------------------------
+    # train
+    #
+    # This fits the model, or the replicates set by setReplicates.
+    # -------------------------------------------------------------------------
+    def train(self, jarFile=MAX_ENT_JAR):
+
+        if self._numReplicates:
+            self.runReplicates(jarFile)
+
+        else:
+            self.runMaxEntJar(jarFile)
+
+    # -------------------------------------------------------------------------
+    # traceDirectory
+    #
+    # While a RunTrace is recording, this is the directory where workers
+    # save their traces for it to merge.  Otherwise, it is None.
+    # -------------------------------------------------------------------------
+    def traceDirectory(self):
+
+        if not RunTrace.isTracing():
+            return None
+
+        traceDir = os.path.join(self._outputDirectory, '.trace')
+
+        if not os.path.exists(traceDir):
+            os.mkdir(traceDir)
+
+        return traceDir
+
+    # -------------------------------------------------------------------------
+    # writeSwdFiles
+    #
+    # This writes the samples-with-data files from the prepared layers,
+    # unless the samples, layers and sampling are those they were last
+    # written from.  See SwdSampler.
+    # -------------------------------------------------------------------------
+    def writeSwdFiles(self):
+
+        ascPaths = glob.glob(os.path.join(self._ascDir, '*.asc'))
+
+        inputs = {'samples': self._manifest.digest(self._maxEntSpeciesFile),
+                  'layers': self._manifest.digests(ascPaths),
+                  'numBackground': self._swdNumBackground,
+                  'seed': self._swdSeed}
+
+        if self._manifest.isCurrent('swd', inputs):
+
+            print('SWD inputs are unchanged, so ' + self._swdSamplesFile +
+                  ' and ' + self._swdBackgroundFile + ' are reused.')
+
+            return
+
+        xs, ys = self.presencePoints()
+
+        with RunTrace.stage('writeSwdFiles', numLayers=len(ascPaths)):
+
+            sampler = SwdSampler(ascPaths,
+                                 self._swdNumBackground,
+                                 self._swdSeed,
+                                 LayerStack(self._stackDir)
+                                 if self._useStack else None)
+
+            numPresence, numBackground = sampler.write(
+                self._observationFile.species().replace(' ', '_'),
+                xs,
+                ys,
+                self._swdSamplesFile,
+                self._swdBackgroundFile)
 
-        cmd = baseCmd + \
-            '-s "' + self._maxEntSpeciesFile + '" ' + \
-            '-e "' + self._ascDir + '" ' + \
-            '-o "' + self._outputDirectory + '"'
+        print('Wrote ' + str(numPresence) + ' presence and ' +
+              str(numBackground) + ' background SWD points.')
 
-        SystemCommand(cmd, None, True)
+        self._manifest.record('swd',
+                              inputs,
+                              [self._swdSamplesFile, self._swdBackgroundFile])
@@ -1,28 +1,129 @@
 # -*- coding: utf-8 -*-
 
-from osgeo.osr import SpatialReference
+import os
 
-from celery import group
+from celery import chord
 
 from core.model.CeleryConfiguration import app
+from core.model.SystemCommand import SystemCommand
 
+from maxent.model.LayerCache import LayerCache
+from maxent.model.LayerPreparer import LayerPreparer
 from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.RunTrace import RunTrace
+from maxent.model.TaskCollector import TaskCollector
+from maxent.model.TaskPayload import TaskPayload
 
 
 # -----------------------------------------------------------------------------
 # class MaxEntRequestCelery
+#
+# Images are prepared in parallel, one task each, onto the request's target
+# grid.  With setTileRows, each image taller than a tile is instead split
+# into tiles of rows prepared by separate tasks, and a final task mosaics
+# them, so a few very large images are not each bound to one worker.  Tiled
+# images bypass the layer cache.
+#
+# Results are collected as they arrive by a TaskCollector.  Tasks retry
+# with exponential backoff before failing.  When some images fail, the rest
+# are still prepared, and cached with a LayerCache, before the failures are
+# reported.
+#
+# While a RunTrace is recording, each task traces its stages to the
+# request's trace directory, and they are merged once the tasks finish.
 # -----------------------------------------------------------------------------
 class MaxEntRequestCelery(MaxEntRequest):
 
+    MAX_RETRIES = 3
+    RETRY_BACKOFF_MAX = 600
+
     # -------------------------------------------------------------------------
     # __init__
     # -------------------------------------------------------------------------
-    def __init__(self, observationFile, listOfImages, outputDirectory):
+    def __init__(self,
+                 observationFile,
+                 listOfImages,
+                 outputDirectory,
+                 layerCache=None):
 
         # Initialize the base class.
         super(MaxEntRequestCelery, self).__init__(observationFile,
                                                   listOfImages,
-                                                  outputDirectory)
+                                                  outputDirectory,
+                                                  layerCache)
+
+        self._tileRows = None
+        self._taskTimeout = None
+        self._stragglerFactor = 3.0
+
+    # -------------------------------------------------------------------------
+    # _collect
+    #
+    # This collects the results of a list of (image, signature) in image
+    # order, raising an error naming every image that failed.
+    # -------------------------------------------------------------------------
+    def _collect(self, imageSignatures, stragglerFactor):
+
+        collector = TaskCollector(self._taskTimeout, stragglerFactor)
+
+        results, failures = collector.collect(
+            [(image.fileName(), signature)
+             for image, signature in imageSignatures])
+
+        if RunTrace.isTracing():
+            RunTrace.current().merge(self.traceDirectory())
+
+        if failures:
+
+            raise RuntimeError(str(len(failures)) + ' of ' +
+                               str(len(imageSignatures)) +
+                               ' images failed: ' +
+                               '; '.join(name + ': ' + failures[name]
+                                         for name in sorted(failures)))
+
+        return [results[image.fileName()] for image, sig in imageSignatures]
+
+    # -------------------------------------------------------------------------
+    # mosaicTiles
+    #
+    # This is the callback of an image's tile tasks.  See LayerPreparer.mosaic
+    # and TaskPayload.
+    #
+    # The mosaic is renamed into place once complete, so a retry after it was
+    # written does not redo it.  Removing the tiles' directory is best effort.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    @app.task(serializer='json',
+              autoretry_for=(Exception,),
+              max_retries=MAX_RETRIES,
+              retry_backoff=True,
+              retry_backoff_max=RETRY_BACKOFF_MAX)
+    def mosaicTiles(tilePaths, payload):
+
+        ascImagePath = payload['ascImagePath']
+
+        if not os.path.exists(ascImagePath):
+
+            imagePath, srs, envelope = TaskPayload.decode(payload)
+
+            with RunTrace.recording(payload.get('traceDir')):
+
+                LayerPreparer.mosaic(imagePath,
+                                     srs,
+                                     envelope,
+                                     tilePaths,
+                                     ascImagePath,
+                                     payload['resolution'])
+
+        try:
+            os.rmdir(os.path.dirname(tilePaths[0]))
+
+        except OSError:
+
+            # Do not complain, if another attempt removed it or it is busy.
+            pass
+
+        return ascImagePath
 
     # -------------------------------------------------------------------------
     # prepareImage
@@ -30,21 +131,41 @@ class MaxEntRequestCelery(MaxEntRequest):
     # See MaxEntRequest.prepareImage's comments.
     #
     # This method is distributed using Celery, which requires serialized
-    # arguments.  The Innovation Lab serialized with Python's Pickle.  The
-    # IL classes representing imageFile and envelope arguments were
-    # modified for Pickle serialization.  The ascDir argument, a string, is
-    # serialized natively by Pickle.  The SRS argument is neither natively
-    # serializable or available for us to add serialization; therefore,
-    # it is passed in proj4 form, a string.
+    # arguments.  The Innovation Lab serialized the image, envelope and a
+    # proj4 SRS with Python's Pickle.  Instead, the arguments are a
+    # TaskPayload of plain values, serialized as JSON, with the ascDir, and
+    # the cacheDir and cacheMaxBytes of a LayerCache.
+    #
+    # A LayerCache holds open state, so the worker builds its own from the
+    # cache directory and size limit.
     # -------------------------------------------------------------------------
     @staticmethod
-    @app.task(serializer='pickle')
-    def prepareImage(image, srsProj4, envelope, ascDir):
+    @app.task(serializer='json',
+              autoretry_for=(Exception,),
+              max_retries=MAX_RETRIES,
+              retry_backoff=True,
+              retry_backoff_max=RETRY_BACKOFF_MAX)
+    def prepareImage(payload):
 
         print('In MaxEntRequestCelery.prepareImage ...')
-        srs = SpatialReference()
-        srs.ImportFromProj4(srsProj4)
-        ascImagePath = MaxEntRequest.prepareImage(image, srs, envelope, ascDir)
+        imagePath, srs, envelope = TaskPayload.decode(payload)
+        layerCache = None
+
+        if payload.get('cacheDir'):
+
+            layerCache = LayerCache(payload['cacheDir'],
+                                    payload['cacheMaxBytes'])
+
+        with RunTrace.recording(payload.get('traceDir')):
+
+            ascImagePath = MaxEntRequest.prepareImagePath(
+                imagePath,
+                srs,
+                envelope,
+                payload['ascDir'],
+                layerCache,
+                payload['resolution'])
+
         return ascImagePath
 
     # -------------------------------------------------------------------------
@@ -54,22 +175,228 @@ class MaxEntRequestCelery(MaxEntRequest):
 
         print('In MaxEntRequestCelery.prepareImages ...')
 
-        wpi = group(MaxEntRequestCelery.prepareImage.s(
-                                image,
-                                self._imageSRS.ExportToProj4(),
-                                self._observationFile.envelope(),
-                                self._ascDir) for image in self._images)
+        if self._tileRows:
+            return self._prepareImagesInTiles()
+
+        grid = self.targetGrid()
+        cacheDir = None
+        cacheMaxBytes = LayerCache.DEFAULT_MAX_BYTES
+
+        if self._layerCache:
+
+            cacheDir = self._layerCache.cacheDir()
+            cacheMaxBytes = self._layerCache.maxBytes()
+
+        payloads = [TaskPayload.encode(image.fileName(),
+                                       self._imageSRS,
+                                       grid.envelope(),
+                                       grid.cellSize(),
+                                       ascDir=self._ascDir,
+                                       cacheDir=cacheDir,
+                                       cacheMaxBytes=cacheMaxBytes,
+                                       traceDir=self.traceDirectory())
+                    for image in self._images]
+
+        if self._layerCache:
 
-        result = wpi.apply_async()
-        result.get()    # Waits for wpi to finish.
+            # Workers count their own hits, so count them before dispatch,
+            # keyed on the decoded payloads, as the workers key them.
+            hits = 0
 
-        return result
+            for payload in payloads:
+
+                imagePath, srs, envelope = TaskPayload.decode(payload)
+
+                if self._layerCache.contains(LayerCache.key(
+                        imagePath,
+                        srs,
+                        envelope,
+                        payload['resolution'])):
+
+                    hits += 1
+
+            print('Layer cache ' + cacheDir + ': ' + str(hits) +
+                  ' hits, ' + str(len(payloads) - hits) + ' misses')
+
+        MaxEntRequestCelery.reportPayloads(payloads)
+
+        imageSignatures = [(image, MaxEntRequestCelery.prepareImage.s(payload))
+                           for image, payload in zip(self._images, payloads)]
+
+        return self._collect(imageSignatures, self._stragglerFactor)
 
     # -------------------------------------------------------------------------
-    # run
+    # _prepareImagesInTiles
+    #
+    # When the target grid is taller than a tile, each image becomes a chord
+    # of tile tasks and a mosaic task.  Otherwise, images are prepared whole,
+    # as usual.  The tiles are written to a directory beside the layer.
+    # -------------------------------------------------------------------------
+    def _prepareImagesInTiles(self):
+
+        grid = self.targetGrid()
+        envelope = grid.envelope()
+        resolution = grid.cellSize()
+        tiles = LayerPreparer.tileRanges(grid.rows(), self._tileRows)
+        traceDir = self.traceDirectory()
+        imageSignatures = []
+        payloads = []
+
+        for image in self._images:
+
+            name = os.path.splitext(os.path.basename(image.fileName()))[0]
+            ascImagePath = os.path.join(self._ascDir, name + '.asc')
+
+            if os.path.exists(ascImagePath):
+
+                print(image.fileName(), 'was previously prepared.')
+                continue
+
+            if len(tiles) == 1:
+
+                payload = TaskPayload.encode(image.fileName(),
+                                             self._imageSRS,
+                                             envelope,
+                                             resolution,
+                                             ascDir=self._ascDir,
+                                             traceDir=traceDir)
+
+                payloads.append(payload)
+
+                imageSignatures.append(
+                    (image, MaxEntRequestCelery.prepareImage.s(payload)))
+
+                continue
+
+            tileDir = os.path.join(self._ascDir, '.tiles_' + name)
+
+            if not os.path.exists(tileDir):
+                os.makedirs(tileDir)
+
+            print(image.fileName() + ': ' + str(len(tiles)) + ' tiles')
+
+            tilePayloads = [TaskPayload.encode(
+                                image.fileName(),
+                                self._imageSRS,
+                                envelope,
+                                resolution,
+                                tilePath=os.path.join(tileDir,
+                                                      'tile' + str(row)),
+                                row=row,
+                                numRows=numRows,
+                                traceDir=traceDir)
+                            for row, numRows in tiles]
+
+            payloads += tilePayloads
+
+            mosaicPayload = TaskPayload.encode(image.fileName(),
+                                               self._imageSRS,
+                                               envelope,
+                                               resolution,
+                                               ascImagePath=ascImagePath,
+                                               traceDir=traceDir)
+
+            tileTasks = [MaxEntRequestCelery.prepareTile.s(payload)
+                         for payload in tilePayloads]
+
+            imageSignatures.append(
+                (image,
+                 chord(tileTasks,
+                       MaxEntRequestCelery.mosaicTiles.s(mosaicPayload))))
+
+        MaxEntRequestCelery.reportPayloads(payloads)
+
+        # Resubmitting a chord would race its tiles, so none is speculative.
+        return self._collect(imageSignatures, None)
+
+    # -------------------------------------------------------------------------
+    # prepareTile
+    #
+    # See LayerPreparer.prepareTile and TaskPayload.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    @app.task(serializer='json',
+              autoretry_for=(Exception,),
+              max_retries=MAX_RETRIES,
+              retry_backoff=True,
+              retry_backoff_max=RETRY_BACKOFF_MAX)
+    def prepareTile(payload):
+
+        imagePath, srs, envelope = TaskPayload.decode(payload)
+
+        with RunTrace.recording(payload.get('traceDir')):
+
+            return LayerPreparer.prepareTile(imagePath,
+                                             srs,
+                                             envelope,
+                                             payload['tilePath'],
+                                             payload['row'],
+                                             payload['numRows'],
+                                             payload['resolution'])
+
+    # -------------------------------------------------------------------------
+    # reportPayloads
+    #
+    # This prints the number and mean size of the task payloads, the bytes
+    # each task sends through the broker.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def reportPayloads(payloads):
+
+        if not payloads:
+            return
+
+        numBytes = sum(TaskPayload.numBytes(payload) for payload in payloads)
+
+        print(str(len(payloads)) + ' task payloads, ' +
+              str(numBytes // len(payloads)) + ' bytes each on average')
+
+    # -------------------------------------------------------------------------
+    # runMaxEntCommand
+    #
+    # This runs one maxent.jar command line, like a replicate's, on a worker.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    @app.task(serializer='json',
+              autoretry_for=(Exception,),
+              max_retries=MAX_RETRIES,
+              retry_backoff=True,
+              retry_backoff_max=RETRY_BACKOFF_MAX)
+    def runMaxEntCommand(cmd):
+
+        SystemCommand(cmd, None, True)
+
+    # -------------------------------------------------------------------------
+    # setTaskTimeout
+    #
+    # This sets how many seconds an image's task may run before it fails, and
+    # how many times the median task duration a task may run before another
+    # copy is submitted.  None disables either.  See TaskCollector.
+    # -------------------------------------------------------------------------
+    def setTaskTimeout(self, timeout, stragglerFactor=3.0):
+
+        self._taskTimeout = timeout
+        self._stragglerFactor = stragglerFactor
+
+    # -------------------------------------------------------------------------
+    # setTileRows
+    #
+    # This sets the height of the tiles large images are split into, or None
+    # to prepare every image whole.
+    # -------------------------------------------------------------------------
+    def setTileRows(self, tileRows):
+
+        self._tileRows = tileRows
+
+    # -------------------------------------------------------------------------
+    # train
+    #
+    # Replicates run as Celery tasks.
     # -------------------------------------------------------------------------
-    def run(self, jarFile=MaxEntRequest.MAX_ENT_JAR):
+    def train(self, jarFile=MaxEntRequest.MAX_ENT_JAR):
 
-        self.prepareImages()
-        self.runMaxEntJar(jarFile)
+        if self._numReplicates:
+            self.runReplicates(jarFile, True)
 
+        else:
+            self.runMaxEntJar(jarFile)
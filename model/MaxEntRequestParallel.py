@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import multiprocessing
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.RunTrace import RunTrace
+
+
+# -----------------------------------------------------------------------------
+# prepareImageInProcess
+#
+# This is the process pool's entry point.  It must be a module-level function
+# for the pool to pickle it.  As with MaxEntRequestCelery, the SRS is not
+# picklable, so it is passed in WKT form.  It returns the prepared path with
+# the layer cache hits and misses this call added to the worker's copy of the
+# cache.  With a trace directory, the worker traces its stages there.  See
+# RunTrace.recording.
+# -----------------------------------------------------------------------------
+def prepareImageInProcess(image,
+                          srsWkt,
+                          envelope,
+                          ascDir,
+                          layerCache,
+                          resolution=None,
+                          traceDir=None):
+
+    srs = SpatialReference()
+    srs.ImportFromWkt(srsWkt)
+    hits = layerCache.hits() if layerCache else 0
+    misses = layerCache.misses() if layerCache else 0
+
+    with RunTrace.recording(traceDir):
+
+        ascImagePath = MaxEntRequest.prepareImage(image,
+                                                  srs,
+                                                  envelope,
+                                                  ascDir,
+                                                  layerCache,
+                                                  resolution)
+
+    if layerCache:
+
+        hits = layerCache.hits() - hits
+        misses = layerCache.misses() - misses
+
+    return ascImagePath, hits, misses
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntRequestParallel
+#
+# This prepares layers in a local process pool, for multi-core nodes without
+# a Celery broker.  Progress is reported as each image finishes, and the
+# first failure cancels the images not yet started and is raised.
+# -----------------------------------------------------------------------------
+class MaxEntRequestParallel(MaxEntRequest):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 observationFile,
+                 listOfImages,
+                 outputDirectory,
+                 layerCache=None,
+                 numWorkers=None):
+
+        # Initialize the base class.
+        super(MaxEntRequestParallel, self).__init__(observationFile,
+                                                    listOfImages,
+                                                    outputDirectory,
+                                                    layerCache)
+
+        self._numWorkers = numWorkers or multiprocessing.cpu_count()
+
+    # -------------------------------------------------------------------------
+    # prepareImages
+    # -------------------------------------------------------------------------
+    def prepareImages(self):
+
+        numLeft = len(self._imagesToProcess)
+        ascGifs = [None] * numLeft
+        numWorkers = min(self._numWorkers, max(numLeft, 1))
+        executor = concurrent.futures.ProcessPoolExecutor(numWorkers)
+        futures = {}
+        grid = self.targetGrid()
+        traceDir = self.traceDirectory()
+
+        try:
+            for index, gif in enumerate(self._imagesToProcess):
+
+                future = executor.submit(prepareImageInProcess,
+                                         gif,
+                                         self._imageSRS.ExportToWkt(),
+                                         grid.envelope(),
+                                         self._ascDir,
+                                         self._layerCache,
+                                         grid.cellSize(),
+                                         traceDir)
+
+                futures[future] = index
+
+            for future in concurrent.futures.as_completed(futures):
+
+                ascImagePath, hits, misses = future.result()
+                ascGifs[futures[future]] = ascImagePath
+
+                if self._layerCache:
+                    self._layerCache.addCounts(hits, misses)
+
+                numLeft -= 1
+                print(numLeft, ' images remaining to process.')
+
+        except Exception:
+
+            # Fail fast: drop the images not yet started.
+            for future in futures:
+                future.cancel()
+
+            executor.shutdown(wait=False)
+            raise
+
+        executor.shutdown(wait=True)
+
+        if traceDir:
+            RunTrace.current().merge(traceDir)
+
+        if self._layerCache:
+            print(self._layerCache.report())
+
+        return ascGifs
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import http.server
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+import numpy
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.ImageIndex import ImageIndex
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.MaxEntServiceHandler import MaxEntServiceHandler
+from maxent.model.ObservationFile import ObservationFile
+from maxent.model.PipelineScheduler import PipelineScheduler
+from maxent.model.PointThinner import PointThinner
+from maxent.model.ReplicateRunner import ReplicateRunner
+from maxent.model.SwdSampler import SwdSampler
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntService
+#
+# This runs MaxEntRequests in a long-lived process, so repeated requests do
+# not pay again for imports, SRS setup, image discovery and parsing the
+# observation file.  Between requests it keeps warm:
+#
+# - an ImageIndex per image directory, and the images listed from it, until
+#   the directory's files change;
+# - the most recent observation files, parsed and transformed to the images'
+#   SRS, until the file changes;
+# - SpatialReferences by EPSG code;
+# - prepared layers, in an optional LayerCache, and each output directory's
+#   RunManifest, which skips the stages whose inputs are unchanged.
+#
+# Requests wait in a bounded queue, and are refused when it is full.  They
+# leave it for a PipelineScheduler, which prepares numPreparing requests'
+# layers while numWorkers others train, each in one maxent.jar planned for a
+# share of the host, and the next request is taken from the queue only when
+# the pipeline has room.  Requests writing to the same output directory run
+# one at a time.
+#
+# A request is a dictionary of parameters, named like MaxEntRequest's
+# setters:
+#
+# - required:  observationFile, species, epsg, imageDir, outputDir
+# - optional:  background, force, mxe, project, projection, replicates,
+#              replicateType, resolution, seed, stack, swd, testPercent, thin,
+#              thinValue
+#
+# listen serves them over HTTP.  See MaxEntServiceHandler.
+# -----------------------------------------------------------------------------
+class MaxEntService(object):
+
+    DEFAULT_HOST = '127.0.0.1'
+    DEFAULT_MAX_QUEUED = 100
+    DEFAULT_PORT = 8765
+
+    # Finished requests whose status and latency are kept.
+    MAX_FINISHED = 1000
+    MAX_OBSERVATION_FILES = 16
+
+    OPTIONAL = ('background', 'force', 'mxe', 'project', 'projection',
+                'replicates', 'replicateType', 'resolution', 'seed', 'stack',
+                'swd', 'testPercent', 'thin', 'thinValue')
+
+    REQUIRED = ('epsg', 'imageDir', 'observationFile', 'outputDir',
+                'species')
+
+    FAILED = 'failed'
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 numWorkers=1,
+                 maxQueued=DEFAULT_MAX_QUEUED,
+                 layerCache=None,
+                 jvmPlanner=None,
+                 imagePattern='*.nc',
+                 numPreparing=1):
+
+        if numWorkers < 1 or numPreparing < 1:
+
+            raise RuntimeError('A service needs at least one worker and ' +
+                               'one preparing thread.')
+
+        self._numWorkers = numWorkers
+        self._numPreparing = numPreparing
+        self._layerCache = layerCache
+        self._jvmPlanner = jvmPlanner or JvmPlanner()
+        self._imagePattern = imagePattern
+        self._queue = queue.Queue(maxQueued)
+        self._lock = threading.Lock()
+        self._cacheLock = threading.Lock()
+        self._requests = {}
+        self._finished = collections.deque()
+        self._latencies = collections.deque(maxlen=MaxEntService.MAX_FINISHED)
+        self._counts = {MaxEntService.FAILED: 0, MaxEntService.SUCCEEDED: 0}
+        self._numRunning = 0
+        self._imageIndexes = {}
+        self._imageLists = {}
+        self._observationFiles = collections.OrderedDict()
+        self._outputLocks = {}
+        self._srses = {}
+        self._dispatcher = None
+        self._scheduler = None
+        self._server = None
+
+    # -------------------------------------------------------------------------
+    # build
+    #
+    # This returns the MaxEntRequest for a request's parameters, which the
+    # pipeline runs.
+    # -------------------------------------------------------------------------
+    def build(self, params):
+
+        srs = self._srs(params['epsg'])
+        images = self._imageList(params['imageDir'], srs)
+
+        observationFile = self._observations(params['observationFile'],
+                                             params['species'],
+                                             images[0].srs())
+
+        maxEntReq = MaxEntRequest(observationFile,
+                                  images,
+                                  params['outputDir'],
+                                  self._layerCache)
+
+        maxEntReq.setForce(params.get('force', False))
+        maxEntReq.setJvmPlanner(self._jvmPlanner)
+        maxEntReq.setResolution(params.get('resolution'))
+
+        if params.get('thin'):
+
+            maxEntReq.setPointThinner(PointThinner(params['thin'],
+                                                   params.get('thinValue')))
+
+        maxEntReq.setUseMxe(params.get('mxe', False))
+        maxEntReq.setUseStack(params.get('stack', False))
+        maxEntReq.setProjection(params.get('projection'))
+
+        maxEntReq.setSwd(params.get('swd', False),
+                         params.get('background',
+                                    SwdSampler.DEFAULT_NUM_BACKGROUND),
+                         params.get('seed', 0),
+                         params.get('project', False))
+
+        maxEntReq.setReplicates(params.get('replicates', 0),
+                                params.get('replicateType',
+                                           ReplicateRunner.CROSSVALIDATE),
+                                params.get('testPercent', 25),
+                                params.get('seed', 0))
+
+        return maxEntReq
+
+    # -------------------------------------------------------------------------
+    # _complete
+    #
+    # This is the pipeline's callback when a request leaves it, or fails
+    # before entering it.
+    # -------------------------------------------------------------------------
+    def _complete(self, requestId, error):
+
+        with self._lock:
+
+            status = self._requests[requestId]
+            params = status['params']
+
+        self._outputLock(params['outputDir']).release()
+        runSeconds = time.time() - status['started']
+
+        state = MaxEntService.FAILED if error else MaxEntService.SUCCEEDED
+
+        with self._lock:
+
+            status['state'] = state
+            status['runSeconds'] = runSeconds
+
+            if error:
+                status['error'] = error
+
+            self._numRunning -= 1
+            self._counts[state] += 1
+            self._latencies.append((status['waitSeconds'], runSeconds))
+            self._finished.append(requestId)
+
+            if len(self._finished) > MaxEntService.MAX_FINISHED:
+                del self._requests[self._finished.popleft()]
+
+        print('Request ' + requestId + ' ' + state + ' in ' +
+              '%.1f' % runSeconds + ' s after waiting ' +
+              '%.1f' % status['waitSeconds'] + ' s; ' +
+              str(self._queue.qsize()) + ' queued')
+
+    # -------------------------------------------------------------------------
+    # _dispatch
+    #
+    # This moves requests from the queue to the pipeline, each once the
+    # pipeline has room for it and no other request is writing to its
+    # output directory.
+    # -------------------------------------------------------------------------
+    def _dispatch(self):
+
+        while True:
+
+            self._scheduler.reserve()
+            requestId = self._queue.get()
+
+            if requestId is None:
+
+                self._scheduler.release()
+                return
+
+            with self._lock:
+                params = self._requests[requestId]['params']
+
+            self._outputLock(params['outputDir']).acquire()
+
+            with self._lock:
+
+                status = self._requests[requestId]
+                status['state'] = MaxEntService.RUNNING
+                status['started'] = time.time()
+                status['waitSeconds'] = status['started'] - \
+                    status['submitted']
+
+                self._numRunning += 1
+
+            try:
+                maxEntReq = self.build(params)
+
+            except Exception as e:
+
+                traceback.print_exc()
+                self._scheduler.release()
+                self._complete(requestId, str(e))
+                continue
+
+            self._scheduler.submit(requestId, maxEntReq, self._complete)
+
+    # -------------------------------------------------------------------------
+    # _imageList
+    #
+    # This returns a directory's images, opening only new and changed files,
+    # and reusing the last list while the directory is unchanged.
+    # -------------------------------------------------------------------------
+    def _imageList(self, imageDir, srs):
+
+        imageDir = os.path.realpath(imageDir)
+        key = (imageDir, srs.ExportToWkt())
+
+        with self._cacheLock:
+
+            if imageDir not in self._imageIndexes:
+
+                self._imageIndexes[imageDir] = \
+                    ImageIndex(imageDir, self._imagePattern)
+
+            index = self._imageIndexes[imageDir].update()
+            entries, images = self._imageLists.get(key, (None, None))
+
+            if entries != index.entries():
+
+                images = index.images(srs)
+                self._imageLists[key] = (index.entries(), images)
+
+        return images
+
+    # -------------------------------------------------------------------------
+    # listen
+    #
+    # This binds the HTTP server, and returns its host and port.  Port 0
+    # picks a free port.  Call serveForever to handle requests.
+    # -------------------------------------------------------------------------
+    def listen(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+
+        self._server = http.server.ThreadingHTTPServer((host, port),
+                                                       MaxEntServiceHandler)
+
+        self._server.daemon_threads = True
+        self._server.service = self
+
+        return self._server.server_address
+
+    # -------------------------------------------------------------------------
+    # _observations
+    #
+    # This returns an observation file transformed to srs, parsing it only
+    # when it is not among the most recently used or has changed.  It is
+    # transformed here, under the lock, so MaxEntRequest's transformTo is a
+    # no-op and concurrent requests can share it.
+    # -------------------------------------------------------------------------
+    def _observations(self, path, species, srs):
+
+        fileStat = os.stat(path)
+
+        key = (os.path.realpath(path),
+               species,
+               fileStat.st_size,
+               fileStat.st_mtime,
+               srs.ExportToWkt())
+
+        with self._cacheLock:
+
+            observationFile = self._observationFiles.pop(key, None)
+
+            if observationFile is None:
+
+                observationFile = ObservationFile(path, species)
+                observationFile.transformTo(srs)
+
+            self._observationFiles[key] = observationFile
+
+            while len(self._observationFiles) > \
+                    MaxEntService.MAX_OBSERVATION_FILES:
+
+                self._observationFiles.popitem(last=False)
+
+        return observationFile
+
+    # -------------------------------------------------------------------------
+    # _outputLock
+    # -------------------------------------------------------------------------
+    def _outputLock(self, outputDir):
+
+        with self._lock:
+
+            return self._outputLocks.setdefault(os.path.realpath(outputDir),
+                                                threading.Lock())
+
+    # -------------------------------------------------------------------------
+    # request
+    #
+    # This returns a copy of a request's status, or None when it is unknown.
+    # -------------------------------------------------------------------------
+    def request(self, requestId):
+
+        with self._lock:
+
+            status = self._requests.get(requestId)
+
+            return dict(status) if status else None
+
+    # -------------------------------------------------------------------------
+    # serveForever
+    #
+    # This handles HTTP requests until stop is called from another thread.
+    # -------------------------------------------------------------------------
+    def serveForever(self):
+
+        if not self._server:
+            raise RuntimeError('Call listen before serveForever.')
+
+        self._server.serve_forever()
+
+    # -------------------------------------------------------------------------
+    # _srs
+    # -------------------------------------------------------------------------
+    def _srs(self, epsg):
+
+        with self._cacheLock:
+
+            if epsg not in self._srses:
+
+                srs = SpatialReference()
+                srs.ImportFromEPSG(int(epsg))
+                self._srses[epsg] = srs
+
+            return self._srses[epsg]
+
+    # -------------------------------------------------------------------------
+    # start
+    #
+    # This starts the pipeline and the thread feeding it from the queue, and
+    # returns the service.
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self._scheduler = PipelineScheduler(self._numPreparing,
+                                            self._numWorkers).start()
+
+        self._dispatcher = threading.Thread(target=self._dispatch,
+                                            name='MaxEntService-dispatch',
+                                            daemon=True)
+
+        self._dispatcher.start()
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # stats
+    #
+    # This returns the queue depth, the number of requests running and
+    # finished, and the median, 95th percentile and maximum seconds the
+    # recent requests waited in the queue and ran.
+    # -------------------------------------------------------------------------
+    def stats(self):
+
+        with self._lock:
+
+            latencies = numpy.array(self._latencies, dtype=numpy.float64)
+
+            stats = {'queueDepth': self._queue.qsize(),
+                     'maxQueued': self._queue.maxsize,
+                     'workers': self._numWorkers,
+                     'preparing': self._numPreparing,
+                     'running': self._numRunning,
+                     'succeeded': self._counts[MaxEntService.SUCCEEDED],
+                     'failed': self._counts[MaxEntService.FAILED]}
+
+        for i, name in enumerate(('waitSeconds', 'runSeconds')):
+
+            if not len(latencies):
+                continue
+
+            stats[name] = {'p50': float(numpy.median(latencies[:, i])),
+                           'p95': float(numpy.percentile(latencies[:, i],
+                                                         95)),
+                           'max': float(latencies[:, i].max())}
+
+        return stats
+
+    # -------------------------------------------------------------------------
+    # stop
+    #
+    # This stops the HTTP server, lets the pipeline finish the requests
+    # already queued, and waits for them.
+    # -------------------------------------------------------------------------
+    def stop(self):
+
+        if self._server:
+
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        if self._dispatcher:
+
+            self._queue.put(None)
+            self._dispatcher.join()
+            self._scheduler.shutdown()
+            self._dispatcher = None
+
+    # -------------------------------------------------------------------------
+    # submit
+    #
+    # This queues a request and returns its ID.  It raises queue.Full when
+    # the queue is full.
+    # -------------------------------------------------------------------------
+    def submit(self, params):
+
+        MaxEntService.validate(params)
+        requestId = uuid.uuid4().hex
+
+        with self._lock:
+
+            self._requests[requestId] = {'id': requestId,
+                                         'state': MaxEntService.QUEUED,
+                                         'params': params,
+                                         'submitted': time.time()}
+
+        try:
+            self._queue.put_nowait(requestId)
+
+        except queue.Full:
+
+            with self._lock:
+                del self._requests[requestId]
+
+            raise
+
+        return requestId
+
+    # -------------------------------------------------------------------------
+    # validate
+    #
+    # This rejects a request missing a required parameter or naming an
+    # unknown one, before it is queued.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def validate(params):
+
+        if not isinstance(params, dict):
+            raise RuntimeError('A request must be a JSON object.')
+
+        missing = [key for key in MaxEntService.REQUIRED if key not in params]
+
+        unknown = [key for key in params
+                   if key not in MaxEntService.REQUIRED and
+                   key not in MaxEntService.OPTIONAL]
+
+        if missing:
+            raise RuntimeError('Missing parameters: ' + ', '.join(missing))
+
+        if unknown:
+
+            raise RuntimeError('Unknown parameters: ' +
+                               ', '.join(sorted(unknown)))
+
+        if params.get('thin'):
+            PointThinner(params['thin'], params.get('thinValue'))
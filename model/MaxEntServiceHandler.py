@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import http.server
+import json
+import queue
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntServiceHandler
+#
+# This serves a MaxEntService's queue over HTTP, as JSON:
+#
+# - POST /requests:       queue the request in the body and return its
+#                         status, with 202; 400 when it is invalid, and 503
+#                         when the queue is full.
+# - GET /requests/<id>:   return a request's status; 404 when unknown.
+# - GET /status:          return the queue depth and latency.  See
+#                         MaxEntService.stats.
+#
+# For example:
+#
+# curl -d '{"observationFile": "ebd.csv", "species": "Lark Bunting",
+#           "epsg": 4326, "imageDir": "merra", "outputDir": "out"}'
+#      localhost:8765/requests
+# -----------------------------------------------------------------------------
+class MaxEntServiceHandler(http.server.BaseHTTPRequestHandler):
+
+    REQUESTS_PATH = '/requests'
+    STATUS_PATH = '/status'
+
+    # -------------------------------------------------------------------------
+    # do_GET
+    # -------------------------------------------------------------------------
+    def do_GET(self):
+
+        service = self.server.service
+
+        if self.path == MaxEntServiceHandler.STATUS_PATH:
+
+            self._reply(200, service.stats())
+            return
+
+        prefix = MaxEntServiceHandler.REQUESTS_PATH + '/'
+        status = None
+
+        if self.path.startswith(prefix):
+            status = service.request(self.path[len(prefix):])
+
+        if status is None:
+            self._reply(404, {'error': 'Unknown path ' + self.path})
+
+        else:
+            self._reply(200, status)
+
+    # -------------------------------------------------------------------------
+    # do_POST
+    # -------------------------------------------------------------------------
+    def do_POST(self):
+
+        if self.path != MaxEntServiceHandler.REQUESTS_PATH:
+
+            self._reply(404, {'error': 'Unknown path ' + self.path})
+            return
+
+        service = self.server.service
+        length = int(self.headers.get('Content-Length', 0))
+
+        try:
+            requestId = service.submit(json.loads(self.rfile.read(length)))
+
+        except queue.Full:
+
+            self._reply(503, {'error': 'The queue is full.'})
+            return
+
+        except (RuntimeError, ValueError) as e:
+
+            self._reply(400, {'error': str(e)})
+            return
+
+        self._reply(202, service.request(requestId))
+
+    # -------------------------------------------------------------------------
+    # _reply
+    # -------------------------------------------------------------------------
+    def _reply(self, code, body):
+
+        content = json.dumps(body).encode('utf-8')
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+from core.model.SystemCommand import SystemCommand
+
+
+# -----------------------------------------------------------------------------
+# class MxeConverter
+#
+# This converts ASCII grids to maxent.jar's binary .mxe grids, using
+# maxent's own converter, density.Convert.  maxent.jar reads .mxe layers
+# without parsing text, which is most of its load time on large grids.
+#
+# Grids are converted once.  Later calls only convert grids that are new or
+# have changed, all in one JVM.  A grid has changed when its size,
+# modification time or inode differs from those recorded in mxeDir's
+# SOURCES_FILE when it was converted.  Comparing only modification times
+# misses a grid replaced by a hard link to an older layer cache entry.
+# .mxe grids in mxeDir matching none of the ASCII grids are removed, so
+# maxent.jar never reads a layer dropped from the request.
+# -----------------------------------------------------------------------------
+class MxeConverter(object):
+
+    SOURCES_FILE = 'sources.json'
+
+    # -------------------------------------------------------------------------
+    # convert
+    #
+    # This returns the paths of the .mxe grids for ascPaths, in mxeDir.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def convert(ascPaths, mxeDir, jarFile):
+
+        if not os.path.exists(mxeDir):
+            os.mkdir(mxeDir)
+
+        sources = MxeConverter._loadSources(mxeDir)
+
+        mxePaths = [MxeConverter.mxePath(ascPath, mxeDir)
+                    for ascPath in ascPaths]
+
+        signatures = {os.path.basename(mxePath):
+                      MxeConverter.signature(ascPath)
+                      for ascPath, mxePath in zip(ascPaths, mxePaths)}
+
+        MxeConverter._prune(mxeDir, signatures)
+
+        stale = [ascPath for ascPath, mxePath in zip(ascPaths, mxePaths)
+                 if not os.path.exists(mxePath) or
+                 sources.get(os.path.basename(mxePath)) !=
+                 signatures[os.path.basename(mxePath)]]
+
+        if stale:
+
+            print('Converting ' + str(len(stale)) + ' layers to mxe.')
+
+            # density.Convert converts a whole directory, so give it one
+            # holding only the stale grids.
+            staleDir = tempfile.mkdtemp(dir=mxeDir)
+
+            try:
+                for ascPath in stale:
+
+                    os.symlink(os.path.abspath(ascPath),
+                               os.path.join(staleDir,
+                                            os.path.basename(ascPath)))
+
+                cmd = 'java -cp ' + jarFile + ' density.Convert ' + \
+                      '"' + staleDir + '" asc "' + mxeDir + '" mxe'
+
+                SystemCommand(cmd, None, True)
+
+            finally:
+                shutil.rmtree(staleDir, ignore_errors=True)
+
+        if stale or sources != signatures:
+            MxeConverter._saveSources(mxeDir, signatures)
+
+        return mxePaths
+
+    # -------------------------------------------------------------------------
+    # _loadSources
+    #
+    # This returns .mxe file name to the signature of the grid it was
+    # converted from.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _loadSources(mxeDir):
+
+        try:
+            with open(os.path.join(mxeDir, MxeConverter.SOURCES_FILE)) as f:
+                return json.load(f)
+
+        except (IOError, OSError, ValueError):
+            return {}
+
+    # -------------------------------------------------------------------------
+    # mxePath
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def mxePath(ascPath, mxeDir):
+
+        nameNoExtension = os.path.splitext(os.path.basename(ascPath))[0]
+
+        return os.path.join(mxeDir, nameNoExtension + '.mxe')
+
+    # -------------------------------------------------------------------------
+    # _prune
+    #
+    # This removes the .mxe grids converted from none of the current grids.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _prune(mxeDir, signatures):
+
+        for mxePath in glob.glob(os.path.join(mxeDir, '*.mxe')):
+
+            if os.path.basename(mxePath) not in signatures:
+
+                print('Removing orphaned ' + mxePath)
+                os.remove(mxePath)
+
+    # -------------------------------------------------------------------------
+    # _saveSources
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _saveSources(mxeDir, signatures):
+
+        sourcesPath = os.path.join(mxeDir, MxeConverter.SOURCES_FILE)
+        tempPath = sourcesPath + '.' + str(os.getpid()) + '.tmp'
+
+        with open(tempPath, 'w') as sourcesFile:
+            json.dump(signatures, sourcesFile)
+
+        os.rename(tempPath, sourcesPath)
+
+    # -------------------------------------------------------------------------
+    # signature
+    #
+    # This returns the size, modification time and inode of the file a path
+    # resolves to.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def signature(path):
+
+        fileStat = os.stat(os.path.realpath(path))
+
+        return [fileStat.st_size, fileStat.st_mtime_ns, fileStat.st_ino]
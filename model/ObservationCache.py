@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from osgeo.osr import SpatialReference
+
+
+# -----------------------------------------------------------------------------
+# class ObservationCache
+#
+# This keeps a binary, columnar copy of a parsed observation file, so later
+# loads memory-map NumPy arrays instead of parsing text.  Each entry is a
+# directory of .npy columns with a small JSON header holding the SRS and the
+# envelope bounds.
+#
+# Entries are keyed on the file's real path, size and modification time and
+# on the species, so an edited file is parsed again.  By default the cache
+# lives in a .maxent_cache directory beside the observation file.  When that
+# is not writable, or MAXENT_CACHE_DIR is set, the cache lives there instead.
+#
+# Entries are written to a temporary directory then renamed into place, so
+# concurrent readers never see a partial entry.  Saving an entry removes the
+# file's entries from earlier sizes or modification times, so the cache does
+# not grow with every edit of the file.
+# -----------------------------------------------------------------------------
+class ObservationCache(object):
+
+    CACHE_DIR_ENV = 'MAXENT_CACHE_DIR'
+    COLUMNS = ('xs', 'ys', 'responses')
+    META_FILE = 'meta.json'
+    SIDECAR_DIR = '.maxent_cache'
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, pathToFile, species):
+
+        self._filePath = os.path.realpath(pathToFile)
+        self._species = species
+
+        fileStat = os.stat(self._filePath)
+        self._size = fileStat.st_size
+        self._mtime = fileStat.st_mtime
+
+        key = json.dumps([ObservationCache.VERSION,
+                          self._filePath,
+                          self._size,
+                          self._mtime,
+                          species])
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+        self._entryName = os.path.basename(self._filePath) + '.' + digest
+        self._entryDir = os.path.join(self._cacheRoot(), self._entryName)
+
+    # -------------------------------------------------------------------------
+    # _cacheRoot
+    #
+    # The sidecar is used when it, or the directory to create it in, is
+    # writable.
+    # -------------------------------------------------------------------------
+    def _cacheRoot(self):
+
+        if os.environ.get(ObservationCache.CACHE_DIR_ENV):
+
+            return os.path.join(os.environ[ObservationCache.CACHE_DIR_ENV],
+                                'observations')
+
+        sidecar = os.path.join(os.path.dirname(self._filePath),
+                               ObservationCache.SIDECAR_DIR)
+
+        if os.path.isdir(sidecar):
+
+            if os.access(sidecar, os.W_OK):
+                return sidecar
+
+        elif os.access(os.path.dirname(self._filePath), os.W_OK):
+            return sidecar
+
+        return os.path.join(tempfile.gettempdir(),
+                            'maxent_cache',
+                            'observations')
+
+    # -------------------------------------------------------------------------
+    # entryDir
+    # -------------------------------------------------------------------------
+    def entryDir(self):
+
+        return self._entryDir
+
+    # -------------------------------------------------------------------------
+    # load
+    #
+    # This returns (xs, ys, responses, srs, bounds) with the arrays memory
+    # mapped read-only, or None when there is no valid entry.  Bounds are
+    # (ulx, uly, lrx, lry), or None when there are no observations.
+    # -------------------------------------------------------------------------
+    def load(self):
+
+        metaPath = os.path.join(self._entryDir, ObservationCache.META_FILE)
+
+        try:
+            with open(metaPath) as metaFile:
+                meta = json.load(metaFile)
+
+            if meta['version'] != ObservationCache.VERSION:
+                return None
+
+            columns = [numpy.load(os.path.join(self._entryDir, col + '.npy'),
+                                  mmap_mode='r')
+                       for col in ObservationCache.COLUMNS]
+
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        srs = None
+
+        if meta['srs']:
+
+            srs = SpatialReference()
+            srs.ImportFromWkt(meta['srs'])
+
+        return columns[0], columns[1], columns[2], srs, meta['bounds']
+
+    # -------------------------------------------------------------------------
+    # _prune
+    #
+    # This removes the file's entries, for any species, whose size,
+    # modification time or version no longer match.  Entries of other files
+    # with the same name, in a shared cache, are left alone.
+    # -------------------------------------------------------------------------
+    def _prune(self, root):
+
+        prefix = os.path.basename(self._filePath) + '.'
+
+        try:
+            names = os.listdir(root)
+
+        except OSError:
+            return
+
+        for name in names:
+
+            if not name.startswith(prefix) or name == self._entryName:
+                continue
+
+            entryDir = os.path.join(root, name)
+            metaPath = os.path.join(entryDir, ObservationCache.META_FILE)
+
+            try:
+                with open(metaPath) as metaFile:
+                    meta = json.load(metaFile)
+
+            except (IOError, OSError, ValueError):
+                continue
+
+            if meta.get('file') != self._filePath:
+                continue
+
+            if meta.get('version') != ObservationCache.VERSION or \
+               meta.get('size') != self._size or \
+               meta.get('mtime') != self._mtime:
+
+                shutil.rmtree(entryDir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    # save
+    #
+    # Failing to write the cache is not an error; the next load parses the
+    # text again.
+    # -------------------------------------------------------------------------
+    def save(self, xs, ys, responses, srs):
+
+        root = os.path.dirname(self._entryDir)
+        bounds = None
+
+        if len(xs):
+
+            bounds = [float(xs.min()),
+                      float(ys.max()),
+                      float(xs.max()),
+                      float(ys.min())]
+
+        meta = {'version': ObservationCache.VERSION,
+                'file': self._filePath,
+                'size': self._size,
+                'mtime': self._mtime,
+                'species': self._species,
+                'numObservations': len(xs),
+                'srs': srs.ExportToWkt() if srs is not None else None,
+                'bounds': bounds}
+
+        try:
+            if not os.path.isdir(root):
+                os.makedirs(root)
+
+            tempDir = tempfile.mkdtemp(prefix='.' + self._entryName,
+                                       dir=root)
+
+        except OSError:
+            return
+
+        try:
+            for col, array in zip(ObservationCache.COLUMNS,
+                                  (xs, ys, responses)):
+
+                numpy.save(os.path.join(tempDir, col + '.npy'), array)
+
+            with open(os.path.join(tempDir, ObservationCache.META_FILE),
+                      'w') as metaFile:
+
+                json.dump(meta, metaFile)
+
+            os.rename(tempDir, self._entryDir)
+
+        except OSError:
+
+            # Another process may have written the same entry first.
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+        self._prune(root)
@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
 
-import csv
+import numpy
 
 from osgeo import ogr
-from osgeo.osr import SpatialReference
 
 from core.model.BaseFile import BaseFile
 from core.model.Envelope import Envelope
 
+from maxent.model.CoordinateTransformer import CoordinateTransformer
+from maxent.model.ObservationCache import ObservationCache
+from maxent.model.ObservationStream import ObservationStream
+from maxent.model.RunTrace import RunTrace
+
 
 # -----------------------------------------------------------------------------
 # class ObservationFile
@@ -19,17 +23,27 @@ from core.model.Envelope import Envelope
 # especially if we need to add or remove observations.  Things like the
 # envelope and disk file would need to be updated.
 #
-# TIP: This class uses a Point abstraction implemented with GDAL.
+# TIP: Observations are stored as contiguous NumPy arrays of x, y and
+# response, not as one ogr.Geometry per row.  Large eBird extracts have
+# millions of rows, and a SWIG point object per row costs gigabytes.  Points
+# are only materialized as ogr.Geometry objects when observation() asks for
+# one.
+#
+# TIP: Parsed files are kept in an ObservationCache, so reloading the same
+# file, including unpickling in a Celery task, memory-maps the cached
+# columns instead of parsing the text again.  Pass useCache=False to always
+# parse.
 # -----------------------------------------------------------------------------
 class ObservationFile(BaseFile):
 
     FILE_KEY = 'PathToFile'
     SPECIES_KEY = 'Species'
+    USE_CACHE_KEY = 'UseCache'
 
     # -------------------------------------------------------------------------
     # __init__
     # -------------------------------------------------------------------------
-    def __init__(self, pathToFile, species):
+    def __init__(self, pathToFile, species, useCache=True):
 
         if not species:
             raise RuntimeError('A species must be specified.')
@@ -41,88 +55,152 @@ class ObservationFile(BaseFile):
         self._species = species
         self._srs = None
         self._envelope = None
-        self._observations = []
+        self._xs = numpy.empty(0, dtype=numpy.float64)
+        self._ys = numpy.empty(0, dtype=numpy.float64)
+        self._responses = numpy.empty(0, dtype=numpy.float32)
+        self._useCache = useCache
+
+        with RunTrace.stage('loadObservations', species=species):
+
+            if not self._useCache:
+                self._parse()
+
+            else:
+                self._load()
+
+    # -------------------------------------------------------------------------
+    # chunks
+    #
+    # This yields (xs, ys, responses) views of at most chunkSize rows, like
+    # ObservationStream, so writers can consume either one.
+    # -------------------------------------------------------------------------
+    def chunks(self, chunkSize=ObservationStream.CHUNK_SIZE):
+
+        for start in range(0, self.numObservations(), chunkSize):
+
+            end = start + chunkSize
+
+            yield (self._xs[start:end],
+                   self._ys[start:end],
+                   self._responses[start:end])
 
-        self._parse()
+    # -------------------------------------------------------------------------
+    # coordinates
+    #
+    # This returns the x and y arrays themselves, not copies.  Do not modify
+    # them.
+    # -------------------------------------------------------------------------
+    def coordinates(self):
+
+        return self._xs, self._ys
 
     # -------------------------------------------------------------------------
     # envelope
+    #
+    # The envelope is a min/max reduction over the coordinate arrays.  It is
+    # cached until the next transformTo.
     # -------------------------------------------------------------------------
     def envelope(self):
 
-        if not self._envelope:
+        if self._envelope is None:
 
             self._envelope = Envelope()
 
-            for obs in self._observations:
-                self._envelope.addOgrPoint(obs[0].Clone())
+            if self.numObservations():
+
+                self._envelope.addPoint(self._xs.min(),
+                                        self._ys.max(),
+                                        0,
+                                        self._srs)
+
+                self._envelope.addPoint(self._xs.max(),
+                                        self._ys.min(),
+                                        0,
+                                        self._srs)
 
         return self._envelope
 
+    # -------------------------------------------------------------------------
+    # _load
+    #
+    # This memory-maps the cached columns, parsing and caching the file first
+    # when there is no valid entry.
+    # -------------------------------------------------------------------------
+    def _load(self):
+
+        cache = ObservationCache(self._filePath, self._species)
+        cached = cache.load()
+
+        if cached is None:
+
+            self._parse()
+            cache.save(self._xs, self._ys, self._responses, self._srs)
+            return
+
+        self._xs, self._ys, self._responses, self._srs, bounds = cached
+
+        if bounds:
+
+            self._envelope = Envelope()
+            self._envelope.addPoint(bounds[0], bounds[1], 0, self._srs)
+            self._envelope.addPoint(bounds[2], bounds[3], 0, self._srs)
+
     # -------------------------------------------------------------------------
     # numObservations
     # -------------------------------------------------------------------------
     def numObservations(self):
 
-        return len(self._observations)
+        return len(self._xs)
 
     # -------------------------------------------------------------------------
     # observation
+    #
+    # This returns a tuple of an ogr point and its response, built on demand
+    # from the arrays.
     # -------------------------------------------------------------------------
     def observation(self, index):
 
         if index >= self.numObservations():
             raise IndexError
 
-        return self._observations[index]
+        ogrPt = ogr.Geometry(ogr.wkbPoint)
+
+        ogrPt.AddPoint(float(self._xs[index]), float(self._ys[index]), 0)
+        ogrPt.AssignSpatialReference(self._srs)
+
+        return (ogrPt, float(self._responses[index]))
 
     # -------------------------------------------------------------------------
     # _parse
     #
     # This parser requires a header and understands the following formats:
     # - x,y,response:binary,epsg:nnnnn
+    # - x,y,response:binary,epsg:nnnnn,species
+    #
+    # When there is a species column, only this file's species is kept.
     # -------------------------------------------------------------------------
     def _parse(self):
 
-        with open(self._filePath) as csvFile:
-
-            first = True
-            fdReader = csv.reader(csvFile, delimiter=',')
+        stream = ObservationStream(self._filePath, self._species)
+        self._srs = stream.srs()
+        chunks = list(stream.chunks())
 
-            for row in fdReader:
+        if chunks:
 
-                if first:
+            self._xs = numpy.concatenate([chunk[0] for chunk in chunks])
+            self._ys = numpy.concatenate([chunk[1] for chunk in chunks])
 
-                    first = False
+            self._responses = \
+                numpy.concatenate([chunk[2] for chunk in chunks])
 
-                    # If the first element is a float, there is no header row.
-                    try:
-                        float(row[0])
-
-                        raise RuntimeError('The observation file, ' +
-                                           str(self.fileName()) +
-                                           ' must have a header.')
-
-                    except ValueError:
-
-                        if ':' not in row[3]:
-
-                            raise RuntimeError('EPSG in header field ' +
-                                               'must contain a colon ' +
-                                               'then integer EPSG code.')
-
-                        epsg = row[3].split(':')[1]
-                        self._srs = SpatialReference()
-                        self._srs.ImportFromEPSG(int(epsg))
-
-                else:
+    # -------------------------------------------------------------------------
+    # responses
+    #
+    # This returns the response array itself, not a copy.  Do not modify it.
+    # -------------------------------------------------------------------------
+    def responses(self):
 
-                    # Parse a row.
-                    ogrPt = ogr.Geometry(ogr.wkbPoint)
-                    ogrPt.AddPoint(float(row[0]), float(row[1]), 0)
-                    ogrPt.AssignSpatialReference(self._srs)
-                    # self._envelope.addOgrPoint(ogrPt)
-                    self._observations.append((ogrPt, float(row[2])))
+        return self._responses
 
     # -------------------------------------------------------------------------
     # species
@@ -146,19 +224,24 @@ class ObservationFile(BaseFile):
         if newSRS.IsSame(self._srs):
             return
 
+        with RunTrace.stage('transformObservations',
+                            numObservations=len(self._xs)):
+
+            self._xs, self._ys = CoordinateTransformer.transform(self._xs,
+                                                                 self._ys,
+                                                                 self._srs,
+                                                                 newSRS)
         self._envelope = None
         self._srs = newSRS
 
-        for obs in self._observations:
-            obs[0].TransformTo(newSRS)
-
     # -------------------------------------------------------------------------
     # __getstate__
     # -------------------------------------------------------------------------
     def __getstate__(self):
 
         state = {ObservationFile.FILE_KEY: self._filePath,
-                 ObservationFile.SPECIES_KEY: self._species}
+                 ObservationFile.SPECIES_KEY: self._species,
+                 ObservationFile.USE_CACHE_KEY: self._useCache}
 
         return state
 
@@ -166,8 +249,12 @@ class ObservationFile(BaseFile):
     # __setstate__
     #
     # e2 = pickle.loads(pickle.dumps(env))
+    #
+    # With the cache enabled, this reopens the cached columns instead of
+    # parsing the file again.
     # -------------------------------------------------------------------------
     def __setstate__(self, state):
 
         self.__init__(state[ObservationFile.FILE_KEY],
-                      state[ObservationFile.SPECIES_KEY])
+                      state[ObservationFile.SPECIES_KEY],
+                      state.get(ObservationFile.USE_CACHE_KEY, True))
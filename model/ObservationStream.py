@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import itertools
+
+import numpy
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.CoordinateTransformer import CoordinateTransformer
+
+
+# -----------------------------------------------------------------------------
+# class ObservationStream
+#
+# This reads an observation file in fixed-size chunks of rows, so peak memory
+# is bounded by the chunk size, not by the file size.  Iterating yields
+# (xs, ys, responses) NumPy arrays holding only the rows that pass the
+# filters.
+#
+# The file format is the one ObservationFile understands, with an optional
+# column whose header is "species".  Data rows leave the EPSG column empty.
+# - x,y,response:binary,epsg:nnnnn[,species]
+#
+# Filters
+# - species:  keep rows for this species, or for any species in a list.
+#             Files without a species column hold one species, so every row
+#             matches.
+# - envelope: keep rows inside this envelope, in the output SRS.
+# - response: ObservationStream.PRESENCE or ObservationStream.ABSENCE keeps
+#             only presence or absence rows.
+#
+# When srs is given, each chunk is transformed to it before the envelope
+# filter is applied.
+# -----------------------------------------------------------------------------
+class ObservationStream(object):
+
+    ABSENCE = 'absence'
+    CHUNK_SIZE = 100000
+    PRESENCE = 'presence'
+    SPECIES_HEADER = 'species'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 pathToFile,
+                 species=None,
+                 envelope=None,
+                 response=None,
+                 srs=None,
+                 chunkSize=CHUNK_SIZE):
+
+        if response not in (None,
+                            ObservationStream.PRESENCE,
+                            ObservationStream.ABSENCE):
+
+            raise RuntimeError('Invalid response filter: ' + str(response))
+
+        if chunkSize < 1:
+            raise RuntimeError('The chunk size must be positive.')
+
+        self._filePath = pathToFile
+        self._species = None
+
+        if isinstance(species, str):
+            self._species = set([species.strip()])
+
+        elif species is not None:
+            self._species = set(name.strip() for name in species)
+        self._envelope = envelope
+        self._response = response
+        self._chunkSize = chunkSize
+        self._numRowsRead = 0
+        self._numRowsKept = 0
+
+        with open(self._filePath) as csvFile:
+
+            self._fileSRS, self._speciesColumn = \
+                ObservationStream.readHeader(csvFile, self._filePath)
+
+        self._srs = srs if srs is not None else self._fileSRS
+
+    # -------------------------------------------------------------------------
+    # __iter__
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+
+        return self.chunks()
+
+    # -------------------------------------------------------------------------
+    # chunks
+    # -------------------------------------------------------------------------
+    def chunks(self):
+
+        for labels, xs, ys, responses in self._chunks(False):
+            yield xs, ys, responses
+
+    # -------------------------------------------------------------------------
+    # _chunks
+    # -------------------------------------------------------------------------
+    def _chunks(self, withLabels):
+
+        self._numRowsRead = 0
+        self._numRowsKept = 0
+
+        if self._fileSRS is None:
+            return
+
+        if withLabels and self._speciesColumn is None:
+
+            raise RuntimeError('The observation file, ' +
+                               str(self._filePath) +
+                               ' has no species column.')
+
+        with open(self._filePath) as csvFile:
+
+            csvFile.readline()
+
+            while True:
+
+                lines = list(itertools.islice(csvFile, self._chunkSize))
+
+                if not lines:
+                    break
+
+                self._numRowsRead += len(lines)
+
+                labels, xs, ys, responses = \
+                    self._filter(*self._readChunk(lines, withLabels))
+
+                if len(xs):
+
+                    self._numRowsKept += len(xs)
+                    yield labels, xs, ys, responses
+
+    # -------------------------------------------------------------------------
+    # _filter
+    # -------------------------------------------------------------------------
+    def _filter(self, data, labels):
+
+        xs = data[:, 0]
+        ys = data[:, 1]
+        responses = data[:, 2].astype(numpy.float32)
+
+        if self._response == ObservationStream.PRESENCE:
+            keep = responses > 0
+
+        elif self._response == ObservationStream.ABSENCE:
+            keep = responses <= 0
+
+        else:
+            keep = numpy.ones(len(xs), dtype=bool)
+
+        xs = xs[keep]
+        ys = ys[keep]
+        responses = responses[keep]
+
+        if labels is not None:
+            labels = labels[keep]
+
+        if len(xs) and not self._srs.IsSame(self._fileSRS):
+
+            xs, ys = CoordinateTransformer.transform(xs,
+                                                     ys,
+                                                     self._fileSRS,
+                                                     self._srs)
+
+        if self._envelope is not None:
+
+            keep = (xs >= self._envelope.ulx()) & \
+                   (xs <= self._envelope.lrx()) & \
+                   (ys >= self._envelope.lry()) & \
+                   (ys <= self._envelope.uly())
+
+            xs = xs[keep]
+            ys = ys[keep]
+            responses = responses[keep]
+
+            if labels is not None:
+                labels = labels[keep]
+
+        return (labels,
+                numpy.ascontiguousarray(xs),
+                numpy.ascontiguousarray(ys),
+                responses)
+
+    # -------------------------------------------------------------------------
+    # labeledChunks
+    #
+    # This yields (species, xs, ys, responses) chunks, where species is an
+    # array of each row's species.  The file must have a species column.
+    # -------------------------------------------------------------------------
+    def labeledChunks(self):
+
+        return self._chunks(True)
+
+    # -------------------------------------------------------------------------
+    # numRowsKept
+    # -------------------------------------------------------------------------
+    def numRowsKept(self):
+
+        return self._numRowsKept
+
+    # -------------------------------------------------------------------------
+    # numRowsRead
+    # -------------------------------------------------------------------------
+    def numRowsRead(self):
+
+        return self._numRowsRead
+
+    # -------------------------------------------------------------------------
+    # readHeader
+    #
+    # This returns the SRS named in the header and the index of the species
+    # column, or None when there is no species column.  An empty file has no
+    # SRS.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def readHeader(csvFile, fileName):
+
+        row = next(csv.reader([csvFile.readline()], delimiter=','), [])
+
+        if not row:
+            return None, None
+
+        # If the first element is a float, there is no header row.
+        try:
+            float(row[0])
+
+            raise RuntimeError('The observation file, ' +
+                               str(fileName) +
+                               ' must have a header.')
+
+        except ValueError:
+
+            if ':' not in row[3]:
+
+                raise RuntimeError('EPSG in header field ' +
+                                   'must contain a colon ' +
+                                   'then integer EPSG code.')
+
+            epsg = row[3].split(':')[1]
+            srs = SpatialReference()
+            srs.ImportFromEPSG(int(epsg))
+
+        speciesColumn = None
+        header = [field.strip().lower() for field in row]
+
+        if ObservationStream.SPECIES_HEADER in header[4:]:
+
+            speciesColumn = \
+                header.index(ObservationStream.SPECIES_HEADER, 4)
+
+        return srs, speciesColumn
+
+    # -------------------------------------------------------------------------
+    # _readChunk
+    #
+    # This returns an n x 3 array of x, y and response, and an array of each
+    # row's species when withLabels is true.  Rows for other species are
+    # dropped before their numbers are converted.
+    # -------------------------------------------------------------------------
+    def _readChunk(self, lines, withLabels=False):
+
+        if self._speciesColumn is None or \
+           (self._species is None and not withLabels):
+
+            data = numpy.loadtxt(lines,
+                                 delimiter=',',
+                                 usecols=(0, 1, 2),
+                                 ndmin=2)
+
+            return (data if data.size else numpy.empty((0, 3))), None
+
+        col = self._speciesColumn
+
+        rows = [row for row in csv.reader(lines, delimiter=',')
+                if len(row) > col and
+                (self._species is None or row[col].strip() in self._species)]
+
+        if not rows:
+            return numpy.empty((0, 3)), numpy.empty(0, dtype=object)
+
+        data = numpy.array([row[:3] for row in rows], dtype=numpy.float64)
+        labels = None
+
+        if withLabels:
+
+            labels = numpy.array([row[col].strip() for row in rows],
+                                 dtype=object)
+
+        return data, labels
+
+    # -------------------------------------------------------------------------
+    # srs
+    # -------------------------------------------------------------------------
+    def srs(self):
+
+        return self._srs
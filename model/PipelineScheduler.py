@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import threading
+import traceback
+
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.RunTrace import RunTrace
+
+
+# -----------------------------------------------------------------------------
+# class PipelineScheduler
+#
+# This runs a queue of MaxEntRequests as a pipeline of their three stages,
+# so the CPUs prepare the next requests' layers while maxent.jar trains
+# another, and a third's outputs are post-processed meanwhile:
+#
+# - prepare:  observations, layers, and .mxe, stack and SWD files
+# - train:    maxent.jar or the replicates
+# - finish:   post-processing, like projection
+#
+# Each stage runs in its own pool of threads, whose size is the stage's
+# concurrency limit.  Requests start preparing in queue order, but with
+# numPreparing above one they reach training, and then finishing, in the
+# order their preparation completes.  The training limit is also the number
+# of JVMs each request plans for.
+#
+# maxPrepared bounds the requests preparing or prepared but not yet
+# training, and defaults to numPreparing.  Another request only starts
+# preparing when one of those starts training, so preparation cannot run
+# ahead of training and fill the disk with layers.
+#
+# A request that fails in any stage skips the rest and does not stop the
+# others.  Like TaskCollector, run returns every success and every failure.
+#
+# run pipelines a list of requests.  For a stream of them, as in
+# MaxEntService, call start, then reserve and submit for each request, and
+# shutdown.  reserve blocks until the pipeline has room, so callers can
+# leave requests in their own queue until then.
+# -----------------------------------------------------------------------------
+class PipelineScheduler(object):
+
+    FINISH = 'finish'
+    PREPARE = 'prepare'
+    TRAIN = 'train'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 numPreparing=1,
+                 numTraining=1,
+                 numFinishing=1,
+                 maxPrepared=None,
+                 jarFile=MaxEntRequest.MAX_ENT_JAR):
+
+        maxPrepared = maxPrepared or numPreparing
+
+        if min(numPreparing, numTraining, numFinishing, maxPrepared) < 1:
+
+            raise RuntimeError('Every stage needs at least one thread, and ' +
+                               'at least one request must be allowed to ' +
+                               'wait for training.')
+
+        self._limits = {PipelineScheduler.PREPARE: numPreparing,
+                        PipelineScheduler.TRAIN: numTraining,
+                        PipelineScheduler.FINISH: numFinishing}
+
+        self._maxPrepared = maxPrepared
+        self._jarFile = jarFile
+        self._pools = None
+
+    # -------------------------------------------------------------------------
+    # _finish
+    # -------------------------------------------------------------------------
+    def _finish(self, label, request, callback):
+
+        if self._runStage(PipelineScheduler.FINISH,
+                          label,
+                          callback,
+                          request.finish):
+
+            callback(label, None)
+
+    # -------------------------------------------------------------------------
+    # _prepare
+    # -------------------------------------------------------------------------
+    def _prepare(self, label, request, callback):
+
+        if self._runStage(PipelineScheduler.PREPARE,
+                          label,
+                          callback,
+                          request.prepare,
+                          self._jarFile):
+
+            with self._lock:
+
+                self._numWaiting += 1
+
+                print('Prepared ' + str(label) + '; ' +
+                      str(self._numWaiting) + ' waiting for a JVM')
+
+            self._pools[PipelineScheduler.TRAIN].submit(self._train,
+                                                        label,
+                                                        request,
+                                                        callback)
+
+        else:
+            self.release()
+
+    # -------------------------------------------------------------------------
+    # _record
+    #
+    # This is run's callback.
+    # -------------------------------------------------------------------------
+    def _record(self, label, error):
+
+        with self._lock:
+
+            if error is None:
+                self._succeeded.append(label)
+
+            else:
+                self._failures[label] = error
+
+            print('Completed ' + str(label) + ' (' +
+                  str(len(self._succeeded) + len(self._failures)) + ' of ' +
+                  str(self._numRequests) + ')')
+
+            if len(self._succeeded) + len(self._failures) == \
+               self._numRequests:
+
+                self._allDone.set()
+
+    # -------------------------------------------------------------------------
+    # release
+    #
+    # This gives back a reservation that will not be submitted.
+    # -------------------------------------------------------------------------
+    def release(self):
+
+        self._prepared.release()
+
+    # -------------------------------------------------------------------------
+    # reserve
+    #
+    # This blocks until fewer than maxPrepared requests are preparing or
+    # waiting to train, and reserves room for one more.
+    # -------------------------------------------------------------------------
+    def reserve(self):
+
+        self._prepared.acquire()
+
+    # -------------------------------------------------------------------------
+    # run
+    #
+    # This takes a list of (label, request) and returns a list of the labels
+    # that succeeded, and a dictionary of label to error message for those
+    # that failed.
+    # -------------------------------------------------------------------------
+    def run(self, labeledRequests):
+
+        self._allDone = threading.Event()
+        self._numRequests = len(labeledRequests)
+        self._succeeded = []
+        self._failures = {}
+
+        if not labeledRequests:
+            return self._succeeded, self._failures
+
+        self.start()
+
+        try:
+            for label, request in labeledRequests:
+
+                self.reserve()
+                self.submit(label, request, self._record)
+
+            self._allDone.wait()
+
+        finally:
+            self.shutdown()
+
+        return self._succeeded, self._failures
+
+    # -------------------------------------------------------------------------
+    # _runStage
+    #
+    # This runs one stage of a request, and returns true when it succeeded.
+    # A failure is passed to the request's callback.
+    # -------------------------------------------------------------------------
+    def _runStage(self, stage, label, callback, method, *args):
+
+        try:
+            with RunTrace.stage('pipeline' + stage.capitalize(),
+                                request=str(label)):
+
+                method(*args)
+
+            return True
+
+        except Exception as e:
+
+            traceback.print_exc()
+            callback(label, stage + ': ' + str(e))
+
+            return False
+
+    # -------------------------------------------------------------------------
+    # shutdown
+    #
+    # This waits for the submitted requests to leave the pipeline, and stops
+    # its threads.
+    # -------------------------------------------------------------------------
+    def shutdown(self):
+
+        if not self._pools:
+            return
+
+        # Earlier stages submit to later ones, so they stop first.
+        for stage in (PipelineScheduler.PREPARE,
+                      PipelineScheduler.TRAIN,
+                      PipelineScheduler.FINISH):
+
+            self._pools[stage].shutdown()
+
+        self._pools = None
+
+    # -------------------------------------------------------------------------
+    # start
+    #
+    # This starts the stages' threads, and returns the scheduler.
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self._lock = threading.Lock()
+        self._prepared = threading.BoundedSemaphore(self._maxPrepared)
+        self._numWaiting = 0
+
+        self._pools = dict(
+            (stage, concurrent.futures.ThreadPoolExecutor(
+                limit,
+                thread_name_prefix='Pipeline-' + stage))
+            for stage, limit in self._limits.items())
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # submit
+    #
+    # This starts preparing a request, in room taken by reserve.  When the
+    # request leaves the pipeline, callback is called with its label and
+    # None, or an error message naming the stage that failed.
+    # -------------------------------------------------------------------------
+    def submit(self, label, request, callback):
+
+        request.setNumJvms(self._limits[PipelineScheduler.TRAIN])
+
+        self._pools[PipelineScheduler.PREPARE].submit(self._prepare,
+                                                      label,
+                                                      request,
+                                                      callback)
+
+    # -------------------------------------------------------------------------
+    # _train
+    # -------------------------------------------------------------------------
+    def _train(self, label, request, callback):
+
+        with self._lock:
+            self._numWaiting -= 1
+
+        self.release()
+
+        if self._runStage(PipelineScheduler.TRAIN,
+                          label,
+                          callback,
+                          request.train,
+                          self._jarFile):
+
+            self._pools[PipelineScheduler.FINISH].submit(self._finish,
+                                                         label,
+                                                         request,
+                                                         callback)
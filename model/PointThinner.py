@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy
+
+
+# -----------------------------------------------------------------------------
+# class PointThinner
+#
+# This thins presence points, so dense clusters, like eBird hotspots, do not
+# dominate training.  Every mode uses a grid hash: each point gets the
+# linear index of the cell it falls in.  The cell modes group points by
+# sorting those integers, and distance looks up neighboring cells in one
+# pass over the points.
+#
+# - cell:       keep the first point in each cell of the target grid.
+# - maxpercell: keep the first value points in each cell of the target grid.
+# - distance:   keep each point no closer than value, in units of the
+#               points' SRS, to any point already kept.
+#
+# Points are kept in file order, so thinning is deterministic.  Distance
+# thinning is sequential and greedy: whether a point is kept depends on the
+# points kept before it, so it is a Python loop over the points rather than
+# array operations, and it keeps a valid set, not the largest one.
+# -----------------------------------------------------------------------------
+class PointThinner(object):
+
+    CELL = 'cell'
+    DISTANCE = 'distance'
+    MAX_PER_CELL = 'maxpercell'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # value is the number of points per cell for maxpercell, and the minimum
+    # distance for distance.
+    # -------------------------------------------------------------------------
+    def __init__(self, mode=CELL, value=None):
+
+        if mode not in (PointThinner.CELL,
+                        PointThinner.DISTANCE,
+                        PointThinner.MAX_PER_CELL):
+
+            raise RuntimeError('Invalid thinning mode: ' + str(mode))
+
+        if mode == PointThinner.MAX_PER_CELL and \
+           (value is None or int(value) != value or value < 1):
+
+            raise RuntimeError('Thinning to at most N points per cell ' +
+                               'requires a positive integer N.')
+
+        if mode == PointThinner.DISTANCE and (value is None or value <= 0):
+
+            raise RuntimeError('Thinning by distance requires a positive ' +
+                               'distance.')
+
+        self._mode = mode
+        self._value = value
+        self._numPoints = 0
+        self._numRemoved = 0
+
+    # -------------------------------------------------------------------------
+    # cellKeys
+    #
+    # This returns the linear index of the cell of side cellSize each point
+    # falls in, counting from (ulx, uly).  Points outside the grid get
+    # indices of their own, so they are never grouped with points inside.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def cellKeys(xs, ys, ulx, uly, cellSize):
+
+        cols = numpy.floor((xs - ulx) / cellSize).astype(numpy.int64)
+        rows = numpy.floor((uly - ys) / cellSize).astype(numpy.int64)
+
+        if not len(cols):
+            return cols
+
+        cols -= cols.min()
+        rows -= rows.min()
+
+        return rows * (cols.max() + 1) + cols
+
+    # -------------------------------------------------------------------------
+    # firstPerKey
+    #
+    # This returns a mask keeping the first n points, in order, of each key.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def firstPerKey(keys, n=1):
+
+        keep = numpy.zeros(len(keys), dtype=bool)
+
+        if n == 1:
+
+            keep[numpy.unique(keys, return_index=True)[1]] = True
+            return keep
+
+        # A stable sort groups the keys with each group in point order.
+        order = numpy.argsort(keys, kind='stable')
+        sortedKeys = keys[order]
+        starts = numpy.r_[True, sortedKeys[1:] != sortedKeys[:-1]]
+        groupStart = numpy.maximum.accumulate(
+            numpy.where(starts, numpy.arange(len(keys)), 0))
+
+        keep[order] = numpy.arange(len(keys)) - groupStart < n
+
+        return keep
+
+    # -------------------------------------------------------------------------
+    # mode
+    # -------------------------------------------------------------------------
+    def mode(self):
+
+        return self._mode
+
+    # -------------------------------------------------------------------------
+    # report
+    # -------------------------------------------------------------------------
+    def report(self):
+
+        return 'Thinning (' + self._mode + ') removed ' + \
+               str(self._numRemoved) + ' of ' + str(self._numPoints) + \
+               ' presence points'
+
+    # -------------------------------------------------------------------------
+    # settings
+    #
+    # This returns the mode and value, for example for a RunManifest.
+    # -------------------------------------------------------------------------
+    def settings(self):
+
+        return [self._mode, self._value]
+
+    # -------------------------------------------------------------------------
+    # thin
+    #
+    # This returns a mask of the points kept.  The cell modes snap the points
+    # to a TargetGrid.
+    # -------------------------------------------------------------------------
+    def thin(self, xs, ys, grid=None):
+
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+
+        if self._mode == PointThinner.DISTANCE:
+            keep = self._thinByDistance(xs, ys)
+
+        else:
+
+            if grid is None:
+                raise RuntimeError('Thinning by cell requires a target grid.')
+
+            keys = PointThinner.cellKeys(xs,
+                                         ys,
+                                         grid.ulx(),
+                                         grid.uly(),
+                                         grid.cellSize())
+
+            keep = PointThinner.firstPerKey(
+                keys,
+                1 if self._mode == PointThinner.CELL else int(self._value))
+
+        self._numPoints = len(xs)
+        self._numRemoved = int(len(xs) - keep.sum())
+
+        return keep
+
+    # -------------------------------------------------------------------------
+    # _thinByDistance
+    #
+    # This visits the points in order and keeps each one no closer than the
+    # distance to any point already kept.  Points are hashed to bins whose
+    # diagonal is the distance, so a kept point closer than the distance can
+    # only be within two bins, and a bin rarely holds more than one kept
+    # point.  Each point is checked against the kept points of its own bin
+    # and its 24 neighbors, with the same test, so the pass is O(n).
+    # -------------------------------------------------------------------------
+    def _thinByDistance(self, xs, ys):
+
+        distance = float(self._value)
+        squaredDistance = distance * distance
+        binSize = distance / math.sqrt(2)
+        keep = numpy.zeros(len(xs), dtype=bool)
+
+        if not len(xs):
+            return keep
+
+        cols = numpy.floor((xs - xs.min()) / binSize).astype(numpy.int64)
+        rows = numpy.floor((ys - ys.min()) / binSize).astype(numpy.int64)
+
+        # Pad the bins, so neighbors' keys never wrap to another row.
+        width = int(cols.max()) + 5
+        keys = (rows + 2) * width + cols + 2
+
+        offsets = [rowOffset * width + colOffset
+                   for rowOffset in range(-2, 3)
+                   for colOffset in range(-2, 3)]
+
+        # The kept points of each bin, as their coordinates.
+        keptByKey = {}
+
+        for i, (key, x, y) in enumerate(zip(keys.tolist(),
+                                            xs.tolist(),
+                                            ys.tolist())):
+
+            conflict = False
+
+            for offset in offsets:
+
+                for keptX, keptY in keptByKey.get(key + offset, ()):
+
+                    dx = x - keptX
+                    dy = y - keptY
+
+                    if dx * dx + dy * dy < squaredDistance:
+
+                        conflict = True
+                        break
+
+                if conflict:
+                    break
+
+            if not conflict:
+
+                keptByKey.setdefault(key, []).append((x, y))
+                keep[i] = True
+
+        return keep
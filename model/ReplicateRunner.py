@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import csv
+import multiprocessing
+import os
+
+import numpy
+
+from osgeo import gdal
+
+from core.model.SystemCommand import SystemCommand
+
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.TaskCollector import TaskCollector
+
+
+# -----------------------------------------------------------------------------
+# class ReplicateRunner
+#
+# This fits replicate models for uncertainty estimates.  maxent.jar runs its
+# own replicates one after another in one JVM.  Instead, the samples are
+# partitioned here with a seeded generator, and each replicate runs as its
+# own maxent.jar process, in a local pool sized by the cores and memory
+# available, or as Celery tasks.
+#
+# - crossvalidate: k folds; each replicate tests on one fold.
+# - bootstrap:     train on n points drawn with replacement; test on the rest.
+# - subsample:     test on a random testPercent of the points.
+#
+# Replicate i is written to rep<i> in the output directory.  aggregate then
+# streams the replicates' grids, block by block, into mean and standard
+# deviation grids, and summarizes their AUCs.
+# -----------------------------------------------------------------------------
+class ReplicateRunner(object):
+
+    BOOTSTRAP = 'bootstrap'
+    CROSSVALIDATE = 'crossvalidate'
+    SUBSAMPLE = 'subsample'
+    SUMMARY_FILE = 'replicateSummary.csv'
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # The environment is a directory of layers or an SWD background file, as
+    # for maxent.jar's -e.  heapMb and threads are for each replicate's JVM.
+    # numProcesses None sizes the local pool from the host.  See JvmPlanner.
+    # projectionLayers is a directory of layers each replicate is projected
+    # onto, as for maxent.jar's projectionlayers, so replicates fit in SWD
+    # mode have grids to aggregate.
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 samplesFile,
+                 environment,
+                 outputDirectory,
+                 numReplicates=5,
+                 replicateType=CROSSVALIDATE,
+                 testPercent=25,
+                 seed=0,
+                 heapMb=1024,
+                 threads=1,
+                 numProcesses=None,
+                 projectionLayers=None):
+
+        if replicateType not in (ReplicateRunner.BOOTSTRAP,
+                                 ReplicateRunner.CROSSVALIDATE,
+                                 ReplicateRunner.SUBSAMPLE):
+
+            raise RuntimeError('Invalid replicate type: ' +
+                               str(replicateType))
+
+        if numReplicates < 2:
+            raise RuntimeError('At least two replicates are required.')
+
+        self._samplesFile = samplesFile
+        self._environment = environment
+        self._outputDirectory = outputDirectory
+        self._numReplicates = numReplicates
+        self._replicateType = replicateType
+        self._testPercent = testPercent
+        self._seed = seed
+        self._heapMb = heapMb
+        self._threads = threads
+        self._numProcesses = numProcesses
+        self._projectionLayers = projectionLayers
+
+    # -------------------------------------------------------------------------
+    # aggregate
+    #
+    # This writes the mean and standard deviation of the replicates' grids and
+    # the AUC summary, returning the paths of the three files.  Replicates
+    # fit in SWD mode without projection have no grids, so the grid paths
+    # are None.  Projected replicates without grids are an error.
+    # -------------------------------------------------------------------------
+    def aggregate(self):
+
+        species = self._species()
+        gridName = species + '.asc'
+
+        # maxent.jar names a projection after its layers' directory.
+        if self._projectionLayers:
+
+            gridName = species + '_' + \
+                os.path.basename(os.path.normpath(self._projectionLayers)) + \
+                '.asc'
+
+        gridPaths = [os.path.join(self.replicateDirectory(i), gridName)
+                     for i in range(self._numReplicates)]
+
+        meanPath = None
+        stdevPath = None
+        hasGrids = all(os.path.exists(path) for path in gridPaths)
+
+        if self._projectionLayers and not hasGrids:
+
+            raise RuntimeError('Replicates were not projected onto ' +
+                               str(self._projectionLayers) + '.')
+
+        if hasGrids:
+
+            meanPath = os.path.join(self._outputDirectory,
+                                    species + '_mean.asc')
+
+            stdevPath = os.path.join(self._outputDirectory,
+                                     species + '_stddev.asc')
+
+            ReplicateRunner.aggregateGrids(gridPaths, meanPath, stdevPath)
+
+        return meanPath, stdevPath, self._summarizeAuc()
+
+    # -------------------------------------------------------------------------
+    # aggregateGrids
+    #
+    # This reads the grids BLOCK_ROWS rows at a time, so memory is bounded by
+    # the number of grids times one block.  A cell with no data in any grid
+    # has no data in the outputs.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def aggregateGrids(gridPaths, meanPath, stdevPath):
+
+        datasets = [gdal.Open(path) for path in gridPaths]
+        first = datasets[0]
+        rows = first.RasterYSize
+        cols = first.RasterXSize
+        geoTransform = first.GetGeoTransform()
+
+        with open(meanPath, 'w') as meanFile, \
+                open(stdevPath, 'w') as stdevFile:
+
+            for ascFile in (meanFile, stdevFile):
+
+                LayerPreparer.writeAsciiHeader(ascFile,
+                                               cols,
+                                               rows,
+                                               geoTransform)
+
+            for row in range(0, rows, LayerPreparer.BLOCK_ROWS):
+
+                numRows = min(LayerPreparer.BLOCK_ROWS, rows - row)
+
+                blocks = numpy.array(
+                    [LayerPreparer.fixNoData(
+                        dataset.GetRasterBand(1).ReadAsArray(0,
+                                                             row,
+                                                             cols,
+                                                             numRows),
+                        dataset.GetRasterBand(1).GetNoDataValue())
+                     for dataset in datasets],
+                    dtype=numpy.float64)
+
+                missing = (blocks == LayerPreparer.NO_DATA).any(axis=0)
+                mean = blocks.mean(axis=0).astype(numpy.float32)
+                stdev = blocks.std(axis=0, ddof=1).astype(numpy.float32)
+                mean[missing] = LayerPreparer.NO_DATA
+                stdev[missing] = LayerPreparer.NO_DATA
+
+                LayerPreparer.writeAsciiBlock(meanFile, mean)
+                LayerPreparer.writeAsciiBlock(stdevFile, stdev)
+
+        LayerPreparer.writePrj(first.GetProjection(), meanPath)
+        LayerPreparer.writePrj(first.GetProjection(), stdevPath)
+
+    # -------------------------------------------------------------------------
+    # command
+    #
+    # This returns the maxent.jar command line for one replicate.
+    # -------------------------------------------------------------------------
+    def command(self, replicate, jarFile=MaxEntRequest.MAX_ENT_JAR):
+
+        repDir = self.replicateDirectory(replicate)
+        testFile = os.path.join(repDir, 'test.csv')
+        extraArgs = []
+
+        if os.path.exists(testFile):
+            extraArgs.append('testsamplesfile="' + testFile + '"')
+
+        if self._projectionLayers:
+
+            extraArgs.append('projectionlayers="' + self._projectionLayers +
+                             '"')
+
+        return MaxEntRequest.maxEntCommand(jarFile,
+                                           os.path.join(repDir, 'train.csv'),
+                                           self._environment,
+                                           repDir,
+                                           ' '.join(extraArgs),
+                                           self._heapMb,
+                                           self._threads)
+
+    # -------------------------------------------------------------------------
+    # numProcesses
+    #
+    # This sizes the local pool by the cores and by the memory available for
+    # JVM heaps.
+    # -------------------------------------------------------------------------
+    def numProcesses(self):
+
+        if self._numProcesses:
+            return self._numProcesses
+
+        numProcesses = min(multiprocessing.cpu_count(),
+                           JvmPlanner.availableMb() // self._heapMb)
+
+        return max(1, min(numProcesses, self._numReplicates))
+
+    # -------------------------------------------------------------------------
+    # partition
+    #
+    # This writes each replicate's training and test samples files, returning
+    # a list of (training, test) index arrays.
+    # -------------------------------------------------------------------------
+    def partition(self):
+
+        with open(self._samplesFile) as csvFile:
+
+            reader = csv.reader(csvFile, delimiter=',')
+            header = next(reader)
+            rows = list(reader)
+
+        numRows = len(rows)
+
+        if numRows < self._numReplicates:
+
+            raise RuntimeError('There are fewer samples than replicates in ' +
+                               str(self._samplesFile))
+
+        generator = numpy.random.RandomState(self._seed)
+        allRows = numpy.arange(numRows)
+        partitions = []
+
+        if self._replicateType == ReplicateRunner.CROSSVALIDATE:
+
+            folds = numpy.array_split(generator.permutation(numRows),
+                                      self._numReplicates)
+
+            for fold in folds:
+
+                partitions.append((numpy.setdiff1d(allRows, fold),
+                                   numpy.sort(fold)))
+
+        elif self._replicateType == ReplicateRunner.BOOTSTRAP:
+
+            for i in range(self._numReplicates):
+
+                train = numpy.sort(generator.choice(numRows, numRows))
+                partitions.append((train, numpy.setdiff1d(allRows, train)))
+
+        else:
+
+            numTest = int(round(numRows * self._testPercent / 100.0))
+
+            for i in range(self._numReplicates):
+
+                permutation = generator.permutation(numRows)
+
+                partitions.append((numpy.sort(permutation[numTest:]),
+                                   numpy.sort(permutation[:numTest])))
+
+        for i, (train, test) in enumerate(partitions):
+
+            repDir = self.replicateDirectory(i)
+
+            if not os.path.exists(repDir):
+                os.makedirs(repDir)
+
+            self._writeSamples(os.path.join(repDir, 'train.csv'),
+                               header,
+                               rows,
+                               train)
+
+            testFile = os.path.join(repDir, 'test.csv')
+
+            if len(test):
+                self._writeSamples(testFile, header, rows, test)
+
+            elif os.path.exists(testFile):
+                os.remove(testFile)
+
+        return partitions
+
+    # -------------------------------------------------------------------------
+    # replicateDirectory
+    # -------------------------------------------------------------------------
+    def replicateDirectory(self, replicate):
+
+        return os.path.join(self._outputDirectory, 'rep' + str(replicate))
+
+    # -------------------------------------------------------------------------
+    # run
+    #
+    # This partitions the samples, runs every replicate and aggregates them.
+    # -------------------------------------------------------------------------
+    def run(self, jarFile=MaxEntRequest.MAX_ENT_JAR, useCelery=False):
+
+        self.partition()
+        commands = [self.command(i, jarFile)
+                    for i in range(self._numReplicates)]
+
+        if useCelery:
+
+            # Celery is only needed here, so do not import it for local runs.
+            from maxent.model.MaxEntRequestCelery import MaxEntRequestCelery
+
+            # Copies of a replicate would share its directory, so none is
+            # speculative.
+            results, failures = TaskCollector(stragglerFactor=None).collect(
+                [(i, MaxEntRequestCelery.runMaxEntCommand.s(cmd))
+                 for i, cmd in enumerate(commands)])
+
+            if failures:
+
+                raise RuntimeError('Replicates failed: ' +
+                                   '; '.join(str(i) + ': ' + failures[i]
+                                             for i in sorted(failures)))
+
+        else:
+
+            numProcesses = self.numProcesses()
+
+            print('Running ' + str(self._numReplicates) + ' replicates in ' +
+                  str(numProcesses) + ' JVMs.')
+
+            with concurrent.futures.ThreadPoolExecutor(numProcesses) as pool:
+
+                futures = [pool.submit(SystemCommand, cmd, None, True)
+                           for cmd in commands]
+
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+
+        return self.aggregate()
+
+    # -------------------------------------------------------------------------
+    # _species
+    #
+    # This returns the species of the first sample, as maxent.jar names its
+    # outputs.
+    # -------------------------------------------------------------------------
+    def _species(self):
+
+        with open(self._samplesFile) as csvFile:
+
+            reader = csv.reader(csvFile, delimiter=',')
+            next(reader)
+
+            return next(reader)[0]
+
+    # -------------------------------------------------------------------------
+    # _summarizeAuc
+    #
+    # This writes each replicate's training and test AUC from its
+    # maxentResults.csv, followed by their mean and standard deviation.
+    # -------------------------------------------------------------------------
+    def _summarizeAuc(self):
+
+        summaryPath = os.path.join(self._outputDirectory,
+                                   ReplicateRunner.SUMMARY_FILE)
+
+        keys = ('Training AUC', 'Test AUC')
+        aucs = []
+
+        for i in range(self._numReplicates):
+
+            resultsPath = os.path.join(self.replicateDirectory(i),
+                                       'maxentResults.csv')
+
+            with open(resultsPath) as csvFile:
+
+                results = next(csv.DictReader(csvFile))
+
+                aucs.append([float(results[key]) if results.get(key)
+                             else numpy.nan for key in keys])
+
+        aucs = numpy.array(aucs)
+
+        with open(summaryPath, 'w') as csvFile:
+
+            writer = csv.writer(csvFile, delimiter=',')
+            writer.writerow(['replicate'] + list(keys))
+
+            for i, row in enumerate(aucs):
+                writer.writerow([i] + row.tolist())
+
+            writer.writerow(['mean'] + numpy.nanmean(aucs, axis=0).tolist())
+
+            writer.writerow(['stddev'] +
+                            numpy.nanstd(aucs, axis=0, ddof=1).tolist())
+
+        return summaryPath
+
+    # -------------------------------------------------------------------------
+    # _writeSamples
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _writeSamples(path, header, rows, indexes):
+
+        with open(path, 'w') as csvFile:
+
+            writer = csv.writer(csvFile, delimiter=',')
+            writer.writerow(header)
+            writer.writerows(rows[i] for i in indexes)
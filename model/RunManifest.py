@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+
+# -----------------------------------------------------------------------------
+# class RunManifest
+#
+# This records, for each stage of a run, its inputs and the content hashes
+# of the files it wrote, in runManifest.json in the output directory.  A
+# stage is current when its inputs match the manifest and its outputs still
+# have their recorded hashes, so running a request again only re-runs the
+# stages whose inputs changed.  Inputs are any JSON values, typically the
+# hashes of the files a stage reads and its options.
+#
+# Hashing a file reads all of it, so each hash is kept with the file's size
+# and modification time, and the file is only read again when either
+# changes.  With force, no stage is current and every file is hashed again.
+# -----------------------------------------------------------------------------
+class RunManifest(object):
+
+    BLOCK_SIZE = 1024 * 1024
+    MANIFEST_FILE = 'runManifest.json'
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, directory, force=False):
+
+        self._path = os.path.join(directory, RunManifest.MANIFEST_FILE)
+        self._stages, self._files = self._load()
+        self.setForce(force)
+
+    # -------------------------------------------------------------------------
+    # digest
+    #
+    # This returns the SHA-1 of a file's content.
+    # -------------------------------------------------------------------------
+    def digest(self, path):
+
+        path = os.path.abspath(path)
+        fileStat = os.stat(path)
+        known = self._files.get(path)
+
+        if known and known[0] == fileStat.st_size and \
+           known[1] == fileStat.st_mtime:
+
+            return known[2]
+
+        sha = hashlib.sha1()
+
+        with open(path, 'rb') as inFile:
+
+            for block in iter(lambda: inFile.read(RunManifest.BLOCK_SIZE),
+                              b''):
+
+                sha.update(block)
+
+        self._files[path] = [fileStat.st_size,
+                             fileStat.st_mtime,
+                             sha.hexdigest()]
+
+        return sha.hexdigest()
+
+    # -------------------------------------------------------------------------
+    # digests
+    #
+    # This returns file name to SHA-1 for a list of paths.
+    # -------------------------------------------------------------------------
+    def digests(self, paths):
+
+        return {os.path.basename(path): self.digest(path) for path in paths}
+
+    # -------------------------------------------------------------------------
+    # isCurrent
+    #
+    # This returns true when a stage need not run again: its inputs are those
+    # recorded and its outputs are unchanged.
+    # -------------------------------------------------------------------------
+    def isCurrent(self, stage, inputs):
+
+        if self._force or stage not in self._stages:
+            return False
+
+        recorded = self._stages[stage]
+
+        if recorded['inputs'] != json.loads(json.dumps(inputs)):
+            return False
+
+        for path, digest in recorded['outputs'].items():
+
+            if not os.path.exists(path) or self.digest(path) != digest:
+                return False
+
+        return True
+
+    # -------------------------------------------------------------------------
+    # isForced
+    # -------------------------------------------------------------------------
+    def isForced(self):
+
+        return self._force
+
+    # -------------------------------------------------------------------------
+    # _load
+    # -------------------------------------------------------------------------
+    def _load(self):
+
+        try:
+            with open(self._path) as manifestFile:
+                manifest = json.load(manifestFile)
+
+            if manifest['version'] == RunManifest.VERSION:
+                return manifest['stages'], manifest['files']
+
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        return {}, {}
+
+    # -------------------------------------------------------------------------
+    # outputs
+    #
+    # This returns the paths a stage last wrote, even when it is not current.
+    # -------------------------------------------------------------------------
+    def outputs(self, stage):
+
+        if stage not in self._stages:
+            return []
+
+        return sorted(self._stages[stage]['outputs'])
+
+    # -------------------------------------------------------------------------
+    # path
+    # -------------------------------------------------------------------------
+    def path(self):
+
+        return self._path
+
+    # -------------------------------------------------------------------------
+    # record
+    #
+    # This records that a stage ran on inputs and wrote outputPaths.
+    # -------------------------------------------------------------------------
+    def record(self, stage, inputs, outputPaths):
+
+        self._stages[stage] = {
+            'inputs': json.loads(json.dumps(inputs)),
+            'outputs': {os.path.abspath(path): self.digest(path)
+                        for path in outputPaths}}
+
+        self._save()
+
+    # -------------------------------------------------------------------------
+    # _save
+    #
+    # The manifest is written to a temporary file then renamed into place, so
+    # an interrupted run never leaves a partial manifest.
+    # -------------------------------------------------------------------------
+    def _save(self):
+
+        manifest = {'version': RunManifest.VERSION,
+                    'stages': self._stages,
+                    'files': self._files}
+
+        tempPath = self._path + '.' + str(os.getpid()) + '.tmp'
+
+        with open(tempPath, 'w') as manifestFile:
+            json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+
+        os.rename(tempPath, self._path)
+
+    # -------------------------------------------------------------------------
+    # setForce
+    #
+    # When true, every stage runs again.
+    # -------------------------------------------------------------------------
+    def setForce(self, force):
+
+        self._force = force
+
+        if force:
+            self._files = {}
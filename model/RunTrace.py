@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import glob
+import json
+import os
+import resource
+import socket
+import threading
+import time
+import uuid
+
+
+# -----------------------------------------------------------------------------
+# class RunTrace
+#
+# This records how long each stage of a run takes and what it costs, and
+# writes the stages as a Chrome trace, which is JSON that chrome://tracing
+# and Perfetto display as a timeline.  Each stage records:
+#
+# - wallSeconds:        elapsed time
+# - cpuSeconds:         CPU time of the calling thread
+# - childCpuSeconds:    CPU time of child processes, like maxent.jar
+# - peakRssMb:          the process's peak resident memory so far
+# - childPeakRssMb:     the largest child process's peak resident memory
+# - readBytes:          bytes the process read, from /proc/self/io
+# - writtenBytes:       bytes the process wrote
+#
+# The I/O counts are the whole process's, so they include other threads'.
+# Within a stage, step adds up the time of repeated sub-steps, like reading
+# and writing each block of a layer, as stage arguments.
+#
+# Tracing is off until start is called.  While it is off, stage and step
+# return a shared, empty context, so instrumented code costs one attribute
+# lookup.
+#
+# Celery workers and process pools trace in their own processes.  A task
+# given a trace directory records its stages with recording, which saves
+# them to a file of their own there, and the client merges those files into
+# its trace.
+# -----------------------------------------------------------------------------
+class RunTrace(object):
+
+    TRACE_FILE = 'trace.json'
+
+    _current = None
+    _NOT_TRACING = contextlib.nullcontext()
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self._events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    # -------------------------------------------------------------------------
+    # current
+    #
+    # This returns the trace being recorded, or None.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def current():
+
+        return RunTrace._current
+
+    # -------------------------------------------------------------------------
+    # events
+    # -------------------------------------------------------------------------
+    def events(self):
+
+        return self._events
+
+    # -------------------------------------------------------------------------
+    # _ioBytes
+    #
+    # This returns the bytes read and written by this process, or zeros where
+    # /proc is unavailable.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _ioBytes():
+
+        counts = {}
+
+        try:
+            with open('/proc/self/io') as ioFile:
+
+                for line in ioFile:
+
+                    name, value = line.split(':')
+                    counts[name] = int(value)
+
+        except (IOError, OSError, ValueError):
+            pass
+
+        return counts.get('rchar', 0), counts.get('wchar', 0)
+
+    # -------------------------------------------------------------------------
+    # isTracing
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def isTracing():
+
+        return RunTrace._current is not None
+
+    # -------------------------------------------------------------------------
+    # merge
+    #
+    # This adds the events saved to a trace directory by workers, and
+    # removes their files.
+    # -------------------------------------------------------------------------
+    def merge(self, traceDir):
+
+        for path in sorted(glob.glob(os.path.join(traceDir, '*.json'))):
+
+            with open(path) as traceFile:
+                events = json.load(traceFile)['traceEvents']
+
+            with self._lock:
+                self._events.extend(events)
+
+            os.remove(path)
+
+    # -------------------------------------------------------------------------
+    # _record
+    # -------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _record(self, name, args):
+
+        stack = getattr(self._local, 'stack', None)
+
+        if stack is None:
+            stack = self._local.stack = []
+
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        readBytes, writtenBytes = RunTrace._ioBytes()
+        startTime = time.time()
+        startCounter = time.perf_counter()
+        startCpu = time.thread_time()
+        stack.append(args)
+
+        try:
+            yield
+
+        finally:
+
+            stack.pop()
+            wallSeconds = time.perf_counter() - startCounter
+            endChildren = resource.getrusage(resource.RUSAGE_CHILDREN)
+            endReadBytes, endWrittenBytes = RunTrace._ioBytes()
+
+            # ru_maxrss is in kilobytes on Linux.
+            args.update(
+                wallSeconds=wallSeconds,
+                cpuSeconds=time.thread_time() - startCpu,
+                childCpuSeconds=endChildren.ru_utime + endChildren.ru_stime -
+                children.ru_utime - children.ru_stime,
+                peakRssMb=resource.getrusage(
+                    resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                childPeakRssMb=endChildren.ru_maxrss / 1024.0,
+                readBytes=endReadBytes - readBytes,
+                writtenBytes=endWrittenBytes - writtenBytes)
+
+            event = {'name': name,
+                     'cat': 'maxent',
+                     'ph': 'X',
+                     'ts': int(startTime * 1e6),
+                     'dur': int(wallSeconds * 1e6),
+                     'pid': os.getpid(),
+                     'tid': threading.get_ident(),
+                     'args': args}
+
+            with self._lock:
+                self._events.append(event)
+
+    # -------------------------------------------------------------------------
+    # recording
+    #
+    # This traces a worker's task when traceDir is given, saving its events
+    # to a unique file there for the client to merge.  A forked worker
+    # inherits the client's trace, which is never saved from the worker, so
+    # a trace started by another process is replaced.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    @contextlib.contextmanager
+    def recording(traceDir):
+
+        if not traceDir or (RunTrace.isTracing() and
+                            RunTrace._current._pid == os.getpid()):
+
+            yield
+            return
+
+        trace = RunTrace.start()
+
+        try:
+            yield
+
+        finally:
+
+            RunTrace.stop()
+
+            trace.save(os.path.join(traceDir,
+                                    socket.gethostname() + '-' +
+                                    str(os.getpid()) + '-' +
+                                    uuid.uuid4().hex + '.json'))
+
+    # -------------------------------------------------------------------------
+    # save
+    #
+    # This writes the trace to a temporary file then renames it, so a reader
+    # never sees a partial trace.
+    # -------------------------------------------------------------------------
+    def save(self, path):
+
+        directory = os.path.dirname(path)
+
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tempPath = path + '.' + uuid.uuid4().hex + '.tmp'
+
+        with self._lock:
+
+            with open(tempPath, 'w') as traceFile:
+
+                json.dump({'traceEvents': self._events,
+                           'displayTimeUnit': 'ms',
+                           'otherData': {'host': socket.gethostname()}},
+                          traceFile)
+
+        os.rename(tempPath, path)
+
+    # -------------------------------------------------------------------------
+    # stage
+    #
+    # This returns a context recording a stage, with args like the image's
+    # name shown beside its measurements.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def stage(name, **args):
+
+        trace = RunTrace._current
+
+        if trace is None:
+            return RunTrace._NOT_TRACING
+
+        return trace._record(name, args)
+
+    # -------------------------------------------------------------------------
+    # start
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def start():
+
+        RunTrace._current = RunTrace()
+
+        return RunTrace._current
+
+    # -------------------------------------------------------------------------
+    # step
+    #
+    # This returns a context adding its wall time to the innermost stage of
+    # the calling thread, as the stage's <name>Seconds.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def step(name):
+
+        trace = RunTrace._current
+
+        if trace is None:
+            return RunTrace._NOT_TRACING
+
+        return trace._time(name + 'Seconds')
+
+    # -------------------------------------------------------------------------
+    # stop
+    #
+    # This stops tracing and returns the trace.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def stop():
+
+        trace = RunTrace._current
+        RunTrace._current = None
+
+        return trace
+
+    # -------------------------------------------------------------------------
+    # _time
+    # -------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _time(self, key):
+
+        start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+
+            stack = getattr(self._local, 'stack', None)
+
+            if stack:
+
+                args = stack[-1]
+                args[key] = args.get(key, 0.0) + time.perf_counter() - start
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+
+import numpy
+
+from osgeo import gdal
+
+
+# -----------------------------------------------------------------------------
+# class SwdSampler
+#
+# This writes maxent.jar's samples-with-data (SWD) files from prepared
+# layers.  In SWD mode maxent.jar reads environmental values at the presence
+# and background points from CSV files instead of loading every raster, so
+# fitting scales with the number of points, not the size of the grid.
+#
+# Background points are cell centers drawn without replacement from a seeded
+# generator, so runs are reproducible.  Each layer is read once, and values at
+# every presence and background point are pulled from it in one vectorized
+# step.  Points outside the grid or with no data in any layer are dropped, as
+# maxent.jar would drop them.
+#
+# All layers must share one grid.  Given a LayerStack of the layers, values
+# are gathered from its memory map instead, which reads only the pages
+# holding the points' cells.
+# -----------------------------------------------------------------------------
+class SwdSampler(object):
+
+    BACKGROUND_SPECIES = 'background'
+    DEFAULT_NUM_BACKGROUND = 10000
+
+    # Background candidates drawn per requested point, to leave enough after
+    # dropping cells with no data.
+    OVERSAMPLE = 4
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 layerPaths,
+                 numBackground=DEFAULT_NUM_BACKGROUND,
+                 seed=0,
+                 layerStack=None):
+
+        if not layerPaths:
+            raise RuntimeError('At least one layer must be specified.')
+
+        self._layerPaths = sorted(layerPaths)
+        self._numBackground = numBackground
+        self._seed = seed
+        self._layerStack = layerStack
+
+        if layerStack:
+
+            if layerStack.layerNames() != self.layerNames():
+
+                raise RuntimeError('The layer stack does not hold the ' +
+                                   'layers ' + ', '.join(self.layerNames()))
+
+            self._geoTransform = layerStack.geoTransform()
+            self._rows = layerStack.rows()
+            self._cols = layerStack.cols()
+            return
+
+        first = gdal.Open(self._layerPaths[0])
+
+        if first is None:
+            raise RuntimeError('Unable to open ' + str(self._layerPaths[0]))
+
+        self._geoTransform = first.GetGeoTransform()
+        self._rows = first.RasterYSize
+        self._cols = first.RasterXSize
+
+    # -------------------------------------------------------------------------
+    # _backgroundCells
+    #
+    # This returns the flat indexes of the background candidate cells.  A
+    # Generator draws them without replacement in time proportional to their
+    # number, where RandomState permutes every cell of the grid.
+    # -------------------------------------------------------------------------
+    def _backgroundCells(self):
+
+        numCells = self._rows * self._cols
+        numCandidates = min(numCells,
+                            self._numBackground * SwdSampler.OVERSAMPLE)
+
+        generator = numpy.random.default_rng(self._seed)
+
+        return generator.choice(numCells, numCandidates, replace=False)
+
+    # -------------------------------------------------------------------------
+    # cellCenters
+    # -------------------------------------------------------------------------
+    def cellCenters(self, rows, cols):
+
+        xs = self._geoTransform[0] + (cols + 0.5) * self._geoTransform[1]
+        ys = self._geoTransform[3] + (rows + 0.5) * self._geoTransform[5]
+
+        return xs, ys
+
+    # -------------------------------------------------------------------------
+    # cellIndexes
+    #
+    # This returns the row and column of each point, and a mask of the points
+    # inside the grid.
+    # -------------------------------------------------------------------------
+    def cellIndexes(self, xs, ys):
+
+        cols = numpy.floor((numpy.asarray(xs) - self._geoTransform[0]) /
+                           self._geoTransform[1]).astype(numpy.int64)
+
+        rows = numpy.floor((numpy.asarray(ys) - self._geoTransform[3]) /
+                           self._geoTransform[5]).astype(numpy.int64)
+
+        inside = (rows >= 0) & (rows < self._rows) & \
+                 (cols >= 0) & (cols < self._cols)
+
+        return rows, cols, inside
+
+    # -------------------------------------------------------------------------
+    # extract
+    #
+    # This returns a points x layers array of layer values at the cells, and a
+    # mask of the points with data in every layer.
+    # -------------------------------------------------------------------------
+    def extract(self, rows, cols):
+
+        if self._layerStack:
+            return self._layerStack.extract(rows, cols)
+
+        values = numpy.empty((len(rows), len(self._layerPaths)),
+                             dtype=numpy.float32)
+
+        valid = numpy.ones(len(rows), dtype=bool)
+
+        for i, layerPath in enumerate(self._layerPaths):
+
+            dataset = gdal.Open(layerPath)
+
+            if dataset.GetGeoTransform() != self._geoTransform or \
+               dataset.RasterXSize != self._cols or \
+               dataset.RasterYSize != self._rows:
+
+                raise RuntimeError('Layer ' + layerPath +
+                                   ' is not on the same grid as ' +
+                                   self._layerPaths[0])
+
+            band = dataset.GetRasterBand(1)
+            layerValues = band.ReadAsArray()[rows, cols]
+            noData = band.GetNoDataValue()
+
+            valid &= ~numpy.isnan(layerValues)
+
+            if noData is not None:
+                valid &= layerValues != noData
+
+            values[:, i] = layerValues
+
+        return values, valid
+
+    # -------------------------------------------------------------------------
+    # layerNames
+    # -------------------------------------------------------------------------
+    def layerNames(self):
+
+        return [os.path.splitext(os.path.basename(path))[0]
+                for path in self._layerPaths]
+
+    # -------------------------------------------------------------------------
+    # write
+    #
+    # This writes the SWD samples file for the presence points and the SWD
+    # background file, returning the number of points in each.
+    # -------------------------------------------------------------------------
+    def write(self, species, xs, ys, samplesPath, backgroundPath):
+
+        rows, cols, inside = self.cellIndexes(xs, ys)
+        xs = numpy.asarray(xs)[inside]
+        ys = numpy.asarray(ys)[inside]
+        numPresence = len(xs)
+
+        bgCells = self._backgroundCells()
+        bgRows = bgCells // self._cols
+        bgCols = bgCells % self._cols
+        bgXs, bgYs = self.cellCenters(bgRows, bgCols)
+
+        # Extract presence and background values together, one read per layer.
+        values, valid = self.extract(
+            numpy.concatenate((rows[inside], bgRows)),
+            numpy.concatenate((cols[inside], bgCols)))
+
+        presValid = valid[:numPresence]
+        bgValid = numpy.flatnonzero(valid[numPresence:])
+        bgValid = bgValid[:self._numBackground]
+
+        self._writeFile(samplesPath,
+                        species,
+                        xs[presValid],
+                        ys[presValid],
+                        values[:numPresence][presValid])
+
+        self._writeFile(backgroundPath,
+                        SwdSampler.BACKGROUND_SPECIES,
+                        bgXs[bgValid],
+                        bgYs[bgValid],
+                        values[numPresence:][bgValid])
+
+        return int(presValid.sum()), len(bgValid)
+
+    # -------------------------------------------------------------------------
+    # _writeFile
+    # -------------------------------------------------------------------------
+    def _writeFile(self, path, species, xs, ys, values):
+
+        with open(path, 'w') as csvFile:
+
+            writer = csv.writer(csvFile, delimiter=',')
+            writer.writerow(['species', 'x', 'y'] + self.layerNames())
+
+            for x, y, row in zip(xs.tolist(), ys.tolist(), values):
+
+                writer.writerow([species, x, y] +
+                                ['%.9g' % value for value in row])
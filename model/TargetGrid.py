@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+from core.model.Envelope import Envelope
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.LayerPreparer import LayerPreparer
+
+
+# -----------------------------------------------------------------------------
+# class TargetGrid
+#
+# This is the one grid every layer of a request is warped onto.  maxent.jar
+# requires its layers to share an origin, cell size and shape.  Resampling
+# each layer to its own square cells does not guarantee that.
+#
+# plan chooses the cell size once per request: the finest of the layers'
+# natural resolutions, unless one is given.  Those come from the metadata of
+# IndexedImages, so planning opens no image; only other images are opened
+# to ask GDAL.  It snaps the observation
+# envelope outward to whole cells, so the grid's corners are multiples of
+# the cell size.  Warping with the grid's envelope and resolution then yields
+# exactly this grid, wherever the layer is prepared.  checkAlignment verifies
+# the prepared layers before maxent.jar reads them.
+# -----------------------------------------------------------------------------
+class TargetGrid(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, ulx, uly, cellSize, cols, rows, srs):
+
+        self._ulx = ulx
+        self._uly = uly
+        self._cellSize = cellSize
+        self._cols = cols
+        self._rows = rows
+        self._srs = srs
+
+    # -------------------------------------------------------------------------
+    # cellSize
+    # -------------------------------------------------------------------------
+    def cellSize(self):
+
+        return self._cellSize
+
+    # -------------------------------------------------------------------------
+    # checkAlignment
+    #
+    # This reads the header of each ASCII grid and raises an error naming
+    # every grid whose shape, origin or cell size differs from this grid.
+    # -------------------------------------------------------------------------
+    def checkAlignment(self, ascPaths):
+
+        tolerance = self._cellSize * 1e-6
+        expected = (self._cols, self._rows, self._ulx, self.lry())
+        misaligned = []
+
+        for ascPath in ascPaths:
+
+            header = TargetGrid.readHeader(ascPath)
+
+            actual = (int(header['ncols']),
+                      int(header['nrows']),
+                      float(header['xllcorner']),
+                      float(header['yllcorner']))
+
+            if actual[:2] != expected[:2] or \
+               abs(actual[2] - expected[2]) > tolerance or \
+               abs(actual[3] - expected[3]) > tolerance or \
+               abs(float(header['cellsize']) - self._cellSize) > tolerance:
+
+                misaligned.append(ascPath + ' ' + str(actual))
+
+        if misaligned:
+
+            raise RuntimeError('Layers are not aligned to the target grid ' +
+                               str(self) + ': ' + '; '.join(misaligned))
+
+    # -------------------------------------------------------------------------
+    # cols
+    # -------------------------------------------------------------------------
+    def cols(self):
+
+        return self._cols
+
+    # -------------------------------------------------------------------------
+    # envelope
+    #
+    # This is the grid's snapped extent, to warp layers with.
+    # -------------------------------------------------------------------------
+    def envelope(self):
+
+        envelope = Envelope()
+        envelope.addPoint(self._ulx, self._uly, 0, self._srs)
+        envelope.addPoint(self.lrx(), self.lry(), 0, self._srs)
+
+        return envelope
+
+    # -------------------------------------------------------------------------
+    # lrx
+    # -------------------------------------------------------------------------
+    def lrx(self):
+
+        return self._ulx + self._cols * self._cellSize
+
+    # -------------------------------------------------------------------------
+    # lry
+    # -------------------------------------------------------------------------
+    def lry(self):
+
+        return self._uly - self._rows * self._cellSize
+
+    # -------------------------------------------------------------------------
+    # naturalResolution
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def naturalResolution(image, srs, envelope):
+
+        cellSize = None
+
+        if isinstance(image, IndexedImage):
+            cellSize = image.naturalResolution(srs)
+
+        if cellSize is None:
+
+            cellSize = LayerPreparer.naturalResolution(image.fileName(),
+                                                       srs,
+                                                       envelope)
+
+        return cellSize
+
+    # -------------------------------------------------------------------------
+    # plan
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def plan(images, srs, envelope, resolution=None):
+
+        cellSize = resolution
+
+        if not cellSize:
+
+            cellSize = min(TargetGrid.naturalResolution(image, srs, envelope)
+                           for image in images)
+
+        ulx = math.floor(envelope.ulx() / cellSize) * cellSize
+        uly = math.ceil(envelope.uly() / cellSize) * cellSize
+        lrx = math.ceil(envelope.lrx() / cellSize) * cellSize
+        lry = math.floor(envelope.lry() / cellSize) * cellSize
+
+        # A degenerate envelope, like a single point, still gets one cell.
+        cols = max(1, int(round((lrx - ulx) / cellSize)))
+        rows = max(1, int(round((uly - lry) / cellSize)))
+
+        return TargetGrid(ulx, uly, cellSize, cols, rows, srs)
+
+    # -------------------------------------------------------------------------
+    # readHeader
+    #
+    # This returns the keys and values of an ASCII grid's header, lowercased.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def readHeader(ascPath):
+
+        header = {}
+
+        with open(ascPath) as ascFile:
+
+            for i in range(6):
+
+                fields = ascFile.readline().split()
+
+                if len(fields) == 2:
+                    header[fields[0].lower()] = fields[1]
+
+        for key in ('ncols', 'nrows', 'xllcorner', 'yllcorner', 'cellsize'):
+
+            if key not in header:
+
+                raise RuntimeError('No ' + key + ' in the header of ' +
+                                   str(ascPath))
+
+        return header
+
+    # -------------------------------------------------------------------------
+    # rows
+    # -------------------------------------------------------------------------
+    def rows(self):
+
+        return self._rows
+
+    # -------------------------------------------------------------------------
+    # srs
+    # -------------------------------------------------------------------------
+    def srs(self):
+
+        return self._srs
+
+    # -------------------------------------------------------------------------
+    # ulx
+    # -------------------------------------------------------------------------
+    def ulx(self):
+
+        return self._ulx
+
+    # -------------------------------------------------------------------------
+    # uly
+    # -------------------------------------------------------------------------
+    def uly(self):
+
+        return self._uly
+
+    # -------------------------------------------------------------------------
+    # __str__
+    # -------------------------------------------------------------------------
+    def __str__(self):
+
+        return str(self._cols) + ' x ' + str(self._rows) + ' cells of ' + \
+            repr(self._cellSize) + ' from (' + repr(self._ulx) + ', ' + \
+            repr(self._uly) + ')'
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import numpy
+
+
+# -----------------------------------------------------------------------------
+# class TaskCollector
+#
+# This submits Celery signatures and handles each result as it arrives,
+# instead of blocking on a whole group.  Retries happen in the tasks
+# themselves, with backoff, so a failed result here has exhausted them.
+#
+# - A task running longer than timeout seconds is revoked and reported as
+#   failed.
+# - A straggler, running longer than stragglerFactor times the median
+#   duration of the tasks completed so far, is submitted again to whichever
+#   worker is idle.  The first copy to succeed wins and the other is
+#   revoked, so tasks must be idempotent.
+# - Tasks are timed from when a worker starts them, which needs
+#   task_track_started, not from when they are queued.  A task still
+#   PENDING in the queue is neither timed out nor a straggler, so more tasks
+#   than workers do not time out while they wait.  The start is seen when
+#   polling, so durations are within pollInterval.
+# - One failure does not stop the others.  collect returns every success and
+#   every failure, so callers keep what succeeded and report what did not.
+# -----------------------------------------------------------------------------
+class TaskCollector(object):
+
+    MIN_COMPLETED = 3
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # A timeout or stragglerFactor of None disables it.
+    # -------------------------------------------------------------------------
+    def __init__(self, timeout=None, stragglerFactor=3.0, pollInterval=1.0):
+
+        self._timeout = timeout
+        self._stragglerFactor = stragglerFactor
+        self._pollInterval = pollInterval
+
+    # -------------------------------------------------------------------------
+    # _age
+    #
+    # This returns how long an attempt has run, or zero while it is queued.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _age(attempt, now):
+
+        result, start = attempt
+
+        return 0.0 if start is None else now - start
+
+    # -------------------------------------------------------------------------
+    # collect
+    #
+    # This takes a list of (label, signature) and returns two dictionaries:
+    # label to result for the tasks that succeeded, and label to error
+    # message for those that failed.
+    # -------------------------------------------------------------------------
+    def collect(self, labeledSignatures):
+
+        signatures = dict(labeledSignatures)
+        pending = {}
+        results = {}
+        failures = {}
+        durations = []
+        numTasks = len(signatures)
+
+        # Each attempt is [result, start], and start is None until a worker
+        # starts the task.
+        for label, signature in labeledSignatures:
+            pending[label] = [[signature.apply_async(), None]]
+
+        while pending:
+
+            now = time.time()
+
+            for label in list(pending):
+
+                attempts = pending[label]
+                TaskCollector._markStarted(attempts, now)
+                succeeded = [(result, start) for result, start in attempts
+                             if result.ready() and result.successful()]
+
+                failed = [result for result, start in attempts
+                          if result.ready() and not result.successful()]
+
+                if succeeded:
+
+                    result, start = succeeded[0]
+                    results[label] = result.get()
+
+                    # A task that started and finished between two polls
+                    # has no measured duration.
+                    if start is not None:
+                        durations.append(now - start)
+
+                    self._revoke(attempts, keep=result)
+                    del pending[label]
+
+                    print('Completed ' + str(label) + ' (' +
+                          str(len(results) + len(failures)) + ' of ' +
+                          str(numTasks) + ')')
+
+                elif len(failed) == len(attempts):
+
+                    failures[label] = repr(failed[-1].result)
+                    del pending[label]
+
+                    print('Failed ' + str(label) + ': ' + failures[label])
+
+                elif self._timeout and \
+                        TaskCollector._age(attempts[0], now) > self._timeout:
+
+                    self._revoke(attempts)
+
+                    failures[label] = 'Timed out after ' + \
+                        str(self._timeout) + ' s'
+
+                    del pending[label]
+
+                    print('Failed ' + str(label) + ': ' + failures[label])
+
+                elif self._isStraggler(attempts, durations, now):
+
+                    print('Resubmitting straggler ' + str(label))
+
+                    attempts.append([signatures[label].apply_async(), None])
+
+            if pending:
+                time.sleep(self._pollInterval)
+
+        return results, failures
+
+    # -------------------------------------------------------------------------
+    # _isStraggler
+    #
+    # A task is resubmitted once, only after enough tasks have completed to
+    # judge what is slow.
+    # -------------------------------------------------------------------------
+    def _isStraggler(self, attempts, durations, now):
+
+        if not self._stragglerFactor or len(attempts) > 1 or \
+                len(durations) < TaskCollector.MIN_COMPLETED:
+
+            return False
+
+        return TaskCollector._age(attempts[0], now) > \
+            self._stragglerFactor * numpy.median(durations)
+
+    # -------------------------------------------------------------------------
+    # _markStarted
+    #
+    # This records when each attempt is first seen out of the queue.  One
+    # already finished is left unstarted, because its start is unknown.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _markStarted(attempts, now):
+
+        for attempt in attempts:
+
+            result, start = attempt
+
+            if start is None and not result.ready() and \
+                    result.state != 'PENDING':
+
+                attempt[1] = now
+
+    # -------------------------------------------------------------------------
+    # _revoke
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _revoke(attempts, keep=None):
+
+        for result, start in attempts:
+
+            if result is not keep and not result.ready():
+                result.revoke(terminate=True)
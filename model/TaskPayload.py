@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+
+# -----------------------------------------------------------------------------
+# class TaskPayload
+#
+# This is the compact, JSON-serializable form of a layer preparation task.
+# Celery tasks used to pickle a GeospatialImageFile, an Envelope and a proj4
+# string.  Instead, a payload is a small dictionary of plain values:
+#
+# version     the payload format, checked by decode
+# image       the path to the image
+# srs         'EPSG:<code>' when the SRS has one, or else its WKT
+# bounds      the envelope as [ulx, uly, lrx, lry]
+# resolution  the target cell size, or None to let GDAL choose
+#
+# Callers add their own plain-valued keys, like the output directory.  As
+# it holds no pickled objects, tasks may use Celery's JSON serializer, and
+# a broker can refuse pickle.
+# -----------------------------------------------------------------------------
+class TaskPayload(object):
+
+    VERSION = 1
+
+    # -------------------------------------------------------------------------
+    # decode
+    #
+    # This returns the image path, SpatialReference and Envelope of a
+    # payload.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def decode(payload):
+
+        if payload.get('version') != TaskPayload.VERSION:
+
+            raise RuntimeError('Unsupported task payload version: ' +
+                               str(payload.get('version')))
+
+        srs = SpatialReference()
+        srs.SetFromUserInput(str(payload['srs']))
+
+        ulx, uly, lrx, lry = payload['bounds']
+        envelope = Envelope()
+        envelope.addPoint(ulx, uly, 0, srs)
+        envelope.addPoint(lrx, lry, 0, srs)
+
+        return payload['image'], srs, envelope
+
+    # -------------------------------------------------------------------------
+    # encode
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def encode(imagePath, srs, envelope, resolution=None, **extras):
+
+        payload = {'version': TaskPayload.VERSION,
+                   'image': imagePath,
+                   'srs': TaskPayload.encodeSrs(srs),
+                   'bounds': [envelope.ulx(),
+                              envelope.uly(),
+                              envelope.lrx(),
+                              envelope.lry()],
+                   'resolution': resolution}
+
+        payload.update(extras)
+
+        return payload
+
+    # -------------------------------------------------------------------------
+    # encodeSrs
+    #
+    # An EPSG code is much smaller than WKT, so it is used when the SRS is
+    # identified by one.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def encodeSrs(srs):
+
+        if srs.GetAuthorityName(None) == 'EPSG' and \
+                srs.GetAuthorityCode(None):
+
+            return 'EPSG:' + srs.GetAuthorityCode(None)
+
+        return srs.ExportToWkt()
+
+    # -------------------------------------------------------------------------
+    # numBytes
+    #
+    # This is the size of a payload's JSON message body.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def numBytes(payload):
+
+        return len(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from core.model.SystemCommand import SystemCommand
+
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.MxeConverter import MxeConverter
+
+
+# -----------------------------------------------------------------------------
+# directorySize
+# -----------------------------------------------------------------------------
+def directorySize(paths):
+
+    return sum(os.path.getsize(path) for path in paths)
+
+
+# -----------------------------------------------------------------------------
+# timeMaxEnt
+#
+# maxent.jar's own cache is disabled, so each ASCII run parses the text.
+# -----------------------------------------------------------------------------
+def timeMaxEnt(jarFile, samplesFile, layerDir):
+
+    outDir = tempfile.mkdtemp()
+
+    cmd = 'java -Xmx1024m -jar ' + jarFile + \
+          ' visible=false autorun cache=false ' + \
+          '-s "' + samplesFile + '" ' + \
+          '-e "' + layerDir + '" ' + \
+          '-o "' + outDir + '"'
+
+    startTime = time.time()
+    SystemCommand(cmd, None, True)
+    elapsed = time.time() - startTime
+    shutil.rmtree(outDir)
+
+    return elapsed
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# python -m maxent.model.benchmarks.benchmark_layerFormat -a out/asc \
+#     -s out/ebd_Cassins_1989.csv
+# -----------------------------------------------------------------------------
+def main():
+
+    desc = 'This compares maxent.jar run times on ASCII and .mxe layers.'
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('-a',
+                        required=True,
+                        help='Path to a directory of prepared ASCII grids')
+
+    parser.add_argument('-j',
+                        default=MaxEntRequest.MAX_ENT_JAR,
+                        help='Path to maxent.jar')
+
+    parser.add_argument('-n',
+                        default=3,
+                        type=int,
+                        help='Number of timed runs of each format')
+
+    parser.add_argument('-s',
+                        required=True,
+                        help='Path to a maxent.jar samples file')
+
+    args = parser.parse_args()
+
+    ascPaths = sorted(glob.glob(os.path.join(args.a, '*.asc')))
+    mxeDir = tempfile.mkdtemp()
+
+    startTime = time.time()
+    mxePaths = MxeConverter.convert(ascPaths, mxeDir, args.j)
+    print('Conversion: ' + '%.3f' % (time.time() - startTime) + ' s')
+
+    print('ASCII size: ' + str(directorySize(ascPaths)) + ' bytes')
+    print('mxe size:   ' + str(directorySize(mxePaths)) + ' bytes')
+
+    for name, layerDir in (('ASCII', args.a), ('mxe', mxeDir)):
+
+        times = [timeMaxEnt(args.j, args.s, layerDir) for i in range(args.n)]
+
+        print(name + ' maxent.jar run: best ' + '%.3f' % min(times) +
+              ' s, mean ' + '%.3f' % (sum(times) / len(times)) + ' s')
+
+    shutil.rmtree(mxeDir)
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
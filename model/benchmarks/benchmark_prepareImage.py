@@ -0,0 +1,157 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import fileinput
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from core.model.GeospatialImageFile import GeospatialImageFile
+from core.model.SystemCommand import SystemCommand
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.ObservationFile import ObservationFile
+
+
+# -----------------------------------------------------------------------------
+# legacyPrepareImage
+#
+# This is MaxEntRequest.prepareImage as it was before LayerPreparer: copy,
+# clip and reproject, resample, gdal_translate, then rewrite NaNs.
+# -----------------------------------------------------------------------------
+def legacyPrepareImage(image, srs, envelope, ascDir):
+
+    baseName = os.path.basename(image.fileName())
+    nameNoExtension = os.path.splitext(baseName)[0]
+    ascImagePath = os.path.join(ascDir, nameNoExtension + '.asc')
+    copyPath = os.path.join(ascDir, baseName)
+    shutil.copy(image.fileName(), copyPath)
+    imageCopy = GeospatialImageFile(copyPath, srs)
+    imageCopy.clipReproject(envelope)
+
+    squareScale = imageCopy.getSquareScale()
+    imageCopy.resample(squareScale, squareScale)
+
+    cmd = 'gdal_translate -ot Float32 -of AAIGrid -a_nodata -9999.0' + \
+          ' "' + imageCopy.fileName() + '"' + \
+          ' "' + ascImagePath + '"'
+
+    SystemCommand(cmd, None, True)
+
+    for line in fileinput.FileInput(ascImagePath, inplace=1):
+
+        line = line.replace('nan', '-9999')
+        sys.stdout.write(line)
+
+    return ascImagePath
+
+
+# -----------------------------------------------------------------------------
+# readGrid
+# -----------------------------------------------------------------------------
+def readGrid(ascImagePath):
+
+    dataset = gdal.Open(ascImagePath)
+
+    return dataset.GetRasterBand(1).ReadAsArray(), dataset.GetGeoTransform()
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# python -m maxent.model.benchmarks.benchmark_prepareImage -e 4326 \
+#     -f ebd_Cassins_1989.csv -s "Cassin's Sparrow" -i merra/QV2M.nc
+# -----------------------------------------------------------------------------
+def main():
+
+    desc = 'This compares LayerPreparer with the legacy prepareImage path.'
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('-e',
+                        required=True,
+                        type=int,
+                        help='Integer EPSG code representing the spatial ' +
+                             'reference system of the input image.')
+
+    parser.add_argument('-f',
+                        required=True,
+                        help='Path to observation file')
+
+    parser.add_argument('-i',
+                        required=True,
+                        help='Path to the image file')
+
+    parser.add_argument('-n',
+                        default=3,
+                        type=int,
+                        help='Number of timed runs of each path')
+
+    parser.add_argument('-s',
+                        required=True,
+                        help='Name of species in observation file')
+
+    args = parser.parse_args()
+
+    srs = SpatialReference()
+    srs.ImportFromEPSG(args.e)
+
+    observationFile = ObservationFile(args.f, args.s)
+    observationFile.transformTo(srs)
+    envelope = observationFile.envelope()
+    image = GeospatialImageFile(args.i, srs)
+    times = {'legacy': [], 'single-pass': []}
+
+    for run in range(args.n):
+
+        legacyDir = tempfile.mkdtemp()
+        startTime = time.time()
+        legacyPath = legacyPrepareImage(image, srs, envelope, legacyDir)
+        times['legacy'].append(time.time() - startTime)
+
+        singleDir = tempfile.mkdtemp()
+        singlePath = os.path.join(singleDir, os.path.basename(legacyPath))
+        startTime = time.time()
+        LayerPreparer.prepare(image.fileName(), srs, envelope, singlePath)
+        times['single-pass'].append(time.time() - startTime)
+
+        if run == 0:
+
+            legacyGrid, legacyTransform = readGrid(legacyPath)
+            singleGrid, singleTransform = readGrid(singlePath)
+
+            print('Legacy grid:      ' + str(legacyGrid.shape) + ' ' +
+                  str(legacyTransform))
+
+            print('Single-pass grid: ' + str(singleGrid.shape) + ' ' +
+                  str(singleTransform))
+
+            if legacyGrid.shape == singleGrid.shape:
+
+                print('Maximum difference: ' +
+                      str(numpy.abs(legacyGrid - singleGrid).max()))
+
+        shutil.rmtree(legacyDir)
+        shutil.rmtree(singleDir)
+
+    for path in sorted(times):
+
+        print(path + ': best ' + '%.3f' % min(times[path]) + ' s, mean ' +
+              '%.3f' % (sum(times[path]) / len(times[path])) + ' s')
+
+    print('Speedup: ' +
+          '%.2f' % (min(times['legacy']) / min(times['single-pass'])) + 'x')
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy
+
+from osgeo import gdal
+
+from core.model.SystemCommand import SystemCommand
+
+from maxent.model.MaxEntProjector import MaxEntProjector
+from maxent.model.MaxEntRequest import MaxEntRequest
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# python -m maxent.model.benchmarks.benchmark_projection \
+#     -l out/Cassin\'s_Sparrow.lambdas -i out/asc -p 16
+# -----------------------------------------------------------------------------
+def main():
+
+    desc = 'This compares MaxEntProjector with maxent.jar\'s projection.'
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('-i',
+                        required=True,
+                        help='Path to directory of prepared layers')
+
+    parser.add_argument('-j',
+                        default=MaxEntRequest.MAX_ENT_JAR,
+                        help='Path to maxent.jar')
+
+    parser.add_argument('-l',
+                        required=True,
+                        help='Path to the .lambdas file maxent.jar wrote')
+
+    parser.add_argument('-p',
+                        default=1,
+                        type=int,
+                        help='Number of processes for MaxEntProjector')
+
+    args = parser.parse_args()
+
+    outDir = tempfile.mkdtemp()
+    jarPath = os.path.join(outDir, 'jar.asc')
+    pythonPath = os.path.join(outDir, 'python.asc')
+
+    cmd = 'java -Xmx1024m -cp ' + args.j + ' density.Project ' + \
+          '"' + args.l + '" "' + args.i + '" "' + jarPath + '" ' + \
+          'outputformat=cloglog'
+
+    startTime = time.time()
+    SystemCommand(cmd, None, True)
+    jarTime = time.time() - startTime
+
+    startTime = time.time()
+    MaxEntProjector(args.l).project(args.i, pythonPath, numProcesses=args.p)
+    pythonTime = time.time() - startTime
+
+    jarGrid = gdal.Open(jarPath).ReadAsArray()
+    pythonGrid = gdal.Open(pythonPath).ReadAsArray()
+    valid = jarGrid != -9999
+
+    print('maxent.jar:      ' + '%.3f' % jarTime + ' s')
+    print('MaxEntProjector: ' + '%.3f' % pythonTime + ' s')
+
+    print('No-data cells agree: ' +
+          str(bool((valid == (pythonGrid != -9999)).all())))
+
+    print('Maximum difference: ' +
+          str(numpy.abs(jarGrid[valid] - pythonGrid[valid]).max()))
+
+    shutil.rmtree(outDir)
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,565 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+import numpy
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.MaxEntRequest import MaxEntRequest
+from maxent.model.ObservationFile import ObservationFile
+from maxent.model.RunTrace import RunTrace
+
+# -----------------------------------------------------------------------------
+# The synthetic data cover this box, in EPSG:4326.
+# -----------------------------------------------------------------------------
+BOUNDS = (-120.0, 50.0, -100.0, 30.0)
+EPSG = 4326
+SEED = 0
+SPECIES = 'Synthetic Sparrow'
+VERSION = 1
+
+
+# -----------------------------------------------------------------------------
+# syntheticEnvelope
+# -----------------------------------------------------------------------------
+def syntheticEnvelope(spatialReference):
+
+    env = Envelope()
+    env.addPoint(BOUNDS[0], BOUNDS[1], 0, spatialReference)
+    env.addPoint(BOUNDS[2], BOUNDS[3], 0, spatialReference)
+
+    return env
+
+
+# -----------------------------------------------------------------------------
+# syntheticSrs
+# -----------------------------------------------------------------------------
+def syntheticSrs():
+
+    spatialReference = SpatialReference()
+    spatialReference.ImportFromEPSG(EPSG)
+
+    return spatialReference
+
+
+# -----------------------------------------------------------------------------
+# writeLayer
+#
+# This writes a size x size Float32 layer covering BOUNDS: a smooth, seeded
+# field with a corner of NaNs, so preparing it maps missing values too.
+# -----------------------------------------------------------------------------
+def writeLayer(path, driverName, size, seed=SEED):
+
+    random = numpy.random.RandomState(seed)
+    cols = numpy.linspace(0, 4 * numpy.pi, size, dtype=numpy.float32)
+    field = numpy.sin(cols)[None, :] * numpy.cos(cols)[:, None]
+    field += random.normal(0, 0.1, (size, size)).astype(numpy.float32)
+    field[:size // 16, :size // 16] = numpy.nan
+
+    cellSize = (BOUNDS[2] - BOUNDS[0]) / size
+    cellHeight = (BOUNDS[1] - BOUNDS[3]) / size
+
+    dataset = gdal.GetDriverByName(driverName).Create(path,
+                                                      size,
+                                                      size,
+                                                      1,
+                                                      gdal.GDT_Float32)
+
+    dataset.SetGeoTransform((BOUNDS[0], cellSize, 0,
+                             BOUNDS[1], 0, -cellHeight))
+
+    dataset.SetProjection(syntheticSrs().ExportToWkt())
+    dataset.GetRasterBand(1).WriteArray(field)
+    dataset = None
+
+    return path
+
+
+# -----------------------------------------------------------------------------
+# writeObservations
+#
+# This writes numRows seeded points inside BOUNDS, about half of them
+# presences, clustered around a few hotspots like eBird data.
+# -----------------------------------------------------------------------------
+def writeObservations(path, numRows, seed=SEED, chunkSize=1000000):
+
+    random = numpy.random.RandomState(seed)
+    hotspots = random.uniform((BOUNDS[0], BOUNDS[3]),
+                              (BOUNDS[2], BOUNDS[1]),
+                              (20, 2))
+
+    with open(path, 'w') as csvFile:
+
+        csvFile.write('x,y,pres/abs,epsg:' + str(EPSG) + '\n')
+
+        for start in range(0, numRows, chunkSize):
+
+            count = min(chunkSize, numRows - start)
+            centers = hotspots[random.randint(0, len(hotspots), count)]
+            points = centers + random.normal(0, 1.0, (count, 2))
+            points[:, 0] = points[:, 0].clip(BOUNDS[0], BOUNDS[2])
+            points[:, 1] = points[:, 1].clip(BOUNDS[3], BOUNDS[1])
+            responses = random.randint(0, 2, count)
+
+            numpy.savetxt(csvFile,
+                          numpy.column_stack((points, responses)),
+                          fmt='%.6f,%.6f,%d,')
+
+    return path
+
+
+# -----------------------------------------------------------------------------
+# caseEnvelope
+#
+# Each case function sets up a case, in a fresh process, and returns the
+# callable that is timed.
+# -----------------------------------------------------------------------------
+def caseEnvelope(params):
+
+    return ObservationFile(params['csv'], SPECIES, useCache=False).envelope
+
+
+# -----------------------------------------------------------------------------
+# caseFormatObservations
+# -----------------------------------------------------------------------------
+def caseFormatObservations(params):
+
+    request = syntheticRequest(params)
+    request.setForce(True)
+
+    return request.formatObservations
+
+
+# -----------------------------------------------------------------------------
+# caseLoadCachedObservations
+# -----------------------------------------------------------------------------
+def caseLoadCachedObservations(params):
+
+    # The first load writes the cache.
+    ObservationFile(params['csv'], SPECIES)
+
+    return lambda: ObservationFile(params['csv'], SPECIES)
+
+
+# -----------------------------------------------------------------------------
+# caseMaxEnt
+# -----------------------------------------------------------------------------
+def caseMaxEnt(params):
+
+    request = syntheticRequest(params)
+    request.setForce(True)
+
+    return lambda: request.run(params['jar'])
+
+
+# -----------------------------------------------------------------------------
+# caseParseObservations
+# -----------------------------------------------------------------------------
+def caseParseObservations(params):
+
+    return lambda: ObservationFile(params['csv'], SPECIES, useCache=False)
+
+
+# -----------------------------------------------------------------------------
+# casePrepareImage
+# -----------------------------------------------------------------------------
+def casePrepareImage(params):
+
+    ascDir = tempfile.mkdtemp(dir=params['workDir'])
+    spatialReference = syntheticSrs()
+    image = IndexedImage(params['layer'], spatialReference.ExportToWkt())
+
+    return lambda: MaxEntRequest.prepareImage(
+        image,
+        spatialReference,
+        syntheticEnvelope(spatialReference),
+        ascDir)
+
+
+# -----------------------------------------------------------------------------
+# caseTransformObservations
+# -----------------------------------------------------------------------------
+def caseTransformObservations(params):
+
+    observations = ObservationFile(params['csv'], SPECIES, useCache=False)
+    mercator = SpatialReference()
+    mercator.ImportFromEPSG(3857)
+
+    return lambda: observations.transformTo(mercator)
+
+
+# -----------------------------------------------------------------------------
+# The cases, by name
+# -----------------------------------------------------------------------------
+CASES = {'envelope': caseEnvelope,
+         'formatObservations': caseFormatObservations,
+         'loadCachedObservations': caseLoadCachedObservations,
+         'maxent': caseMaxEnt,
+         'parseObservations': caseParseObservations,
+         'prepareImage': casePrepareImage,
+         'transformObservations': caseTransformObservations}
+
+
+# -----------------------------------------------------------------------------
+# syntheticRequest
+#
+# This is a MaxEntRequest of the case's observations and layers, writing to
+# a directory of its own.
+# -----------------------------------------------------------------------------
+def syntheticRequest(params):
+
+    outDir = tempfile.mkdtemp(dir=params['workDir'])
+    images = [IndexedImage(path, syntheticSrs().ExportToWkt())
+              for path in params['layers']]
+
+    return MaxEntRequest(ObservationFile(params['csv'], SPECIES),
+                         images,
+                         outDir)
+
+
+# -----------------------------------------------------------------------------
+# measure
+#
+# This runs in a fresh process.  It sets up a case, then times it with a
+# RunTrace, whose nested stages break the time down.
+# -----------------------------------------------------------------------------
+def measure(case, params):
+
+    timed = CASES[case](params)
+    trace = RunTrace.start()
+
+    with RunTrace.stage(case):
+        timed()
+
+    RunTrace.stop()
+
+    events = trace.events()
+    result = dict(events[-1]['args'])
+    stages = {}
+
+    for event in events[:-1]:
+
+        stages[event['name']] = stages.get(event['name'], 0.0) + \
+            event['args']['wallSeconds']
+
+    result['stages'] = stages
+
+    return result
+
+
+# -----------------------------------------------------------------------------
+# runCase
+#
+# This measures a case numRuns times, each in a new process, so no run
+# inherits another's caches or peak memory, and keeps the fastest run.
+# -----------------------------------------------------------------------------
+def runCase(label, case, params, numRuns, units):
+
+    context = multiprocessing.get_context('spawn')
+    runs = []
+
+    for run in range(numRuns):
+
+        with concurrent.futures.ProcessPoolExecutor(
+                1, mp_context=context) as pool:
+
+            runs.append(pool.submit(measure, case, params).result())
+
+    best = min(runs, key=lambda run: run['wallSeconds'])
+    wallTimes = sorted(run['wallSeconds'] for run in runs)
+
+    result = {'label': label,
+              'case': case,
+              'params': {key: value for key, value in params.items()
+                         if key not in ('csv', 'jar', 'layer', 'layers',
+                                        'workDir')},
+              'runs': numRuns,
+              'medianWallSeconds': wallTimes[len(wallTimes) // 2]}
+
+    result.update(best)
+
+    if units:
+
+        result['throughput'] = units / max(best['wallSeconds'], 1e-9)
+
+    print(label + ': ' + '%.3f' % best['wallSeconds'] + ' s, peak ' +
+          '%.0f' % best['peakRssMb'] + ' MB')
+
+    return result
+
+
+# -----------------------------------------------------------------------------
+# compare
+#
+# This prints each case whose best time or peak memory grew by more than
+# tolerance since a baseline, and returns the number of regressions.
+# -----------------------------------------------------------------------------
+def compare(results, baselinePath, tolerance):
+
+    with open(baselinePath) as baselineFile:
+
+        baseline = {result['label']: result
+                    for result in json.load(baselineFile)['results']}
+
+    numRegressions = 0
+
+    for result in results:
+
+        old = baseline.get(result['label'])
+
+        if not old or 'wallSeconds' not in old or \
+           'wallSeconds' not in result:
+
+            continue
+
+        for key in ('wallSeconds', 'peakRssMb'):
+
+            ratio = result[key] / max(old[key], 1e-9)
+
+            if ratio > 1 + tolerance:
+
+                numRegressions += 1
+
+                print('Regression: ' + result['label'] + ' ' + key + ' ' +
+                      '%.3f' % old[key] + ' -> ' + '%.3f' % result[key])
+
+    print(str(numRegressions) + ' regressions against ' + baselinePath)
+
+    return numRegressions
+
+
+# -----------------------------------------------------------------------------
+# environment
+# -----------------------------------------------------------------------------
+def environment():
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.realpath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'version': VERSION,
+            'commit': commit,
+            'date': datetime.datetime.now().isoformat(),
+            'host': socket.gethostname(),
+            'cpus': multiprocessing.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'gdal': gdal.__version__}
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# python -m maxent.model.benchmarks.benchmark_suite -o bench.json
+# python -m maxent.model.benchmarks.benchmark_suite -o new.json \
+#     --max-rows 10000000 --baseline bench.json
+# -----------------------------------------------------------------------------
+def main():
+
+    desc = 'This times observation parsing, samples formatting, layer ' + \
+           'preparation and a small maxent.jar run on synthetic data, ' + \
+           'and saves the results as JSON.'
+
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('--baseline',
+                        help='Results of an earlier run to compare with')
+
+    parser.add_argument('--data',
+                        help='Directory to keep the synthetic data in, ' +
+                             'instead of a temporary one')
+
+    parser.add_argument('--formats',
+                        default=['GTiff', 'netCDF'],
+                        nargs='+',
+                        help='GDAL drivers of the synthetic layers')
+
+    parser.add_argument('-j',
+                        default=MaxEntRequest.MAX_ENT_JAR,
+                        help='Path to maxent.jar')
+
+    parser.add_argument('--layer-sizes',
+                        default=[512, 2048],
+                        nargs='+',
+                        type=int,
+                        help='Rows and columns of the synthetic layers')
+
+    parser.add_argument('--max-rows',
+                        default=10 ** 6,
+                        type=int,
+                        help='Largest observation file, from 10^3 rows ' +
+                             'in powers of ten')
+
+    parser.add_argument('-n',
+                        default=3,
+                        type=int,
+                        help='Number of timed runs of each case')
+
+    parser.add_argument('-o',
+                        default='benchmark.json',
+                        help='Path to the JSON results')
+
+    parser.add_argument('--tolerance',
+                        default=0.1,
+                        type=float,
+                        help='Fractional growth in time or memory that ' +
+                             'counts as a regression')
+
+    args = parser.parse_args()
+
+    dataDir = args.data or tempfile.mkdtemp()
+    workDir = tempfile.mkdtemp()
+
+    if not os.path.exists(dataDir):
+        os.makedirs(dataDir)
+
+    results = []
+
+    try:
+        # Observations
+        numRows = 1000
+
+        while numRows <= args.max_rows:
+
+            csvPath = os.path.join(dataDir,
+                                   'observations_' + str(numRows) + '.csv')
+
+            if not os.path.exists(csvPath):
+                writeObservations(csvPath, numRows)
+
+            smallLayer = os.path.join(dataDir, 'layer_GTiff_64.tif')
+
+            if not os.path.exists(smallLayer):
+                writeLayer(smallLayer, 'GTiff', 64)
+
+            params = {'csv': csvPath,
+                      'layers': [smallLayer],
+                      'rows': numRows,
+                      'workDir': workDir}
+
+            for case in ('parseObservations',
+                         'loadCachedObservations',
+                         'transformObservations',
+                         'envelope',
+                         'formatObservations'):
+
+                results.append(runCase(case + ' rows=' + str(numRows),
+                                       case,
+                                       params,
+                                       args.n,
+                                       numRows))
+
+            numRows *= 10
+
+        # Layers
+        for driverName in args.formats:
+
+            if gdal.GetDriverByName(driverName) is None:
+
+                print('Skipping ' + driverName + ': no GDAL driver')
+                continue
+
+            extension = '.nc' if driverName == 'netCDF' else '.tif'
+
+            for size in args.layer_sizes:
+
+                layerPath = os.path.join(dataDir,
+                                         'layer_' + driverName + '_' +
+                                         str(size) + extension)
+
+                if not os.path.exists(layerPath):
+                    writeLayer(layerPath, driverName, size)
+
+                params = {'layer': layerPath,
+                          'format': driverName,
+                          'size': size,
+                          'workDir': workDir}
+
+                results.append(runCase('prepareImage format=' + driverName +
+                                       ' size=' + str(size),
+                                       'prepareImage',
+                                       params,
+                                       args.n,
+                                       size * size))
+
+        # A small end-to-end run
+        label = 'maxent rows=1000 layers=3 size=256'
+
+        if not shutil.which('java') or not os.path.exists(args.j):
+
+            print('Skipping ' + label + ': no java or maxent.jar')
+            results.append({'label': label, 'skipped': True})
+
+        else:
+
+            csvPath = os.path.join(dataDir, 'observations_1000.csv')
+
+            if not os.path.exists(csvPath):
+                writeObservations(csvPath, 1000)
+
+            layers = []
+
+            for i in range(3):
+
+                layerPath = os.path.join(dataDir,
+                                         'maxent_layer' + str(i) + '.tif')
+
+                if not os.path.exists(layerPath):
+                    writeLayer(layerPath, 'GTiff', 256, SEED + i)
+
+                layers.append(layerPath)
+
+            params = {'csv': csvPath,
+                      'layers': layers,
+                      'jar': args.j,
+                      'rows': 1000,
+                      'workDir': workDir}
+
+            results.append(runCase(label, 'maxent', params, args.n, None))
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+        if not args.data:
+            shutil.rmtree(dataDir, ignore_errors=True)
+
+    with open(args.o, 'w') as outFile:
+
+        json.dump({'environment': environment(), 'results': results},
+                  outFile,
+                  indent=1)
+
+    print('Wrote ' + args.o)
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        return 1
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import filecmp
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.ObservationFile import ObservationFile
+
+
+# -----------------------------------------------------------------------------
+# prepareTile
+#
+# Each pool process stands in for a Celery worker running
+# MaxEntRequestCelery.prepareTile.  SpatialReferences do not pickle, so the
+# SRS is passed as its EPSG code.
+# -----------------------------------------------------------------------------
+def prepareTile(args):
+
+    imagePath, epsg, envelope, tilePath, row, numRows = args
+    srs = SpatialReference()
+    srs.ImportFromEPSG(epsg)
+
+    return LayerPreparer.prepareTile(imagePath,
+                                     srs,
+                                     envelope,
+                                     tilePath,
+                                     row,
+                                     numRows)
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# python -m maxent.model.benchmarks.benchmark_tiledPrepare -e 4326 \
+#     -f ebd_Cassins_1989.csv -s "Cassin's Sparrow" -i huge.tif -p 16 -t 1024
+# -----------------------------------------------------------------------------
+def main():
+
+    desc = 'This compares preparing one layer whole with preparing it ' + \
+           'in tiles by several processes.'
+
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('-e',
+                        required=True,
+                        type=int,
+                        help='Integer EPSG code representing the spatial ' +
+                             'reference system of the input image.')
+
+    parser.add_argument('-f',
+                        required=True,
+                        help='Path to observation file')
+
+    parser.add_argument('-i',
+                        required=True,
+                        help='Path to the image file')
+
+    parser.add_argument('-p',
+                        default=multiprocessing.cpu_count(),
+                        type=int,
+                        help='Number of processes preparing tiles')
+
+    parser.add_argument('-s',
+                        required=True,
+                        help='Name of species in observation file')
+
+    parser.add_argument('-t',
+                        default=1024,
+                        type=int,
+                        help='Rows per tile')
+
+    args = parser.parse_args()
+
+    srs = SpatialReference()
+    srs.ImportFromEPSG(args.e)
+
+    observationFile = ObservationFile(args.f, args.s)
+    observationFile.transformTo(srs)
+    envelope = observationFile.envelope()
+    outDir = tempfile.mkdtemp()
+    wholePath = os.path.join(outDir, 'whole.asc')
+    tiledPath = os.path.join(outDir, 'tiled.asc')
+
+    startTime = time.time()
+    LayerPreparer.prepare(args.i, srs, envelope, wholePath)
+    wholeTime = time.time() - startTime
+
+    startTime = time.time()
+    rows = LayerPreparer.warp(args.i, srs, envelope).RasterYSize
+    tiles = LayerPreparer.tileRanges(rows, args.t)
+
+    tileArgs = [(args.i,
+                 args.e,
+                 envelope,
+                 os.path.join(outDir, 'tile' + str(row)),
+                 row,
+                 numRows) for row, numRows in tiles]
+
+    pool = multiprocessing.Pool(args.p)
+    tilePaths = pool.map(prepareTile, tileArgs)
+    pool.close()
+    pool.join()
+
+    LayerPreparer.mosaic(args.i, srs, envelope, tilePaths, tiledPath)
+    tiledTime = time.time() - startTime
+
+    print('Rows: ' + str(rows) + ', tiles: ' + str(len(tiles)) +
+          ', processes: ' + str(args.p))
+
+    print('Whole: ' + '%.3f' % wholeTime + ' s')
+    print('Tiled: ' + '%.3f' % tiledTime + ' s')
+    print('Speedup: ' + '%.2f' % (wholeTime / tiledTime) + 'x')
+
+    print('Identical: ' +
+          str(filecmp.cmp(wholePath, tiledPath, shallow=False)))
+
+    shutil.rmtree(outDir)
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
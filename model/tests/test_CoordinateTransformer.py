@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from unittest import mock
+
+import numpy
+
+from osgeo.osr import CoordinateTransformation
+from osgeo.osr import SpatialReference
+
+from maxent.model import CoordinateTransformer as module
+from maxent.model.CoordinateTransformer import CoordinateTransformer
+
+
+# -----------------------------------------------------------------------------
+# class CoordinateTransformerTestCase
+#
+# python -m unittest model.tests.test_CoordinateTransformer
+# -----------------------------------------------------------------------------
+class CoordinateTransformerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._utm12 = self._srs(32612)
+        self._utm13 = self._srs(32613)
+
+    # -------------------------------------------------------------------------
+    # testCachedTransformation
+    # -------------------------------------------------------------------------
+    def testCachedTransformation(self):
+
+        fromSRS = self._srs(32611)
+        transformation = CoordinateTransformer.transformation(fromSRS,
+                                                              self._utm12)
+
+        # An equal SRS pair, even in new objects, reuses the transformation.
+        self.assertIs(CoordinateTransformer.transformation(self._srs(32611),
+                                                           self._srs(32612)),
+                      transformation)
+
+        self.assertIsNot(CoordinateTransformer.transformation(self._utm12,
+                                                              fromSRS),
+                         transformation)
+
+        # Each thread builds its own.
+        others = []
+
+        thread = threading.Thread(
+            target=lambda: others.append(
+                CoordinateTransformer.transformation(fromSRS, self._utm12)))
+
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(others[0], transformation)
+
+        # Transforming again with the same pair builds no transformation.
+        with mock.patch.object(module,
+                               'CoordinateTransformation',
+                               wraps=CoordinateTransformation) as build:
+
+            CoordinateTransformer.transform([1.0], [2.0], fromSRS, self._utm13)
+            CoordinateTransformer.transform([3.0], [4.0], fromSRS, self._utm13)
+
+        self.assertEqual(build.call_count, 1)
+
+    # -------------------------------------------------------------------------
+    # testChunks
+    # -------------------------------------------------------------------------
+    def testChunks(self):
+
+        xs = numpy.linspace(374187, 501598, 10)
+        ys = numpy.linspace(4202663, 4100640, 10)
+
+        # Ten points span three chunks, the last one partial.
+        with mock.patch.object(CoordinateTransformer, 'CHUNK_SIZE', 4):
+
+            newXs, newYs = CoordinateTransformer.transform(xs,
+                                                           ys,
+                                                           self._utm12,
+                                                           self._utm13)
+
+        transform = CoordinateTransformation(self._utm12, self._utm13)
+
+        expected = numpy.array([transform.TransformPoint(x, y)[:2]
+                                for x, y in zip(xs, ys)])
+
+        numpy.testing.assert_allclose(newXs, expected[:, 0])
+        numpy.testing.assert_allclose(newYs, expected[:, 1])
+
+        # The inputs are not modified.
+        numpy.testing.assert_array_equal(xs,
+                                         numpy.linspace(374187, 501598, 10))
+
+    # -------------------------------------------------------------------------
+    # testLengthMismatch
+    # -------------------------------------------------------------------------
+    def testLengthMismatch(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'same length'):
+
+            CoordinateTransformer.transform([1.0, 2.0],
+                                            [3.0],
+                                            self._utm12,
+                                            self._utm13)
+
+    # -------------------------------------------------------------------------
+    # _srs
+    # -------------------------------------------------------------------------
+    def _srs(self, epsg):
+
+        srs = SpatialReference()
+        srs.ImportFromEPSG(epsg)
+
+        return srs
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from maxent.model.ImageIndex import ImageIndex
+
+
+# -----------------------------------------------------------------------------
+# class ImageIndexTestCase
+#
+# python -m unittest model.tests.test_ImageIndex
+# -----------------------------------------------------------------------------
+class ImageIndexTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._imageDir = tempfile.mkdtemp()
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(4326)
+
+        for name in ('a.tif', 'b.tif'):
+
+            dataset = gdal.GetDriverByName('GTiff').Create(
+                os.path.join(self._imageDir, name), 4, 3, 1,
+                gdal.GDT_Float32)
+
+            dataset.SetGeoTransform((-120, 0.5, 0, 40, 0, -0.5))
+            dataset = None
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._imageDir)
+
+    # -------------------------------------------------------------------------
+    # testImages
+    # -------------------------------------------------------------------------
+    def testImages(self):
+
+        images = ImageIndex(self._imageDir, '*.tif').update().images(self._srs)
+
+        self.assertEqual([os.path.basename(image.fileName())
+                          for image in images], ['a.tif', 'b.tif'])
+
+        self.assertTrue(images[0].srs().IsSame(self._srs))
+
+        entry = ImageIndex(self._imageDir, '*.tif').entries()['a.tif']
+
+        self.assertEqual(entry['bounds'], [-120, 40, -118, 38.5])
+        self.assertEqual(entry['resolution'], [0.5, 0.5])
+
+    # -------------------------------------------------------------------------
+    # testIncrementalUpdate
+    # -------------------------------------------------------------------------
+    def testIncrementalUpdate(self):
+
+        self.assertEqual(
+            ImageIndex(self._imageDir, '*.tif').update().numOpened(), 2)
+
+        self.assertEqual(
+            ImageIndex(self._imageDir, '*.tif').update().numOpened(), 0)
+
+        path = os.path.join(self._imageDir, 'b.tif')
+        os.utime(path, (1, 1))
+        os.remove(os.path.join(self._imageDir, 'a.tif'))
+
+        index = ImageIndex(self._imageDir, '*.tif').update()
+
+        self.assertEqual(index.numOpened(), 1)
+        self.assertEqual(list(index.entries()), ['b.tif'])
+
+    # -------------------------------------------------------------------------
+    # testValidate
+    # -------------------------------------------------------------------------
+    def testValidate(self):
+
+        with open(os.path.join(self._imageDir, 'c.tif'), 'w') as badFile:
+            badFile.write('not an image')
+
+        index = ImageIndex(self._imageDir, '*.tif').update()
+
+        with self.assertRaisesRegex(RuntimeError, 'c.tif'):
+            index.validate()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from maxent.model.JvmPlanner import JvmPlanner
+
+
+# -----------------------------------------------------------------------------
+# class JvmPlannerTestCase
+#
+# python -m unittest model.tests.test_JvmPlanner
+# -----------------------------------------------------------------------------
+class JvmPlannerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._ascDir = tempfile.mkdtemp()
+        self._ascPaths = []
+
+        for name in ('a', 'b'):
+
+            path = os.path.join(self._ascDir, name + '.asc')
+
+            with open(path, 'w') as ascFile:
+
+                ascFile.write('ncols 3000\nnrows 2000\nxllcorner 0\n' +
+                              'yllcorner 0\ncellsize 1\n' +
+                              'NODATA_value -9999\n')
+
+            self._ascPaths.append(path)
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._ascDir)
+
+    # -------------------------------------------------------------------------
+    # testGridShape
+    # -------------------------------------------------------------------------
+    def testGridShape(self):
+
+        self.assertEqual(JvmPlanner.gridShape(self._ascPaths[0]),
+                         (2000, 3000))
+
+    # -------------------------------------------------------------------------
+    # testOverrides
+    # -------------------------------------------------------------------------
+    def testOverrides(self):
+
+        heapMb, threads, numJvms = \
+            JvmPlanner(heapMb=600, threads=3).plan(self._ascPaths, 100)
+
+        self.assertEqual((heapMb, threads, numJvms), (600, 3, 1))
+
+        # A heap below the estimate is used as given.
+        heapMb = JvmPlanner(heapMb=100).plan(self._ascPaths, 100)[0]
+
+        self.assertEqual(heapMb, 100)
+
+    # -------------------------------------------------------------------------
+    # testPlan
+    # -------------------------------------------------------------------------
+    def testPlan(self):
+
+        heapMb, threads, numJvms = JvmPlanner().plan(self._ascPaths, 100)
+
+        self.assertEqual(heapMb,
+                         JvmPlanner.estimateMb(6000000, 2, 10100))
+
+        self.assertGreaterEqual(threads, 1)
+
+        # Samples with data do not load the grids.
+        swdHeapMb = JvmPlanner().plan(self._ascPaths, 100,
+                                      loadGrids=False)[0]
+
+        self.assertEqual(swdHeapMb, JvmPlanner.estimateMb(0, 2, 10100))
+
+    # -------------------------------------------------------------------------
+    # testRefuse
+    # -------------------------------------------------------------------------
+    def testRefuse(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'will not fit'):
+
+            JvmPlanner(heapMb=JvmPlanner.availableMb() + 1).plan(
+                self._ascPaths, 100)
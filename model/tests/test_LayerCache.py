@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.LayerCache import LayerCache
+from maxent.model.LayerPreparer import LayerPreparer
+
+
+# -----------------------------------------------------------------------------
+# class LayerCacheTestCase
+#
+# LayerPreparer.prepare is replaced by one writing a layer of fixed size.
+#
+# python -m unittest model.tests.test_LayerCache
+# -----------------------------------------------------------------------------
+class LayerCacheTestCase(unittest.TestCase):
+
+    LAYER_BYTES = 1000
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._cacheDir = os.path.join(self._tempDir, 'cache')
+        self._ascDir = os.path.join(self._tempDir, 'asc')
+        os.mkdir(self._ascDir)
+
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+        self._envelope = Envelope()
+        self._envelope.addPoint(374000, 4203000, 0, self._srs)
+        self._envelope.addPoint(502000, 4100000, 0, self._srs)
+
+        self._images = {}
+
+        for name in ('pr', 'tas', 'uas'):
+
+            path = os.path.join(self._tempDir, name + '.nc')
+
+            with open(path, 'w') as imageFile:
+                imageFile.write(name)
+
+            self._images[name] = path
+
+        patcher = mock.patch.object(LayerPreparer,
+                                    'prepare',
+                                    side_effect=self._prepareLayer)
+
+        self._prepare = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # ascPath
+    # -------------------------------------------------------------------------
+    def ascPath(self, name):
+
+        return os.path.join(self._ascDir, name + '.asc')
+
+    # -------------------------------------------------------------------------
+    # _prepareLayer
+    # -------------------------------------------------------------------------
+    def _prepareLayer(self, imagePath, srs, envelope, ascImagePath,
+                      resolution=None):
+
+        # Long enough for concurrent callers to wait on the lock.
+        time.sleep(0.05)
+        name = os.path.splitext(os.path.basename(imagePath))[0]
+
+        with open(ascImagePath, 'w') as ascFile:
+            ascFile.write(name[0] * LayerCacheTestCase.LAYER_BYTES)
+
+        with open(os.path.splitext(ascImagePath)[0] + '.prj', 'w') as prj:
+            prj.write(srs.ExportToWkt())
+
+    # -------------------------------------------------------------------------
+    # testEvict
+    # -------------------------------------------------------------------------
+    def testEvict(self):
+
+        # Room for two entries, but not three.
+        cache = LayerCache(self._cacheDir,
+                           int(LayerCacheTestCase.LAYER_BYTES * 2.5))
+
+        keys = {}
+
+        for name in ('pr', 'tas'):
+
+            cache.prepare(self._images[name],
+                          self._srs,
+                          self._envelope,
+                          self.ascPath(name))
+
+            keys[name] = LayerCache.key(self._images[name],
+                                        self._srs,
+                                        self._envelope)
+
+        # tas was used longest ago, until a hit touches it.
+        os.utime(cache.entryDir(keys['tas']), (1, 1))
+        os.utime(cache.entryDir(keys['pr']), (2, 2))
+
+        cache.prepare(self._images['tas'],
+                      self._srs,
+                      self._envelope,
+                      self.ascPath('tas'))
+
+        self.assertGreater(os.path.getmtime(cache.entryDir(keys['tas'])), 2)
+
+        cache.prepare(self._images['uas'],
+                      self._srs,
+                      self._envelope,
+                      self.ascPath('uas'))
+
+        self.assertFalse(cache.contains(keys['pr']))
+        self.assertTrue(cache.contains(keys['tas']))
+
+        # The layer linked from the evicted entry survives.
+        with open(self.ascPath('pr')) as ascFile:
+            self.assertEqual(len(ascFile.read()),
+                             LayerCacheTestCase.LAYER_BYTES)
+
+    # -------------------------------------------------------------------------
+    # testHitsAndMisses
+    # -------------------------------------------------------------------------
+    def testHitsAndMisses(self):
+
+        cache = LayerCache(self._cacheDir)
+
+        for ascDir in (self._ascDir, self._tempDir):
+
+            ascPath = os.path.join(ascDir, 'pr.asc')
+
+            self.assertEqual(cache.prepare(self._images['pr'],
+                                           self._srs,
+                                           self._envelope,
+                                           ascPath,
+                                           1000),
+                             ascPath)
+
+            self.assertTrue(os.path.exists(os.path.join(ascDir, 'pr.prj')))
+
+        self.assertEqual(self._prepare.call_count, 1)
+        self.assertEqual((cache.hits(), cache.misses()), (1, 1))
+        self.assertIn('1 hits, 1 misses', cache.report())
+
+        # Hard links share the cached file.
+        self.assertTrue(os.path.samefile(
+            self.ascPath('pr'),
+            cache.entryPath(LayerCache.key(self._images['pr'],
+                                           self._srs,
+                                           self._envelope,
+                                           1000))))
+
+        cache.addCounts(2, 3)
+        self.assertEqual((cache.hits(), cache.misses()), (3, 4))
+
+        # A failed preparation leaves no entry.
+        self._prepare.side_effect = RuntimeError('Unable to open')
+
+        with self.assertRaisesRegex(RuntimeError, 'Unable to open'):
+
+            cache.prepare(self._images['tas'],
+                          self._srs,
+                          self._envelope,
+                          self.ascPath('tas'))
+
+        self.assertEqual(sorted(os.listdir(self._cacheDir)),
+                         sorted([LayerCache.LOCK_DIR,
+                                 LayerCache.key(self._images['pr'],
+                                                self._srs,
+                                                self._envelope,
+                                                1000)]))
+
+    # -------------------------------------------------------------------------
+    # testKey
+    # -------------------------------------------------------------------------
+    def testKey(self):
+
+        imagePath = self._images['pr']
+        key = LayerCache.key(imagePath, self._srs, self._envelope)
+
+        self.assertEqual(LayerCache.key(imagePath, self._srs, self._envelope),
+                         key)
+
+        # A link to the image is the same source.
+        linkPath = os.path.join(self._tempDir, 'link.nc')
+        os.symlink(imagePath, linkPath)
+
+        self.assertEqual(LayerCache.key(linkPath, self._srs, self._envelope),
+                         key)
+
+        otherSrs = SpatialReference()
+        otherSrs.ImportFromEPSG(4326)
+
+        otherEnvelope = Envelope()
+        otherEnvelope.addPoint(374000, 4203000, 0, self._srs)
+        otherEnvelope.addPoint(501000, 4100000, 0, self._srs)
+
+        others = [LayerCache.key(self._images['tas'],
+                                 self._srs,
+                                 self._envelope),
+                  LayerCache.key(imagePath, otherSrs, self._envelope),
+                  LayerCache.key(imagePath, self._srs, otherEnvelope),
+                  LayerCache.key(imagePath, self._srs, self._envelope, 500)]
+
+        self.assertNotIn(key, others)
+        self.assertEqual(len(set(others)), len(others))
+
+        # Rewriting the image changes its identity.
+        with open(imagePath, 'w') as imageFile:
+            imageFile.write('pr, rewritten')
+
+        self.assertNotEqual(LayerCache.key(imagePath,
+                                           self._srs,
+                                           self._envelope),
+                            key)
+
+    # -------------------------------------------------------------------------
+    # testLocking
+    # -------------------------------------------------------------------------
+    def testLocking(self):
+
+        caches = [LayerCache(self._cacheDir) for i in range(4)]
+
+        threads = [threading.Thread(target=cache.prepare,
+                                    args=(self._images['pr'],
+                                          self._srs,
+                                          self._envelope,
+                                          os.path.join(self._ascDir,
+                                                       str(i) + '.asc')))
+                   for i, cache in enumerate(caches)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        # Concurrent workers prepare the layer once.
+        self.assertEqual(self._prepare.call_count, 1)
+        self.assertEqual(sum(cache.misses() for cache in caches), 1)
+        self.assertEqual(sum(cache.hits() for cache in caches), 3)
+        self.assertEqual(len(glob.glob(os.path.join(self._ascDir, '*.asc'))),
+                         4)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.LayerPreparer import LayerPreparer
+
+
+# -----------------------------------------------------------------------------
+# class LayerPreparerTestCase
+#
+# python -m unittest model.tests.test_LayerPreparer
+# -----------------------------------------------------------------------------
+class LayerPreparerTestCase(unittest.TestCase):
+
+    CELL_SIZE = 30.0
+    COLS = 4
+    ROWS = LayerPreparer.BLOCK_ROWS + 2
+    ULX = 374000.0
+    ULY = 4203000.0
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+
+        # The envelope of the whole image, so the warp only copies cells.
+        cls = LayerPreparerTestCase
+        self._envelope = Envelope()
+        self._envelope.addPoint(cls.ULX, cls.ULY, 0, self._srs)
+
+        self._envelope.addPoint(cls.ULX + cls.COLS * cls.CELL_SIZE,
+                                cls.ULY - cls.ROWS * cls.CELL_SIZE,
+                                0,
+                                self._srs)
+
+        self._grid = numpy.arange(cls.ROWS * cls.COLS,
+                                  dtype=numpy.float32).reshape(cls.ROWS,
+                                                               cls.COLS)
+
+        # Missing cells in the last row of the first block and the first
+        # row of the second.
+        self._missing = [(LayerPreparer.BLOCK_ROWS - 1, 2),
+                         (LayerPreparer.BLOCK_ROWS, 0)]
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # checkPrepared
+    #
+    # This prepares an image and checks the ASCII grid's header and cells.
+    # -------------------------------------------------------------------------
+    def checkPrepared(self, imagePath):
+
+        cls = LayerPreparerTestCase
+        ascImagePath = os.path.join(self._tempDir, 'layer.asc')
+
+        LayerPreparer.prepare(imagePath,
+                              self._srs,
+                              self._envelope,
+                              ascImagePath,
+                              cls.CELL_SIZE)
+
+        with open(ascImagePath) as ascFile:
+            header = [ascFile.readline().split() for i in range(6)]
+
+        self.assertEqual(header[0], ['ncols', str(cls.COLS)])
+        self.assertEqual(header[1], ['nrows', str(cls.ROWS)])
+        self.assertEqual(float(header[2][1]), cls.ULX)
+
+        self.assertEqual(float(header[3][1]),
+                         cls.ULY - cls.ROWS * cls.CELL_SIZE)
+
+        self.assertEqual(float(header[4][1]), cls.CELL_SIZE)
+        self.assertEqual(header[5], ['NODATA_value', '-9999'])
+
+        expected = self._grid.copy()
+
+        for row, col in self._missing:
+            expected[row, col] = LayerPreparer.NO_DATA
+
+        numpy.testing.assert_array_equal(
+            numpy.loadtxt(ascImagePath, skiprows=6),
+            expected)
+
+        self.assertTrue(os.path.exists(os.path.join(self._tempDir,
+                                                    'layer.prj')))
+
+        # No temporary grid is left behind.
+        self.assertEqual([name for name in os.listdir(self._tempDir)
+                          if name.endswith('.tmp')],
+                         [])
+
+    # -------------------------------------------------------------------------
+    # testFixNoData
+    # -------------------------------------------------------------------------
+    def testFixNoData(self):
+
+        block = numpy.array([[1.5, numpy.nan], [-1.0, 2.0]])
+
+        fixed = LayerPreparer.fixNoData(block, -1.0)
+
+        self.assertEqual(fixed.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(fixed, [[1.5, -9999], [-9999, 2]])
+        self.assertTrue(numpy.isnan(block[0, 1]))
+
+        # Without a band no-data value, only NaNs are missing.
+        numpy.testing.assert_array_equal(LayerPreparer.fixNoData(block),
+                                         [[1.5, -9999], [-1, 2]])
+
+        numpy.testing.assert_array_equal(
+            LayerPreparer.fixNoData(block, numpy.nan),
+            [[1.5, -9999], [-1, 2]])
+
+    # -------------------------------------------------------------------------
+    # testPrepareNaN
+    # -------------------------------------------------------------------------
+    def testPrepareNaN(self):
+
+        for row, col in self._missing:
+            self._grid[row, col] = numpy.nan
+
+        self.checkPrepared(self.writeImage(self._grid))
+
+    # -------------------------------------------------------------------------
+    # testPrepareNoDataValue
+    # -------------------------------------------------------------------------
+    def testPrepareNoDataValue(self):
+
+        for row, col in self._missing:
+            self._grid[row, col] = -1
+
+        self.checkPrepared(self.writeImage(self._grid, -1))
+
+    # -------------------------------------------------------------------------
+    # testTileRanges
+    # -------------------------------------------------------------------------
+    def testTileRanges(self):
+
+        blockRows = LayerPreparer.BLOCK_ROWS
+
+        self.assertEqual(LayerPreparer.tileRanges(blockRows * 2 + 10,
+                                                  blockRows),
+                         [(0, blockRows),
+                          (blockRows, blockRows),
+                          (blockRows * 2, 10)])
+
+        # Tile sizes are rounded up to whole blocks.
+        self.assertEqual(LayerPreparer.tileRanges(blockRows + 1, 1),
+                         [(0, blockRows), (blockRows, 1)])
+
+    # -------------------------------------------------------------------------
+    # testTilesMatchWholeGrid
+    # -------------------------------------------------------------------------
+    def testTilesMatchWholeGrid(self):
+
+        rows = LayerPreparer.BLOCK_ROWS * 3 + 7
+        dataset = gdal.GetDriverByName('MEM').Create('', 5, rows, 1,
+                                                     gdal.GDT_Float32)
+
+        grid = numpy.arange(rows * 5, dtype=numpy.float32).reshape(rows, 5)
+        grid[1, 1] = numpy.nan
+        dataset.GetRasterBand(1).WriteArray(grid)
+
+        whole = io.StringIO()
+        LayerPreparer.writeAsciiRows(dataset, whole, 0, rows)
+
+        tiled = io.StringIO()
+
+        for row, numRows in LayerPreparer.tileRanges(rows, 300):
+            LayerPreparer.writeAsciiRows(dataset, tiled, row, numRows)
+
+        self.assertEqual(whole.getvalue(), tiled.getvalue())
+        self.assertIn('-9999', whole.getvalue().splitlines()[1])
+
+    # -------------------------------------------------------------------------
+    # writeImage
+    #
+    # This writes a grid as a GeoTIFF at (ULX, ULY), with an optional no-data
+    # value.
+    # -------------------------------------------------------------------------
+    def writeImage(self, grid, noData=None):
+
+        cls = LayerPreparerTestCase
+        imagePath = os.path.join(self._tempDir, 'image.tif')
+
+        dataset = gdal.GetDriverByName('GTiff').Create(imagePath,
+                                                       grid.shape[1],
+                                                       grid.shape[0],
+                                                       1,
+                                                       gdal.GDT_Float32)
+
+        dataset.SetGeoTransform((cls.ULX, cls.CELL_SIZE, 0.0,
+                                 cls.ULY, 0.0, -cls.CELL_SIZE))
+
+        dataset.SetProjection(self._srs.ExportToWkt())
+        band = dataset.GetRasterBand(1)
+
+        if noData is not None:
+            band.SetNoDataValue(noData)
+
+        band.WriteArray(grid)
+
+        # Closing the dataset writes it.
+        dataset = None
+
+        return imagePath
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.LayerStack import LayerStack
+from maxent.model.MaxEntProjector import MaxEntProjector
+from maxent.model.SwdSampler import SwdSampler
+
+
+# -----------------------------------------------------------------------------
+# class LayerStackTestCase
+#
+# python -m unittest model.tests.test_LayerStack
+# -----------------------------------------------------------------------------
+class LayerStackTestCase(unittest.TestCase):
+
+    GEO_TRANSFORM = (10.0, 0.5, 0.0, 20.0, 0.0, -0.5)
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._stackDir = os.path.join(self._tempDir, 'stack')
+
+        self._a = numpy.arange(12, dtype=numpy.float32).reshape(3, 4)
+        self._b = self._a * 2.0
+        self._b[1, 2] = LayerPreparer.NO_DATA
+
+        self._ascPaths = [self.writeLayer('b', self._b),
+                          self.writeLayer('a', self._a)]
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # testBuild
+    # -------------------------------------------------------------------------
+    def testBuild(self):
+
+        stack = LayerStack.build(self._ascPaths, self._stackDir)
+
+        self.assertEqual(stack.layerNames(), ['a', 'b'])
+        self.assertEqual((stack.rows(), stack.cols()), (3, 4))
+
+        self.assertEqual(stack.geoTransform(),
+                         LayerStackTestCase.GEO_TRANSFORM)
+
+        numpy.testing.assert_array_equal(stack.layers()[0], self._a)
+        numpy.testing.assert_array_equal(stack.layers()[1], self._b)
+        self.assertEqual(stack.mask().sum(), 11)
+        self.assertFalse(stack.mask()[1, 2])
+
+        # Reading a window maps the stack, not a copy of it.
+        window = stack.read(1, 2, ['b'])[0]
+        self.assertFalse(window.flags.owndata)
+        numpy.testing.assert_array_equal(window, self._b[1:3])
+
+        values, valid = stack.extract(numpy.array([0, 1]),
+                                      numpy.array([3, 2]))
+
+        numpy.testing.assert_array_equal(values[0], [3.0, 6.0])
+        numpy.testing.assert_array_equal(valid, [True, False])
+
+        # Building again replaces the stack.
+        self._a += 1
+        self.writeLayer('a', self._a)
+        stack = LayerStack.build(self._ascPaths, self._stackDir)
+        numpy.testing.assert_array_equal(stack.layers()[0], self._a)
+        self.assertEqual(os.listdir(self._tempDir).count('stack'), 1)
+
+    # -------------------------------------------------------------------------
+    # testMismatchedGrids
+    # -------------------------------------------------------------------------
+    def testMismatchedGrids(self):
+
+        self.writeLayer('b', self._b[:2])
+
+        with self.assertRaisesRegex(RuntimeError, 'same grid'):
+            LayerStack.build(self._ascPaths, self._stackDir)
+
+        self.assertEqual(os.listdir(self._tempDir), ['a.asc', 'b.asc'])
+
+    # -------------------------------------------------------------------------
+    # testProject
+    # -------------------------------------------------------------------------
+    def testProject(self):
+
+        lambdasFile = os.path.join(self._tempDir, 'test.lambdas')
+
+        with open(lambdasFile, 'w') as lFile:
+
+            lFile.write('a, 1.0, 0.0, 11.0\n')
+            lFile.write('b, -0.5, 0.0, 22.0\n')
+            lFile.write('linearPredictorNormalizer, 1.0\n')
+            lFile.write('densityNormalizer, 2.0\n')
+            lFile.write('entropy, 0.5\n')
+
+        LayerStack.build(self._ascPaths, self._stackDir)
+        projector = MaxEntProjector(lambdasFile)
+
+        fromAsc = projector.projectRows(
+            {'a': self._ascPaths[1], 'b': self._ascPaths[0]}, 0, 3)
+
+        fromStack = projector.projectRows(self._stackDir, 0, 3)
+
+        numpy.testing.assert_array_equal(fromStack, fromAsc)
+        self.assertEqual(fromStack[1, 2], LayerPreparer.NO_DATA)
+
+    # -------------------------------------------------------------------------
+    # testSwdSampler
+    # -------------------------------------------------------------------------
+    def testSwdSampler(self):
+
+        stack = LayerStack.build(self._ascPaths, self._stackDir)
+        rows = numpy.array([0, 1, 2])
+        cols = numpy.array([0, 2, 3])
+
+        fromAsc = SwdSampler(self._ascPaths).extract(rows, cols)
+        fromStack = SwdSampler(self._ascPaths, layerStack=stack). \
+            extract(rows, cols)
+
+        numpy.testing.assert_array_equal(fromStack[0], fromAsc[0])
+        numpy.testing.assert_array_equal(fromStack[1], fromAsc[1])
+
+    # -------------------------------------------------------------------------
+    # writeLayer
+    # -------------------------------------------------------------------------
+    def writeLayer(self, name, values):
+
+        ascPath = os.path.join(self._tempDir, name + '.asc')
+
+        with open(ascPath, 'w') as ascFile:
+
+            LayerPreparer.writeAsciiHeader(ascFile,
+                                           values.shape[1],
+                                           values.shape[0],
+                                           LayerStackTestCase.GEO_TRANSFORM)
+
+            LayerPreparer.writeAsciiBlock(ascFile, values)
+
+        return ascPath
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.MaxEntBatchRequest import MaxEntBatchRequest
+from maxent.model.MaxEntRequest import MaxEntRequest
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntBatchRequestTestCase
+#
+# python -m unittest model.tests.test_MaxEntBatchRequest
+# -----------------------------------------------------------------------------
+class MaxEntBatchRequestTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._outDir = os.path.join(self._tempDir, 'out')
+        os.mkdir(self._outDir)
+
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+
+        self._obsFile = os.path.join(self._tempDir, 'observations.csv')
+
+        with open(self._obsFile, 'w') as csvFile:
+
+            fields = ['x', 'y', 'pres/abs', 'epsg:32612', 'species']
+            writer = csv.writer(csvFile)
+            writer.writerow(fields)
+            writer.writerow((374187, 4124593, 1, '', 'Cheat Grass'))
+            writer.writerow((393543, 4100640, 0, '', 'Cheat Grass'))
+            writer.writerow((395099, 4130094, 1, '', 'Cheat'))
+            writer.writerow((486130, 4202663, 1, '', 'Cheat Grass'))
+            writer.writerow((501598, 4142175, 1, '', "Cassin's Sparrow"))
+
+        self._images = []
+
+        for name in ('pr.nc', 'tas.nc'):
+
+            path = os.path.join(self._tempDir, name)
+
+            with open(path, 'w') as imageFile:
+                imageFile.write(name)
+
+            self._images.append(IndexedImage(path, self._srs.ExportToWkt()))
+
+        self._jarFile = os.path.join(self._tempDir, 'maxent.jar')
+
+        with open(self._jarFile, 'w') as jarFile:
+            jarFile.write('jar')
+
+        ascDir = os.path.join(self._outDir, 'asc')
+        os.mkdir(ascDir)
+
+        with open(os.path.join(ascDir, 'pr.asc'), 'w') as ascFile:
+            ascFile.write('layer')
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # readSamples
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def readSamples(path):
+
+        with open(path) as csvFile:
+            return list(csv.reader(csvFile))[1:]
+
+    # -------------------------------------------------------------------------
+    # runMaxEnt
+    #
+    # This stands in for maxent.jar, writing the results file and a .lambdas
+    # file for each species in the command's samples file.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def runMaxEnt(cmd, logger, raiseException):
+
+        samplesFile = cmd.split('-s "')[1].split('"')[0]
+        outputDir = cmd.split('-o "')[1].split('"')[0]
+
+        open(os.path.join(outputDir, MaxEntRequest.RESULTS_FILE),
+             'w').close()
+
+        for name in set(row[0] for row in
+                        MaxEntBatchRequestTestCase.readSamples(samplesFile)):
+
+            open(os.path.join(outputDir, name + '.lambdas'), 'w').close()
+
+    # -------------------------------------------------------------------------
+    # runMaxEntJar
+    #
+    # This runs runMaxEntJar on a request with numJvms, and returns the number
+    # of maxent.jar invocations.
+    # -------------------------------------------------------------------------
+    def runMaxEntJar(self, numJvms):
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     numJvms=numJvms)
+
+        request.setJvmPlanner(mock.Mock(**{'plan.return_value': (512, 1, 1)}))
+        request.formatObservations()
+
+        with mock.patch('maxent.model.MaxEntBatchRequest.SystemCommand',
+                        side_effect=MaxEntBatchRequestTestCase.runMaxEnt) \
+                as systemCommand:
+
+            request.runMaxEntJar(self._jarFile)
+
+        return systemCommand.call_count
+
+    # -------------------------------------------------------------------------
+    # testFormatObservations
+    # -------------------------------------------------------------------------
+    def testFormatObservations(self):
+
+        MaxEntBatchRequest(self._obsFile,
+                           self._images,
+                           self._outDir).formatObservations()
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir)
+
+        # An unchanged split is read back, not redone.
+        with mock.patch.object(MaxEntBatchRequest,
+                               '_splitObservations') as split:
+
+            request.formatObservations()
+            split.assert_not_called()
+
+        self.assertEqual(request.species(),
+                         ["Cassin's_Sparrow", 'Cheat', 'Cheat_Grass'])
+
+        self.assertEqual(request.numPresences('Cheat_Grass'), 2)
+        self.assertEqual(request.envelope().ulx(), 374187)
+
+        # Another number of JVMs needs the per-species files.
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     numJvms=2)
+
+        request.formatObservations()
+        self.assertTrue(os.path.exists(request.speciesSamplesFile('Cheat')))
+
+        request.setForce(True)
+
+        with mock.patch.object(MaxEntBatchRequest,
+                               '_splitObservations',
+                               wraps=request._splitObservations) as split:
+
+            request.formatObservations()
+            split.assert_called_once_with()
+
+    # -------------------------------------------------------------------------
+    # testLayerRequest
+    # -------------------------------------------------------------------------
+    def testLayerRequest(self):
+
+        layerRequest = MaxEntRequest(None, self._images, self._outDir)
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     layerRequest=layerRequest)
+
+        request.setResolution(1000)
+
+        with mock.patch.object(layerRequest,
+                               'prepareImages',
+                               return_value=[]) as prepare:
+
+            request.prepareLayers()
+
+        prepare.assert_called_once_with()
+        self.assertIs(layerRequest.targetGrid(), request.targetGrid())
+        self.assertIs(layerRequest.manifest(), request._manifest)
+
+    # -------------------------------------------------------------------------
+    # testMissingSpecies
+    # -------------------------------------------------------------------------
+    def testMissingSpecies(self):
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     ['Cheat Grass', 'Snow Leopard'])
+
+        with self.assertRaisesRegex(RuntimeError, 'for Snow Leopard in'):
+            request.formatObservations()
+
+    # -------------------------------------------------------------------------
+    # testMoveSpeciesOutputs
+    # -------------------------------------------------------------------------
+    def testMoveSpeciesOutputs(self):
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     ['Cheat', 'Cheat Grass'])
+
+        # Cheat's outputs match Cheat_Grass's prefix, and the reverse not.
+        outputs = {'Cheat': ['Cheat.asc', 'Cheat.html', 'Cheat_omission.csv'],
+                   'Cheat_Grass': ['Cheat_Grass.asc',
+                                   'Cheat_Grass_omission.csv']}
+
+        os.mkdir(os.path.join(self._outDir, 'plots'))
+
+        for name, fileNames in outputs.items():
+
+            for fileName in fileNames + [os.path.join('plots',
+                                                      name + '_roc.png')]:
+
+                open(os.path.join(self._outDir, fileName), 'w').close()
+
+        request._moveSpeciesOutputs()
+
+        for name, fileNames in outputs.items():
+
+            speciesDir = request.speciesDirectory(name)
+            self.assertEqual(sorted(os.listdir(speciesDir)),
+                             sorted(fileNames + ['plots']))
+
+            self.assertEqual(os.listdir(os.path.join(speciesDir, 'plots')),
+                             [name + '_roc.png'])
+
+        self.assertEqual(os.listdir(os.path.join(self._outDir, 'plots')), [])
+
+    # -------------------------------------------------------------------------
+    # testPrepareLayers
+    # -------------------------------------------------------------------------
+    def testPrepareLayers(self):
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir)
+
+        request.setResolution(1000)
+
+        def prepareImage(image, srs, envelope, ascDir, layerCache,
+                         resolution):
+
+            ascPath = MaxEntRequest.ascImagePath(image.fileName(), ascDir)
+
+            if not os.path.exists(ascPath):
+
+                with open(ascPath, 'w') as ascFile:
+                    ascFile.write(str(resolution))
+
+            return ascPath
+
+        with mock.patch.object(MaxEntRequest,
+                               'prepareImage',
+                               side_effect=prepareImage) as prepare:
+
+            ascPaths = request.prepareLayers()
+            self.assertEqual(prepare.call_count, 2)
+
+            # Unchanged images and grid reuse the layers.
+            self.assertEqual(request.prepareLayers(), ascPaths)
+            self.assertEqual(prepare.call_count, 2)
+
+            # Another grid prepares them again, replacing the old ones.
+            request.setResolution(500)
+            request.prepareLayers()
+            self.assertEqual(prepare.call_count, 4)
+
+            with open(ascPaths[0]) as ascFile:
+                self.assertEqual(ascFile.read(), '500')
+
+    # -------------------------------------------------------------------------
+    # testRunMaxEntJar
+    # -------------------------------------------------------------------------
+    def testRunMaxEntJar(self):
+
+        self.assertEqual(self.runMaxEntJar(1), 1)
+
+        self.assertTrue(os.path.exists(os.path.join(self._outDir,
+                                                    'Cheat',
+                                                    'Cheat.lambdas')))
+
+        # Unchanged inputs reuse the outputs.
+        self.assertEqual(self.runMaxEntJar(1), 0)
+
+        # Another jar runs it again.
+        with open(self._jarFile, 'w') as jarFile:
+            jarFile.write('another jar')
+
+        self.assertEqual(self.runMaxEntJar(1), 1)
+
+    # -------------------------------------------------------------------------
+    # testRunMaxEntJarPerSpecies
+    # -------------------------------------------------------------------------
+    def testRunMaxEntJarPerSpecies(self):
+
+        self.assertEqual(self.runMaxEntJar(2), 3)
+        self.assertEqual(self.runMaxEntJar(2), 0)
+
+        # Only the species whose samples changed runs again.
+        with open(self._obsFile, 'a') as csvFile:
+            csv.writer(csvFile).writerow((395100, 4130094, 1, '', 'Cheat'))
+
+        self.assertEqual(self.runMaxEntJar(2), 1)
+
+    # -------------------------------------------------------------------------
+    # testSplitObservations
+    # -------------------------------------------------------------------------
+    def testSplitObservations(self):
+
+        request = MaxEntBatchRequest(self._obsFile,
+                                     self._images,
+                                     self._outDir,
+                                     numJvms=2)
+
+        self.assertEqual(request.species(),
+                         ["Cassin's_Sparrow", 'Cheat', 'Cheat_Grass'])
+
+        self.assertEqual(request.numPresences('Cheat_Grass'), 2)
+        self.assertEqual(request.numPresences('Cheat'), 1)
+
+        samples = MaxEntBatchRequestTestCase.readSamples(
+            os.path.join(self._outDir, MaxEntBatchRequest.SAMPLES_FILE))
+
+        self.assertEqual(len(samples), 4)
+        self.assertNotIn(['Cheat_Grass', '393543.0', '4100640.0'], samples)
+
+        self.assertEqual(MaxEntBatchRequestTestCase.readSamples(
+                             request.speciesSamplesFile('Cheat')),
+                         [['Cheat', '395099.0', '4130094.0']])
+
+        self.assertEqual(len(MaxEntBatchRequestTestCase.readSamples(
+                             request.speciesSamplesFile('Cheat_Grass'))), 2)
+
+        envelope = request.envelope()
+
+        self.assertEqual([envelope.ulx(), envelope.uly(),
+                          envelope.lrx(), envelope.lry()],
+                         [374187, 4202663, 501598, 4124593])
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+
+from osgeo import gdal
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.MaxEntProjector import MaxEntProjector
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntProjectorTestCase
+#
+# python -m unittest model.tests.test_MaxEntProjector
+# -----------------------------------------------------------------------------
+class MaxEntProjectorTestCase(unittest.TestCase):
+
+    _testLambdasFile = None
+
+    # -------------------------------------------------------------------------
+    # setUpClass
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+
+        MaxEntProjectorTestCase._testLambdasFile = \
+            tempfile.mkstemp(suffix='.lambdas')[1]
+
+        with open(MaxEntProjectorTestCase._testLambdasFile, 'w') as lFile:
+
+            lFile.write('a, 2.0, 0.0, 10.0\n')
+            lFile.write('b, 0.0, 0.0, 4.0\n')
+            lFile.write('b^2, -1.0, 0.0, 4.0\n')
+            lFile.write('a*b, 0.5, 0.0, 20.0\n')
+            lFile.write('(3.0<a), 0.25, 0.0, 1.0\n')
+            lFile.write("'a, 1.0, 5.0, 10.0\n")
+            lFile.write('`b, 0.4, 0.0, 1.5\n')
+            lFile.write('linearPredictorNormalizer, 1.0\n')
+            lFile.write('densityNormalizer, 2.0\n')
+            lFile.write('numBackgroundPoints, 10000\n')
+            lFile.write('entropy, 0.5\n')
+
+    # -------------------------------------------------------------------------
+    # tearDownClass
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tearDownClass(cls):
+
+        os.remove(MaxEntProjectorTestCase._testLambdasFile)
+
+    # -------------------------------------------------------------------------
+    # expectedRaw
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def expectedRaw(linearPredictor):
+
+        return math.exp(linearPredictor - 1.0) / 2.0
+
+    # -------------------------------------------------------------------------
+    # testClamp
+    # -------------------------------------------------------------------------
+    def testClamp(self):
+
+        projector = MaxEntProjector(MaxEntProjectorTestCase._testLambdasFile)
+
+        raw = projector.predict({'a': [20.0], 'b': [1.0]},
+                                MaxEntProjector.RAW)
+
+        # linear 2.0, quadratic -0.25, product 0.5, threshold 0.25,
+        # hinge 1.0, reverse hinge 0.4 * (0.5 / 1.5)
+        lp = 2.0 - 0.25 + 0.5 + 0.25 + 1.0 + 0.4 / 3.0
+
+        self.assertAlmostEqual(raw[0], self.expectedRaw(lp), places=12)
+
+    # -------------------------------------------------------------------------
+    # testInvalidFile
+    # -------------------------------------------------------------------------
+    def testInvalidFile(self):
+
+        invalidFile = tempfile.mkstemp(suffix='.lambdas')[1]
+
+        with open(invalidFile, 'w') as lFile:
+            lFile.write('a, 2.0, 0.0, 10.0\n')
+
+        with self.assertRaisesRegex(RuntimeError, 'has no'):
+            MaxEntProjector(invalidFile)
+
+        os.remove(invalidFile)
+
+    # -------------------------------------------------------------------------
+    # testParseFeature
+    # -------------------------------------------------------------------------
+    def testParseFeature(self):
+
+        self.assertEqual(MaxEntProjector.parseFeature('a'),
+                         (MaxEntProjector.LINEAR, ('a',), None))
+
+        self.assertEqual(MaxEntProjector.parseFeature('a^2'),
+                         (MaxEntProjector.QUADRATIC, ('a',), None))
+
+        self.assertEqual(MaxEntProjector.parseFeature('a*b'),
+                         (MaxEntProjector.PRODUCT, ('a', 'b'), None))
+
+        self.assertEqual(MaxEntProjector.parseFeature('(3.5<a)'),
+                         (MaxEntProjector.THRESHOLD, ('a',), 3.5))
+
+        self.assertEqual(MaxEntProjector.parseFeature('(a=2)'),
+                         (MaxEntProjector.CATEGORICAL, ('a',), 2.0))
+
+        self.assertEqual(MaxEntProjector.parseFeature("'a"),
+                         (MaxEntProjector.HINGE, ('a',), None))
+
+        self.assertEqual(MaxEntProjector.parseFeature('`a'),
+                         (MaxEntProjector.REVERSE_HINGE, ('a',), None))
+
+    # -------------------------------------------------------------------------
+    # testPredict
+    # -------------------------------------------------------------------------
+    def testPredict(self):
+
+        projector = MaxEntProjector(MaxEntProjectorTestCase._testLambdasFile)
+
+        # The zero-lambda feature on b is dropped.
+        self.assertEqual(len(projector.features()), 6)
+        self.assertEqual(projector.variables(), ['a', 'b'])
+
+        variables = {'a': [6.0, 2.0], 'b': [1.0, 2.0]}
+
+        # linear 1.2, quadratic -0.25, product 0.15, threshold 0.25,
+        # hinge 0.2, reverse hinge 0.4 * (0.5 / 1.5)
+        lp0 = 1.2 - 0.25 + 0.15 + 0.25 + 0.2 + 0.4 / 3.0
+
+        # linear 0.4, quadratic -1.0, product 0.1
+        lp1 = 0.4 - 1.0 + 0.1
+
+        raw = projector.predict(variables, MaxEntProjector.RAW)
+        self.assertAlmostEqual(raw[0], self.expectedRaw(lp0), places=12)
+        self.assertAlmostEqual(raw[1], self.expectedRaw(lp1), places=12)
+
+        scaled = self.expectedRaw(lp0) * math.exp(0.5)
+
+        cloglog = projector.predict(variables, MaxEntProjector.CLOGLOG)
+        self.assertAlmostEqual(cloglog[0], 1 - math.exp(-scaled), places=12)
+
+        logistic = projector.predict(variables, MaxEntProjector.LOGISTIC)
+        self.assertAlmostEqual(logistic[0], scaled / (1 + scaled), places=12)
+
+    # -------------------------------------------------------------------------
+    # testProject
+    # -------------------------------------------------------------------------
+    def testProject(self):
+
+        tempDir = tempfile.mkdtemp()
+        values = numpy.arange(12, dtype=numpy.float32).reshape(4, 3) / 4.0
+        layers = {}
+
+        for name in ('a', 'b'):
+
+            layers[name] = os.path.join(tempDir, name + '.asc')
+
+            with open(layers[name], 'w') as ascFile:
+
+                LayerPreparer.writeAsciiHeader(ascFile,
+                                               3,
+                                               4,
+                                               (0.0, 1.0, 0.0, 4.0, 0.0, -1.0))
+
+                LayerPreparer.writeAsciiBlock(ascFile, values)
+
+        projector = MaxEntProjector(MaxEntProjectorTestCase._testLambdasFile)
+        outputPath = os.path.join(tempDir, 'output.asc')
+
+        try:
+            with mock.patch.object(gdal, 'Open', wraps=gdal.Open) as opened:
+
+                projector.project(tempDir, outputPath, blockRows=1)
+
+                # The first layer's size, then each layer once, not once
+                # per block.
+                self.assertEqual(opened.call_count, 3)
+
+            expected = projector.predict({'a': values, 'b': values})
+            output = numpy.loadtxt(outputPath, skiprows=6)
+
+            numpy.testing.assert_allclose(output, expected, rtol=1e-6)
+
+        finally:
+            shutil.rmtree(tempDir)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.LayerCache import LayerCache
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.MaxEntRequestParallel import MaxEntRequestParallel
+from maxent.model.MaxEntRequestParallel import prepareImageInProcess
+from maxent.model.ObservationFile import ObservationFile
+
+
+# -----------------------------------------------------------------------------
+# prepareLayer
+#
+# This replaces LayerPreparer.prepare, writing the image's name as the
+# layer, or failing for an image named bad.
+# -----------------------------------------------------------------------------
+def prepareLayer(imagePath, srs, envelope, ascImagePath, resolution=None):
+
+    name = os.path.splitext(os.path.basename(imagePath))[0]
+
+    if name == 'bad':
+        raise RuntimeError('Unable to open ' + imagePath)
+
+    with open(ascImagePath, 'w') as ascFile:
+        ascFile.write(name + ' ' + str(resolution))
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntRequestParallelTestCase
+#
+# The pool's workers are forked, so they inherit the patched LayerPreparer.
+#
+# python -m unittest model.tests.test_MaxEntRequestParallel
+# -----------------------------------------------------------------------------
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                     'Workers must inherit the patched LayerPreparer.')
+class MaxEntRequestParallelTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._outDir = os.path.join(self._tempDir, 'out')
+        os.mkdir(self._outDir)
+
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+
+        obsPath = os.path.join(self._tempDir, 'observations.csv')
+
+        with open(obsPath, 'w') as csvFile:
+
+            writer = csv.writer(csvFile)
+            writer.writerow(['x', 'y', 'pres/abs', 'epsg:32612'])
+            writer.writerow((374187, 4124593, 1))
+            writer.writerow((486130, 4202663, 1))
+            writer.writerow((501598, 4142175, 0))
+
+        self._observationFile = ObservationFile(obsPath, 'Cheat Grass')
+        self._cache = LayerCache(os.path.join(self._tempDir, 'cache'))
+
+        patcher = mock.patch.object(LayerPreparer,
+                                    'prepare',
+                                    side_effect=prepareLayer)
+
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # request
+    # -------------------------------------------------------------------------
+    def request(self, names, layerCache=None):
+
+        images = []
+
+        for name in names:
+
+            path = os.path.join(self._tempDir, name + '.nc')
+
+            with open(path, 'w') as imageFile:
+                imageFile.write(name)
+
+            images.append(IndexedImage(path, self._srs.ExportToWkt()))
+
+        request = MaxEntRequestParallel(self._observationFile,
+                                        images,
+                                        self._outDir,
+                                        layerCache,
+                                        2)
+
+        request.setResolution(1000)
+
+        return request
+
+    # -------------------------------------------------------------------------
+    # testFailure
+    # -------------------------------------------------------------------------
+    def testFailure(self):
+
+        request = self.request(['pr', 'bad', 'tas'])
+
+        with self.assertRaisesRegex(RuntimeError, 'Unable to open .*bad.nc'):
+            request.prepareImages()
+
+    # -------------------------------------------------------------------------
+    # testPrepareImageInProcess
+    # -------------------------------------------------------------------------
+    def testPrepareImageInProcess(self):
+
+        request = self.request(['pr'])
+        ascDir = os.path.join(self._outDir, 'asc')
+
+        ascPath, hits, misses = prepareImageInProcess(
+            request._images[0],
+            self._srs.ExportToWkt(),
+            request.targetGrid().envelope(),
+            ascDir,
+            self._cache,
+            1000)
+
+        self.assertEqual(ascPath, os.path.join(ascDir, 'pr.asc'))
+        self.assertEqual((hits, misses), (0, 1))
+
+        self.assertEqual(prepareImageInProcess(request._images[0],
+                                               self._srs.ExportToWkt(),
+                                               request.targetGrid().envelope(),
+                                               ascDir,
+                                               self._cache,
+                                               1000)[1:],
+                         (1, 0))
+
+    # -------------------------------------------------------------------------
+    # testPrepareImages
+    # -------------------------------------------------------------------------
+    def testPrepareImages(self):
+
+        names = ['pr', 'tas', 'uas', 'vas', 'ps']
+        request = self.request(names, self._cache)
+
+        ascPaths = request.prepareImages()
+
+        # Layers come back in image order, whichever worker finished first.
+        self.assertEqual(ascPaths,
+                         [os.path.join(self._outDir, 'asc', name + '.asc')
+                          for name in names])
+
+        for name, ascPath in zip(names, ascPaths):
+
+            with open(ascPath) as ascFile:
+                self.assertEqual(ascFile.read(), name + ' 1000')
+
+        # The workers' cache counts are added to the request's cache.
+        self.assertEqual((self._cache.hits(), self._cache.misses()), (0, 5))
+
+        request.prepareImages()
+        self.assertEqual((self._cache.hits(), self._cache.misses()), (5, 5))
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from maxent.model.MaxEntService import MaxEntService
+
+
+# -----------------------------------------------------------------------------
+# class GatedRequest
+#
+# This runs no MaxEnt.  Training waits for the gate, and fails when the
+# species is 'fail'.
+# -----------------------------------------------------------------------------
+class GatedRequest(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, species, gate):
+
+        self._species = species
+        self._gate = gate
+
+    # -------------------------------------------------------------------------
+    # finish
+    # -------------------------------------------------------------------------
+    def finish(self):
+
+        pass
+
+    # -------------------------------------------------------------------------
+    # prepare
+    # -------------------------------------------------------------------------
+    def prepare(self, jarFile):
+
+        pass
+
+    # -------------------------------------------------------------------------
+    # setNumJvms
+    # -------------------------------------------------------------------------
+    def setNumJvms(self, numJvms):
+
+        pass
+
+    # -------------------------------------------------------------------------
+    # train
+    # -------------------------------------------------------------------------
+    def train(self, jarFile):
+
+        self._gate.wait()
+
+        if self._species == 'fail':
+            raise RuntimeError('Failed on purpose.')
+
+
+# -----------------------------------------------------------------------------
+# class GatedService
+#
+# This builds GatedRequests instead of MaxEntRequests.
+# -----------------------------------------------------------------------------
+class GatedService(MaxEntService):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, numWorkers, maxQueued):
+
+        super(GatedService, self).__init__(numWorkers, maxQueued)
+        self.gate = threading.Event()
+
+    # -------------------------------------------------------------------------
+    # build
+    # -------------------------------------------------------------------------
+    def build(self, params):
+
+        return GatedRequest(params['species'], self.gate)
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntServiceTestCase
+#
+# python -m unittest model.tests.test_MaxEntService
+# -----------------------------------------------------------------------------
+class MaxEntServiceTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._service = GatedService(1, 2).start()
+        host, port = self._service.listen('127.0.0.1', 0)
+        self._url = 'http://' + host + ':' + str(port)
+
+        self._thread = threading.Thread(target=self._service.serveForever)
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        self._service.gate.set()
+        self._service.stop()
+        self._thread.join()
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # call
+    #
+    # This returns the HTTP status code and JSON body of a request.
+    # -------------------------------------------------------------------------
+    def call(self, path, body=None):
+
+        data = None if body is None else json.dumps(body).encode('utf-8')
+
+        try:
+            with urllib.request.urlopen(self._url + path, data) as response:
+                return response.status, json.loads(response.read())
+
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    # -------------------------------------------------------------------------
+    # params
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def params(species):
+
+        return {'observationFile': 'obs.csv',
+                'species': species,
+                'epsg': 4326,
+                'imageDir': 'images',
+                'outputDir': species}
+
+    # -------------------------------------------------------------------------
+    # testImageListCache
+    # -------------------------------------------------------------------------
+    def testImageListCache(self):
+
+        imageDir = os.path.join(self._tempDir, 'images')
+        os.mkdir(imageDir)
+        imagePath = os.path.join(imageDir, 'a.nc')
+
+        dataset = gdal.GetDriverByName('GTiff').Create(imagePath, 4, 3, 1,
+                                                       gdal.GDT_Float32)
+
+        dataset.SetGeoTransform((-120, 0.5, 0, 40, 0, -0.5))
+        dataset = None
+
+        srs = self._service._srs(4326)
+        images = self._service._imageList(imageDir, srs)
+
+        self.assertEqual([image.fileName() for image in images],
+                         [os.path.realpath(imagePath)])
+
+        self.assertIs(self._service._imageList(imageDir, srs), images)
+
+        # A changed image rebuilds the list.
+        os.utime(imagePath, (1, 1))
+        self.assertIsNot(self._service._imageList(imageDir, srs), images)
+
+    # -------------------------------------------------------------------------
+    # testInvalid
+    # -------------------------------------------------------------------------
+    def testInvalid(self):
+
+        code, body = self.call('/requests', {'species': 'a'})
+        self.assertEqual(code, 400)
+        self.assertIn('observationFile', body['error'])
+
+        params = MaxEntServiceTestCase.params('a')
+        params['mxd'] = True
+        code, body = self.call('/requests', params)
+        self.assertEqual(code, 400)
+        self.assertIn('mxd', body['error'])
+
+        self.assertEqual(self.call('/requests/unknown')[0], 404)
+        self.assertEqual(self.call('/other')[0], 404)
+
+    # -------------------------------------------------------------------------
+    # testObservationCache
+    # -------------------------------------------------------------------------
+    def testObservationCache(self):
+
+        path = os.path.join(self._tempDir, 'obs.csv')
+
+        with open(path, 'w') as csvFile:
+
+            writer = csv.writer(csvFile)
+            writer.writerow(['x', 'y', 'pres/abs', 'epsg:32612'])
+            writer.writerow((374187, 4124593, 1))
+            writer.writerow((486130, 4202663, 1))
+
+        srs = self._service._srs(32612)
+        observationFile = self._service._observations(path, 'a', srs)
+
+        self.assertIs(self._service._observations(path, 'a', srs),
+                      observationFile)
+
+        # A changed file is parsed again.
+        os.utime(path, (1, 1))
+
+        self.assertIsNot(self._service._observations(path, 'a', srs),
+                         observationFile)
+
+    # -------------------------------------------------------------------------
+    # testQueue
+    # -------------------------------------------------------------------------
+    def testQueue(self):
+
+        # One request trains, one is prepared and waits for the JVM, and two
+        # wait in the queue, which fills it.
+        ids = []
+
+        for i, species in enumerate(('a', 'fail', 'b', 'c')):
+
+            code, body = self.call('/requests',
+                                   MaxEntServiceTestCase.params(species))
+
+            self.assertEqual(code, 202)
+            ids.append(body['id'])
+
+            while i < 2 and self._service.stats()['running'] <= i:
+                time.sleep(0.01)
+
+        code, body = self.call('/requests',
+                               MaxEntServiceTestCase.params('d'))
+
+        self.assertEqual(code, 503)
+
+        code, stats = self.call('/status')
+        self.assertEqual(stats['queueDepth'], 2)
+        self.assertEqual(stats['running'], 2)
+        self.assertNotIn('runSeconds', stats)
+
+        self.assertEqual(self.call('/requests/' + ids[2])[1]['state'],
+                         MaxEntService.QUEUED)
+
+        self._service.gate.set()
+
+        while self._service.stats()['succeeded'] + \
+                self._service.stats()['failed'] < 4:
+
+            time.sleep(0.01)
+
+        states = [self.call('/requests/' + requestId)[1]['state']
+                  for requestId in ids]
+
+        self.assertEqual(states, [MaxEntService.SUCCEEDED,
+                                  MaxEntService.FAILED,
+                                  MaxEntService.SUCCEEDED,
+                                  MaxEntService.SUCCEEDED])
+
+        self.assertEqual(self.call('/requests/' + ids[1])[1]['error'],
+                         'train: Failed on purpose.')
+
+        code, stats = self.call('/status')
+        self.assertEqual((stats['succeeded'], stats['failed']), (3, 1))
+        self.assertEqual(stats['queueDepth'], 0)
+        self.assertGreaterEqual(stats['waitSeconds']['max'], 0.0)
+        self.assertGreaterEqual(stats['runSeconds']['p95'], 0.0)
+
+    # -------------------------------------------------------------------------
+    # testSrsCache
+    # -------------------------------------------------------------------------
+    def testSrsCache(self):
+
+        srs = self._service._srs(4326)
+        expected = SpatialReference()
+        expected.ImportFromEPSG(4326)
+
+        self.assertTrue(srs.IsSame(expected))
+        self.assertIs(self._service._srs(4326), srs)
+        self.assertIsNot(self._service._srs(32612), srs)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shlex
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from maxent.model.MxeConverter import MxeConverter
+
+
+# -----------------------------------------------------------------------------
+# class MxeConverterTestCase
+#
+# density.Convert is replaced by a copy that records the grids it converts.
+#
+# python -m unittest model.tests.test_MxeConverter
+# -----------------------------------------------------------------------------
+class MxeConverterTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._dir = tempfile.mkdtemp()
+        self._ascDir = os.path.join(self._dir, 'asc')
+        self._mxeDir = os.path.join(self._dir, 'mxe')
+        os.mkdir(self._ascDir)
+        self._converted = []
+
+        self._ascPaths = [self._writeGrid(name, name)
+                          for name in ('pr.asc', 'tas.asc')]
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._dir)
+
+    # -------------------------------------------------------------------------
+    # convert
+    # -------------------------------------------------------------------------
+    def convert(self, ascPaths):
+
+        self._converted = []
+
+        with mock.patch('maxent.model.MxeConverter.SystemCommand',
+                        side_effect=self._densityConvert):
+
+            return MxeConverter.convert(ascPaths, self._mxeDir, 'maxent.jar')
+
+    # -------------------------------------------------------------------------
+    # _densityConvert
+    # -------------------------------------------------------------------------
+    def _densityConvert(self, cmd, logger, raiseException):
+
+        words = shlex.split(cmd)
+        staleDir = words[words.index('density.Convert') + 1]
+
+        for name in sorted(os.listdir(staleDir)):
+
+            self._converted.append(name)
+            mxeName = os.path.splitext(name)[0] + '.mxe'
+
+            shutil.copy(os.path.join(staleDir, name),
+                        os.path.join(self._mxeDir, mxeName))
+
+    # -------------------------------------------------------------------------
+    # testConvertOnce
+    # -------------------------------------------------------------------------
+    def testConvertOnce(self):
+
+        mxePaths = self.convert(self._ascPaths)
+
+        self.assertEqual([os.path.basename(path) for path in mxePaths],
+                         ['pr.mxe', 'tas.mxe'])
+
+        self.assertEqual(self._converted, ['pr.asc', 'tas.asc'])
+
+        self.convert(self._ascPaths)
+        self.assertEqual(self._converted, [])
+
+    # -------------------------------------------------------------------------
+    # testHardLink
+    # -------------------------------------------------------------------------
+    def testHardLink(self):
+
+        self.convert(self._ascPaths)
+
+        # Like a layer cache hit, tas.asc becomes a hard link to a grid
+        # written before its .mxe.
+        cached = self._writeGrid('cached.asc', 'cached tas')
+        os.utime(cached, (0, 0))
+        os.remove(self._ascPaths[1])
+        os.link(cached, self._ascPaths[1])
+
+        self.convert(self._ascPaths)
+
+        self.assertEqual(self._converted, ['tas.asc'])
+
+        with open(os.path.join(self._mxeDir, 'tas.mxe')) as mxeFile:
+            self.assertEqual(mxeFile.read(), 'cached tas')
+
+    # -------------------------------------------------------------------------
+    # testPruneOrphans
+    # -------------------------------------------------------------------------
+    def testPruneOrphans(self):
+
+        self.convert(self._ascPaths)
+        self.convert(self._ascPaths[:1])
+
+        self.assertEqual(self._converted, [])
+        self.assertFalse(os.path.exists(os.path.join(self._mxeDir,
+                                                     'tas.mxe')))
+
+        self.assertTrue(os.path.exists(os.path.join(self._mxeDir,
+                                                    'pr.mxe')))
+
+        # A grid added back is converted again.
+        self.convert(self._ascPaths)
+        self.assertEqual(self._converted, ['tas.asc'])
+
+    # -------------------------------------------------------------------------
+    # _writeGrid
+    # -------------------------------------------------------------------------
+    def _writeGrid(self, name, content):
+
+        path = os.path.join(self._ascDir, name)
+
+        with open(path, 'w') as ascFile:
+            ascFile.write(content)
+
+        return path
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+
+from maxent.model.ObservationCache import ObservationCache
+
+
+# -----------------------------------------------------------------------------
+# class ObservationCacheTestCase
+#
+# python -m unittest model.tests.test_ObservationCache
+# -----------------------------------------------------------------------------
+class ObservationCacheTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+        self._obsPath = os.path.join(self._tempDir, 'obs.csv')
+        self._write(self._obsPath, 'x,y\n1,2\n', 1000000000)
+
+        # Caches go to a directory of the test's own, not beside files in
+        # the shared temporary directory.
+        self._cacheDir = tempfile.mkdtemp()
+
+        patcher = mock.patch.dict(
+            os.environ,
+            {ObservationCache.CACHE_DIR_ENV: self._cacheDir})
+
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+        shutil.rmtree(self._cacheDir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    # testCacheRoot
+    # -------------------------------------------------------------------------
+    def testCacheRoot(self):
+
+        sidecar = os.path.join(os.path.realpath(self._tempDir),
+                               ObservationCache.SIDECAR_DIR)
+
+        # An empty variable leaves the cache beside the file.
+        with mock.patch.dict(os.environ, {ObservationCache.CACHE_DIR_ENV: ''}):
+
+            cache = ObservationCache(self._obsPath, 'a')
+            self.assertEqual(os.path.dirname(cache.entryDir()), sidecar)
+
+            # Neither the directory nor an existing sidecar is writable.
+            fallback = os.path.join(tempfile.gettempdir(),
+                                    'maxent_cache',
+                                    'observations')
+
+            with mock.patch.object(os, 'access', return_value=False):
+
+                cache = ObservationCache(self._obsPath, 'a')
+                self.assertEqual(os.path.dirname(cache.entryDir()), fallback)
+
+                os.mkdir(sidecar)
+                cache = ObservationCache(self._obsPath, 'a')
+                self.assertEqual(os.path.dirname(cache.entryDir()), fallback)
+
+        cache = ObservationCache(self._obsPath, 'a')
+
+        self.assertEqual(os.path.dirname(cache.entryDir()),
+                         os.path.join(self._cacheDir, 'observations'))
+
+        cacheDir = os.path.join(self._tempDir, 'shared')
+
+        with mock.patch.dict(os.environ,
+                             {ObservationCache.CACHE_DIR_ENV: cacheDir}):
+
+            cache = ObservationCache(self._obsPath, 'a')
+
+            self.assertEqual(os.path.dirname(cache.entryDir()),
+                             os.path.join(cacheDir, 'observations'))
+
+    # -------------------------------------------------------------------------
+    # testPrune
+    # -------------------------------------------------------------------------
+    def testPrune(self):
+
+        cacheDir = os.path.join(self._tempDir, 'shared')
+
+        # Another file of the same name shares the cache.
+        otherDir = os.path.join(self._tempDir, 'other')
+        os.mkdir(otherDir)
+        otherPath = os.path.join(otherDir, 'obs.csv')
+        self._write(otherPath, 'x,y\n3,4\n', 1000000000)
+
+        with mock.patch.dict(os.environ,
+                             {ObservationCache.CACHE_DIR_ENV: cacheDir}):
+
+            oldA = self._save(self._obsPath, 'a')
+            oldB = self._save(self._obsPath, 'b')
+            other = self._save(otherPath, 'a')
+
+            # An edited file replaces the entries of every species.
+            self._write(self._obsPath, 'x,y\n1,2\n5,6\n', 1000000100)
+            newA = self._save(self._obsPath, 'a')
+
+            self.assertFalse(os.path.exists(oldA.entryDir()))
+            self.assertFalse(os.path.exists(oldB.entryDir()))
+            self.assertIsNotNone(newA.load())
+            self.assertIsNotNone(other.load())
+
+    # -------------------------------------------------------------------------
+    # _save
+    # -------------------------------------------------------------------------
+    def _save(self, path, species):
+
+        cache = ObservationCache(path, species)
+        xs = numpy.array([1.0])
+        cache.save(xs, xs, numpy.array([1]), None)
+
+        self.assertTrue(os.path.isdir(cache.entryDir()))
+
+        return cache
+
+    # -------------------------------------------------------------------------
+    # _write
+    # -------------------------------------------------------------------------
+    def _write(self, path, text, mtime):
+
+        with open(path, 'w') as obsFile:
+            obsFile.write(text)
+
+        os.utime(path, (mtime, mtime))
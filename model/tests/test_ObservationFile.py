@@ -2,13 +2,18 @@
 
 import csv
 import os
+import shutil
 import tempfile
 import unittest
+from unittest import mock
+
+import numpy
 
 from osgeo.osr import SpatialReference
 
 from core.model.Envelope import Envelope
 
+from maxent.model.ObservationCache import ObservationCache
 from maxent.model.ObservationFile import ObservationFile
 
 
@@ -53,6 +58,30 @@ class ObservationFileTestCase(unittest.TestCase):
 
         os.remove(ObservationFileTestCase._testObsFile)
 
+    # -------------------------------------------------------------------------
+    # setUp
+    #
+    # Caches go to a directory of the test's own, not beside the files in the
+    # shared temporary directory.
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._cacheDir = tempfile.mkdtemp()
+
+        patcher = mock.patch.dict(
+            os.environ,
+            {ObservationCache.CACHE_DIR_ENV: self._cacheDir})
+
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._cacheDir, ignore_errors=True)
+
     # -------------------------------------------------------------------------
     # testEnvelope
     # -------------------------------------------------------------------------
@@ -90,11 +119,14 @@ class ObservationFileTestCase(unittest.TestCase):
         self.assertTrue(obs.envelope().Equals(obs2.envelope()))
         self.assertEqual(obs.numObservations(), obs2.numObservations())
 
-        for observation in obs._observations:
+        for i in range(obs.numObservations()):
 
+            observation = obs.observation(i)
             found = False
 
-            for observation2 in obs2._observations:
+            for j in range(obs2.numObservations()):
+
+                observation2 = obs2.observation(j)
 
                 if observation[0].Equals(observation2[0]) and \
                      observation[1] == observation2[1]:
@@ -114,6 +146,57 @@ class ObservationFileTestCase(unittest.TestCase):
             ObservationFile('Common/tests/test_BaseFile.py',
                             ObservationFileTestCase._species)
 
+    # -------------------------------------------------------------------------
+    # testCache
+    # -------------------------------------------------------------------------
+    def testCache(self):
+
+        cache = ObservationCache(ObservationFileTestCase._testObsFile,
+                                 ObservationFileTestCase._species)
+
+        shutil.rmtree(cache.entryDir(), ignore_errors=True)
+
+        parsed = ObservationFile(ObservationFileTestCase._testObsFile,
+                                 ObservationFileTestCase._species)
+
+        self.assertTrue(os.path.isdir(cache.entryDir()))
+
+        cached = ObservationFile(ObservationFileTestCase._testObsFile,
+                                 ObservationFileTestCase._species)
+
+        self.assertIsInstance(cached.coordinates()[0], numpy.memmap)
+        self.assertTrue(parsed.srs().IsSame(cached.srs()))
+        self.assertTrue(parsed.envelope().Equals(cached.envelope()))
+
+        self.assertEqual(list(parsed.responses()),
+                         list(cached.responses()))
+
+        uncached = ObservationFile(ObservationFileTestCase._testObsFile,
+                                   ObservationFileTestCase._species,
+                                   useCache=False)
+
+        self.assertNotIsInstance(uncached.coordinates()[0], numpy.memmap)
+
+        shutil.rmtree(cache.entryDir())
+
+    # -------------------------------------------------------------------------
+    # testCoordinates
+    # -------------------------------------------------------------------------
+    def testCoordinates(self):
+
+        obs = ObservationFile(ObservationFileTestCase._testObsFile,
+                              ObservationFileTestCase._species)
+
+        xs, ys = obs.coordinates()
+
+        self.assertEqual(xs.dtype, numpy.float64)
+        self.assertEqual(list(xs), [374187, 393543, 395099, 486130, 501598])
+
+        self.assertEqual(list(ys),
+                         [4124593, 4100640, 4130094, 4202663, 4142175])
+
+        self.assertEqual(list(obs.responses()), [1, 0, 0, 1, 0])
+
     # -------------------------------------------------------------------------
     # testInvalidFile
     # -------------------------------------------------------------------------
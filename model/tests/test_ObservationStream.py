@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import tempfile
+import unittest
+
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.ObservationFile import ObservationFile
+from maxent.model.ObservationStream import ObservationStream
+
+
+# -----------------------------------------------------------------------------
+# class ObservationStreamTestCase
+#
+# python -m unittest model.tests.test_ObservationStream
+# -----------------------------------------------------------------------------
+class ObservationStreamTestCase(unittest.TestCase):
+
+    _testObsFile = None
+
+    # -------------------------------------------------------------------------
+    # setUpClass
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+
+        ObservationStreamTestCase._testObsFile = \
+            tempfile.mkstemp(suffix='.csv')[1]
+
+        with open(ObservationStreamTestCase._testObsFile, 'w') as csvFile:
+
+            fields = ['x', 'y', 'pres/abs', 'epsg:32612', 'species']
+            writer = csv.writer(csvFile, fields)
+            writer.writerow(fields)
+            writer.writerow((374187, 4124593, 1, '', 'Cheat Grass'))
+            writer.writerow((393543, 4100640, 0, '', 'Cheat Grass'))
+            writer.writerow((395099, 4130094, 1, '', "Cassin's Sparrow"))
+            writer.writerow((486130, 4202663, 1, '', 'Cheat Grass'))
+            writer.writerow((501598, 4142175, 0, '', "Cassin's Sparrow"))
+
+    # -------------------------------------------------------------------------
+    # tearDownClass
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tearDownClass(cls):
+
+        os.remove(ObservationStreamTestCase._testObsFile)
+
+    # -------------------------------------------------------------------------
+    # testChunks
+    # -------------------------------------------------------------------------
+    def testChunks(self):
+
+        stream = ObservationStream(ObservationStreamTestCase._testObsFile,
+                                   chunkSize=2)
+
+        chunks = list(stream.chunks())
+
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(stream.numRowsRead(), 5)
+        self.assertEqual(stream.numRowsKept(), 5)
+
+    # -------------------------------------------------------------------------
+    # testEnvelopeFilter
+    # -------------------------------------------------------------------------
+    def testEnvelopeFilter(self):
+
+        srs = SpatialReference()
+        srs.ImportFromEPSG(32612)
+        env = Envelope()
+        env.addPoint(380000, 4210000, 0, srs)
+        env.addPoint(490000, 4110000, 0, srs)
+
+        stream = ObservationStream(ObservationStreamTestCase._testObsFile,
+                                   envelope=env)
+
+        xs = [x for chunk in stream for x in chunk[0]]
+
+        self.assertEqual(xs, [395099, 486130])
+
+    # -------------------------------------------------------------------------
+    # testLabeledChunks
+    # -------------------------------------------------------------------------
+    def testLabeledChunks(self):
+
+        stream = ObservationStream(ObservationStreamTestCase._testObsFile,
+                                   ['Cheat Grass', "Cassin's Sparrow"],
+                                   response=ObservationStream.PRESENCE,
+                                   chunkSize=2)
+
+        labels = [label for chunk in stream.labeledChunks()
+                  for label in chunk[0]]
+
+        self.assertEqual(labels,
+                         ['Cheat Grass', "Cassin's Sparrow", 'Cheat Grass'])
+
+    # -------------------------------------------------------------------------
+    # testObservationFileSpecies
+    # -------------------------------------------------------------------------
+    def testObservationFileSpecies(self):
+
+        obs = ObservationFile(ObservationStreamTestCase._testObsFile,
+                              "Cassin's Sparrow")
+
+        self.assertEqual(obs.numObservations(), 2)
+        self.assertEqual(list(obs.coordinates()[0]), [395099, 501598])
+
+    # -------------------------------------------------------------------------
+    # testSpeciesAndResponseFilters
+    # -------------------------------------------------------------------------
+    def testSpeciesAndResponseFilters(self):
+
+        stream = ObservationStream(ObservationStreamTestCase._testObsFile,
+                                   'Cheat Grass',
+                                   response=ObservationStream.PRESENCE,
+                                   chunkSize=2)
+
+        xs = [x for chunk in stream for x in chunk[0]]
+
+        self.assertEqual(xs, [374187, 486130])
+        self.assertEqual(stream.numRowsRead(), 5)
+        self.assertEqual(stream.numRowsKept(), 2)
+
+    # -------------------------------------------------------------------------
+    # testInvalidResponseFilter
+    # -------------------------------------------------------------------------
+    def testInvalidResponseFilter(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'Invalid response'):
+
+            ObservationStream(ObservationStreamTestCase._testObsFile,
+                              response='maybe')
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from maxent.model.PipelineScheduler import PipelineScheduler
+
+
+# -----------------------------------------------------------------------------
+# class FakeRequest
+#
+# This records when its stages run, instead of running MaxEnt.
+# -----------------------------------------------------------------------------
+class FakeRequest(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, name, log, failIn=None):
+
+        self.name = name
+        self.log = log
+        self.failIn = failIn
+        self.numJvms = None
+        self.prepared = threading.Event()
+
+    # -------------------------------------------------------------------------
+    # finish
+    # -------------------------------------------------------------------------
+    def finish(self):
+
+        self._stage(PipelineScheduler.FINISH)
+
+    # -------------------------------------------------------------------------
+    # prepare
+    # -------------------------------------------------------------------------
+    def prepare(self, jarFile):
+
+        self._stage(PipelineScheduler.PREPARE)
+        self.prepared.set()
+
+    # -------------------------------------------------------------------------
+    # setNumJvms
+    # -------------------------------------------------------------------------
+    def setNumJvms(self, numJvms):
+
+        self.numJvms = numJvms
+
+    # -------------------------------------------------------------------------
+    # _stage
+    # -------------------------------------------------------------------------
+    def _stage(self, stage):
+
+        self.log.append((self.name, stage))
+        time.sleep(0.02)
+
+        if stage == self.failIn:
+            raise RuntimeError('Failed on purpose.')
+
+    # -------------------------------------------------------------------------
+    # train
+    # -------------------------------------------------------------------------
+    def train(self, jarFile):
+
+        self._stage(PipelineScheduler.TRAIN)
+
+
+# -----------------------------------------------------------------------------
+# class PipelineSchedulerTestCase
+#
+# python -m unittest model.tests.test_PipelineScheduler
+# -----------------------------------------------------------------------------
+class PipelineSchedulerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # testBackpressure
+    # -------------------------------------------------------------------------
+    def testBackpressure(self):
+
+        log = []
+        requests = [FakeRequest(i, log) for i in range(6)]
+        gate = threading.Event()
+
+        # Training stalls until released, so only maxPrepared requests may
+        # be prepared ahead of it.
+        requests[0].train = lambda jarFile: gate.wait(5)
+
+        scheduler = PipelineScheduler(numPreparing=2, maxPrepared=2)
+        thread = threading.Thread(target=scheduler.run,
+                                  args=([(r.name, r) for r in requests],))
+
+        thread.start()
+        time.sleep(0.3)
+
+        prepared = [name for name, stage in log
+                    if stage == PipelineScheduler.PREPARE]
+
+        gate.set()
+        thread.join(5)
+
+        # Request 0 is training, and 1 and 2 wait for it.
+        self.assertEqual(sorted(prepared), [0, 1, 2])
+        self.assertFalse(thread.is_alive())
+
+    # -------------------------------------------------------------------------
+    # testFailure
+    # -------------------------------------------------------------------------
+    def testFailure(self):
+
+        log = []
+
+        requests = [FakeRequest('a', log, PipelineScheduler.PREPARE),
+                    FakeRequest('b', log, PipelineScheduler.TRAIN),
+                    FakeRequest('c', log)]
+
+        scheduler = PipelineScheduler()
+
+        succeeded, failures = scheduler.run([(r.name, r) for r in requests])
+
+        self.assertEqual(succeeded, ['c'])
+        self.assertEqual(sorted(failures), ['a', 'b'])
+        self.assertTrue(failures['b'].startswith(PipelineScheduler.TRAIN))
+        self.assertNotIn(('a', PipelineScheduler.TRAIN), log)
+        self.assertNotIn(('b', PipelineScheduler.FINISH), log)
+        self.assertEqual(scheduler.run([]), ([], {}))
+
+    # -------------------------------------------------------------------------
+    # testOverlap
+    # -------------------------------------------------------------------------
+    def testOverlap(self):
+
+        log = []
+        requests = [FakeRequest(i, log) for i in range(4)]
+
+        # Each request trains only once the next is prepared, which never
+        # happens when the stages run one after another.
+        for request, nextRequest in zip(requests, requests[1:]):
+
+            def train(jarFile, request=request, nextRequest=nextRequest):
+
+                if not nextRequest.prepared.wait(5):
+                    raise RuntimeError('Preparation did not overlap.')
+
+                request._stage(PipelineScheduler.TRAIN)
+
+            request.train = train
+
+        scheduler = PipelineScheduler(numTraining=2)
+
+        succeeded, failures = scheduler.run([(r.name, r) for r in requests])
+
+        self.assertEqual(failures, {})
+        self.assertEqual(sorted(succeeded), [0, 1, 2, 3])
+        self.assertEqual([r.numJvms for r in requests], [2, 2, 2, 2])
+
+        for request in requests:
+
+            stages = [stage for name, stage in log if name == request.name]
+
+            self.assertEqual(stages, [PipelineScheduler.PREPARE,
+                                      PipelineScheduler.TRAIN,
+                                      PipelineScheduler.FINISH])
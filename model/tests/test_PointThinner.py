@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy
+
+from osgeo.osr import SpatialReference
+
+from maxent.model.PointThinner import PointThinner
+from maxent.model.TargetGrid import TargetGrid
+
+
+# -----------------------------------------------------------------------------
+# class PointThinnerTestCase
+#
+# python -m unittest model.tests.test_PointThinner
+# -----------------------------------------------------------------------------
+class PointThinnerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        srs = SpatialReference()
+        srs.ImportFromEPSG(4326)
+        self._grid = TargetGrid(0, 10, 1, 10, 10, srs)
+
+        self._xs = numpy.array([0.1, 0.2, 0.3, 5.5, 0.9, 5.1])
+        self._ys = numpy.array([9.9, 9.8, 9.7, 4.5, 9.1, 4.9])
+
+    # -------------------------------------------------------------------------
+    # testCell
+    # -------------------------------------------------------------------------
+    def testCell(self):
+
+        thinner = PointThinner(PointThinner.CELL)
+        keep = thinner.thin(self._xs, self._ys, self._grid)
+
+        self.assertEqual(keep.tolist(),
+                         [True, False, False, True, False, False])
+
+        self.assertIn('removed 4 of 6', thinner.report())
+
+    # -------------------------------------------------------------------------
+    # testDistance
+    # -------------------------------------------------------------------------
+    def testDistance(self):
+
+        random = numpy.random.RandomState(0)
+        xs = random.uniform(0, 10, 2000)
+        ys = random.uniform(0, 10, 2000)
+        distance = 0.5
+
+        keep = PointThinner(PointThinner.DISTANCE, distance).thin(xs, ys)
+
+        keptXs = xs[keep]
+        keptYs = ys[keep]
+        dx = keptXs[:, None] - keptXs[None, :]
+        dy = keptYs[:, None] - keptYs[None, :]
+        squared = dx * dx + dy * dy
+        numpy.fill_diagonal(squared, numpy.inf)
+
+        self.assertGreaterEqual(squared.min(), distance * distance)
+
+        self.assertGreater(keep.sum(), 100)
+
+    # -------------------------------------------------------------------------
+    # testDistanceMatchesGreedy
+    # -------------------------------------------------------------------------
+    def testDistanceMatchesGreedy(self):
+
+        # The second point conflicts with the first, so the third, in the
+        # same bin as the second, is kept.
+        keep = PointThinner(PointThinner.DISTANCE, 1).thin([0, 0.8, 1.2],
+                                                           [0, 0, 0])
+
+        self.assertEqual(numpy.flatnonzero(keep).tolist(), [0, 2])
+
+        # Only points closer than the distance conflict.
+        keep = PointThinner(PointThinner.DISTANCE, 5).thin([0, 3, 3.1],
+                                                           [0, 4, 4])
+
+        self.assertEqual(numpy.flatnonzero(keep).tolist(), [0, 1])
+
+        # Clusters and chains, like hotspots and transects.
+        random = numpy.random.RandomState(1)
+        xs = numpy.r_[random.normal(3, 0.3, 500),
+                      numpy.linspace(0, 10, 500),
+                      random.uniform(0, 10, 500)]
+
+        ys = numpy.r_[random.normal(3, 0.3, 500),
+                      numpy.full(500, 7.0),
+                      random.uniform(0, 10, 500)]
+
+        order = random.permutation(len(xs))
+        xs = xs[order]
+        ys = ys[order]
+        distance = 0.4
+
+        # Visit the points in order, keeping each one no closer than the
+        # distance to every point kept so far.
+        expected = []
+
+        for i in range(len(xs)):
+
+            dx = xs[expected] - xs[i]
+            dy = ys[expected] - ys[i]
+
+            if not numpy.any(dx * dx + dy * dy < distance * distance):
+                expected.append(i)
+
+        keep = PointThinner(PointThinner.DISTANCE, distance).thin(xs, ys)
+
+        self.assertEqual(numpy.flatnonzero(keep).tolist(), expected)
+
+    # -------------------------------------------------------------------------
+    # testInvalid
+    # -------------------------------------------------------------------------
+    def testInvalid(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'Invalid thinning mode'):
+            PointThinner('nearest')
+
+        with self.assertRaisesRegex(RuntimeError, 'positive integer'):
+            PointThinner(PointThinner.MAX_PER_CELL, 1.5)
+
+        with self.assertRaisesRegex(RuntimeError, 'positive distance'):
+            PointThinner(PointThinner.DISTANCE)
+
+    # -------------------------------------------------------------------------
+    # testMaxPerCell
+    # -------------------------------------------------------------------------
+    def testMaxPerCell(self):
+
+        keep = PointThinner(PointThinner.MAX_PER_CELL, 2).thin(self._xs,
+                                                               self._ys,
+                                                               self._grid)
+
+        self.assertEqual(keep.tolist(),
+                         [True, True, False, True, False, True])
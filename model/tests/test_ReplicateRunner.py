@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from maxent.model.ReplicateRunner import ReplicateRunner
+
+
+# -----------------------------------------------------------------------------
+# class ReplicateRunnerTestCase
+#
+# python -m unittest model.tests.test_ReplicateRunner
+# -----------------------------------------------------------------------------
+class ReplicateRunnerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._outDir = tempfile.mkdtemp()
+        self._samplesFile = os.path.join(self._outDir, 'samples.csv')
+
+        with open(self._samplesFile, 'w') as csvFile:
+
+            writer = csv.writer(csvFile, delimiter=',')
+            writer.writerow(['species', 'x', 'y'])
+
+            for i in range(10):
+                writer.writerow(['Cheat_Grass', i, i])
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._outDir)
+
+    # -------------------------------------------------------------------------
+    # testBootstrap
+    # -------------------------------------------------------------------------
+    def testBootstrap(self):
+
+        runner = ReplicateRunner(self._samplesFile,
+                                 self._outDir,
+                                 self._outDir,
+                                 3,
+                                 ReplicateRunner.BOOTSTRAP)
+
+        for train, test in runner.partition():
+
+            self.assertEqual(len(train), 10)
+
+            self.assertEqual(len(numpy.intersect1d(train, test)), 0)
+
+            self.assertEqual(len(numpy.union1d(train, test)), 10)
+
+    # -------------------------------------------------------------------------
+    # testCrossValidate
+    # -------------------------------------------------------------------------
+    def testCrossValidate(self):
+
+        runner = ReplicateRunner(self._samplesFile,
+                                 self._outDir,
+                                 self._outDir,
+                                 5,
+                                 seed=3)
+
+        partitions = runner.partition()
+        tests = numpy.sort(numpy.concatenate([p[1] for p in partitions]))
+
+        self.assertEqual(tests.tolist(), list(range(10)))
+
+        for i, (train, test) in enumerate(partitions):
+
+            self.assertEqual(len(train), 8)
+
+            with open(os.path.join(runner.replicateDirectory(i),
+                                   'test.csv')) as csvFile:
+
+                rows = list(csv.reader(csvFile))
+
+            self.assertEqual(rows[0], ['species', 'x', 'y'])
+            self.assertEqual([int(row[1]) for row in rows[1:]], test.tolist())
+
+        # The same seed gives the same partitions.
+        again = ReplicateRunner(self._samplesFile,
+                                self._outDir,
+                                self._outDir,
+                                5,
+                                seed=3).partition()
+
+        for (train, test), (train2, test2) in zip(partitions, again):
+            self.assertEqual(test.tolist(), test2.tolist())
+
+    # -------------------------------------------------------------------------
+    # testInvalidType
+    # -------------------------------------------------------------------------
+    def testInvalidType(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'Invalid replicate type'):
+
+            ReplicateRunner(self._samplesFile,
+                            self._outDir,
+                            self._outDir,
+                            replicateType='jackknife')
+
+    # -------------------------------------------------------------------------
+    # testProjection
+    # -------------------------------------------------------------------------
+    def testProjection(self):
+
+        layerDir = os.path.join(self._outDir, 'asc')
+
+        runner = ReplicateRunner(self._samplesFile,
+                                 os.path.join(self._outDir, 'swd.csv'),
+                                 self._outDir,
+                                 2,
+                                 projectionLayers=layerDir)
+
+        runner.partition()
+
+        self.assertIn('projectionlayers="' + layerDir + '"',
+                      runner.command(0))
+
+        # Requested projections that were not written are an error.
+        with self.assertRaisesRegex(RuntimeError, 'not projected'):
+            runner.aggregate()
+
+    # -------------------------------------------------------------------------
+    # testSubsample
+    # -------------------------------------------------------------------------
+    def testSubsample(self):
+
+        runner = ReplicateRunner(self._samplesFile,
+                                 self._outDir,
+                                 self._outDir,
+                                 4,
+                                 ReplicateRunner.SUBSAMPLE,
+                                 testPercent=30)
+
+        for train, test in runner.partition():
+
+            self.assertEqual(len(train), 7)
+            self.assertEqual(len(test), 3)
+
+        command = runner.command(0, 'maxent.jar')
+
+        self.assertIn('testsamplesfile="' +
+                      os.path.join(runner.replicateDirectory(0), 'test.csv'),
+                      command)
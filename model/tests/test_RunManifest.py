@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from maxent.model.RunManifest import RunManifest
+
+
+# -----------------------------------------------------------------------------
+# class RunManifestTestCase
+#
+# python -m unittest model.tests.test_RunManifest
+# -----------------------------------------------------------------------------
+class RunManifestTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._outputDir = tempfile.mkdtemp()
+        self._inputPath = self._write('input.csv', 'x,y\n1,2\n')
+        self._outputPath = self._write('output.csv', 'species,x,y\n')
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._outputDir)
+
+    # -------------------------------------------------------------------------
+    # _inputs
+    # -------------------------------------------------------------------------
+    def _inputs(self, manifest, seed=0):
+
+        return {'input': manifest.digest(self._inputPath), 'seed': seed}
+
+    # -------------------------------------------------------------------------
+    # testChangedInputs
+    # -------------------------------------------------------------------------
+    def testChangedInputs(self):
+
+        manifest = RunManifest(self._outputDir)
+        manifest.record('stage', self._inputs(manifest), [self._outputPath])
+
+        self.assertTrue(manifest.isCurrent('stage', self._inputs(manifest)))
+
+        self.assertFalse(manifest.isCurrent('stage',
+                                            self._inputs(manifest, 1)))
+
+        self._write('input.csv', 'x,y\n3,4\n')
+        os.utime(self._inputPath, (1, 1))
+
+        self.assertFalse(manifest.isCurrent('stage', self._inputs(manifest)))
+
+    # -------------------------------------------------------------------------
+    # testChangedOutputs
+    # -------------------------------------------------------------------------
+    def testChangedOutputs(self):
+
+        manifest = RunManifest(self._outputDir)
+        manifest.record('stage', self._inputs(manifest), [self._outputPath])
+
+        self._write('output.csv', 'species,x,y\nbird,1,2\n')
+        self.assertFalse(manifest.isCurrent('stage', self._inputs(manifest)))
+
+        os.remove(self._outputPath)
+        self.assertFalse(manifest.isCurrent('stage', self._inputs(manifest)))
+
+    # -------------------------------------------------------------------------
+    # testForce
+    # -------------------------------------------------------------------------
+    def testForce(self):
+
+        manifest = RunManifest(self._outputDir)
+        manifest.record('stage', self._inputs(manifest), [self._outputPath])
+
+        forced = RunManifest(self._outputDir, force=True)
+        self.assertFalse(forced.isCurrent('stage', self._inputs(forced)))
+
+        forced.setForce(False)
+        self.assertTrue(forced.isCurrent('stage', self._inputs(forced)))
+
+    # -------------------------------------------------------------------------
+    # testReload
+    # -------------------------------------------------------------------------
+    def testReload(self):
+
+        manifest = RunManifest(self._outputDir)
+        manifest.record('stage', self._inputs(manifest), [self._outputPath])
+
+        reloaded = RunManifest(self._outputDir)
+
+        self.assertTrue(reloaded.isCurrent('stage', self._inputs(reloaded)))
+        self.assertFalse(reloaded.isCurrent('other', {}))
+
+        self.assertEqual(reloaded.outputs('stage'),
+                         [os.path.abspath(self._outputPath)])
+
+    # -------------------------------------------------------------------------
+    # _write
+    # -------------------------------------------------------------------------
+    def _write(self, name, text):
+
+        path = os.path.join(self._outputDir, name)
+
+        with open(path, 'w') as outFile:
+            outFile.write(text)
+
+        return path
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from maxent.model.RunTrace import RunTrace
+
+
+# -----------------------------------------------------------------------------
+# recordInWorker
+#
+# This is the process pool's entry point.  It returns the worker's pid.
+# -----------------------------------------------------------------------------
+def recordInWorker(traceDir):
+
+    with RunTrace.recording(traceDir):
+
+        with RunTrace.stage('workerStage'):
+            pass
+
+    return os.getpid()
+
+
+# -----------------------------------------------------------------------------
+# class RunTraceTestCase
+#
+# python -m unittest model.tests.test_RunTrace
+# -----------------------------------------------------------------------------
+class RunTraceTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._traceDir = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        RunTrace.stop()
+        shutil.rmtree(self._traceDir)
+
+    # -------------------------------------------------------------------------
+    # testOff
+    # -------------------------------------------------------------------------
+    def testOff(self):
+
+        self.assertFalse(RunTrace.isTracing())
+
+        with RunTrace.stage('stage'):
+
+            with RunTrace.step('step'):
+                pass
+
+        self.assertIsNone(RunTrace.current())
+
+    # -------------------------------------------------------------------------
+    # testForkedWorkers
+    #
+    # Forked workers inherit the client's trace, and must still save theirs.
+    # -------------------------------------------------------------------------
+    def testForkedWorkers(self):
+
+        trace = RunTrace.start()
+
+        with concurrent.futures.ProcessPoolExecutor(
+                2, multiprocessing.get_context('fork')) as pool:
+
+            pids = set(pool.map(recordInWorker, [self._traceDir] * 4))
+
+        trace.merge(self._traceDir)
+
+        self.assertEqual([event['name'] for event in trace.events()],
+                         ['workerStage'] * 4)
+
+        self.assertEqual(set(event['pid'] for event in trace.events()), pids)
+        self.assertNotIn(os.getpid(), pids)
+
+    # -------------------------------------------------------------------------
+    # testRecordingAndMerge
+    # -------------------------------------------------------------------------
+    def testRecordingAndMerge(self):
+
+        with RunTrace.recording(self._traceDir):
+
+            with RunTrace.stage('workerStage'):
+                pass
+
+        self.assertFalse(RunTrace.isTracing())
+
+        trace = RunTrace.start()
+        trace.merge(self._traceDir)
+
+        self.assertEqual([event['name'] for event in trace.events()],
+                         ['workerStage'])
+
+        self.assertEqual(os.listdir(self._traceDir), [])
+
+    # -------------------------------------------------------------------------
+    # testStage
+    # -------------------------------------------------------------------------
+    def testStage(self):
+
+        trace = RunTrace.start()
+
+        with RunTrace.stage('outer', image='a.nc'):
+
+            with RunTrace.stage('inner'):
+
+                with RunTrace.step('write'):
+                    pass
+
+                with RunTrace.step('write'):
+                    pass
+
+        inner, outer = trace.events()
+
+        self.assertEqual((inner['name'], outer['name']), ('inner', 'outer'))
+        self.assertEqual(outer['args']['image'], 'a.nc')
+        self.assertIn('writeSeconds', inner['args'])
+        self.assertNotIn('writeSeconds', outer['args'])
+
+        for key in ('wallSeconds', 'cpuSeconds', 'peakRssMb', 'readBytes',
+                    'writtenBytes'):
+
+            self.assertIn(key, outer['args'])
+
+        tracePath = os.path.join(self._traceDir, RunTrace.TRACE_FILE)
+        RunTrace.stop().save(tracePath)
+
+        with open(tracePath) as traceFile:
+            events = json.load(traceFile)['traceEvents']
+
+        self.assertEqual(events[1]['ph'], 'X')
+        self.assertGreaterEqual(events[1]['dur'], events[0]['dur'])
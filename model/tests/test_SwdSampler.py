@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.SwdSampler import SwdSampler
+
+
+# -----------------------------------------------------------------------------
+# class SwdSamplerTestCase
+#
+# python -m unittest model.tests.test_SwdSampler
+# -----------------------------------------------------------------------------
+class SwdSamplerTestCase(unittest.TestCase):
+
+    GEO_TRANSFORM = (10.0, 0.5, 0.0, 20.0, 0.0, -0.5)
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._tempDir = tempfile.mkdtemp()
+
+        self._a = numpy.arange(30, dtype=numpy.float32).reshape(5, 6)
+        self._b = self._a * 2.0
+        self._b[1, 2] = LayerPreparer.NO_DATA
+        self._b[4, 5] = LayerPreparer.NO_DATA
+
+        self._ascPaths = [self.writeLayer('b', self._b),
+                          self.writeLayer('a', self._a)]
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._tempDir)
+
+    # -------------------------------------------------------------------------
+    # readSwd
+    #
+    # This returns the header and rows of an SWD file.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def readSwd(path):
+
+        with open(path) as csvFile:
+            rows = list(csv.reader(csvFile))
+
+        return rows[0], rows[1:]
+
+    # -------------------------------------------------------------------------
+    # testExtract
+    # -------------------------------------------------------------------------
+    def testExtract(self):
+
+        sampler = SwdSampler(self._ascPaths)
+
+        self.assertEqual(sampler.layerNames(), ['a', 'b'])
+
+        # Cell centers map back to their own cells; points off the grid do
+        # not.
+        xs, ys = sampler.cellCenters(numpy.array([0, 3]), numpy.array([5, 1]))
+        rows, cols, inside = sampler.cellIndexes(numpy.r_[xs, 9.9],
+                                                 numpy.r_[ys, 19.9])
+
+        self.assertEqual(rows[:2].tolist(), [0, 3])
+        self.assertEqual(cols[:2].tolist(), [5, 1])
+        self.assertEqual(inside.tolist(), [True, True, False])
+
+        values, valid = sampler.extract(numpy.array([0, 1, 4]),
+                                        numpy.array([5, 2, 5]))
+
+        numpy.testing.assert_array_equal(values[0], [5.0, 10.0])
+        self.assertEqual(values[1, 0], 8.0)
+        self.assertEqual(valid.tolist(), [True, False, False])
+
+    # -------------------------------------------------------------------------
+    # testMismatchedGrids
+    # -------------------------------------------------------------------------
+    def testMismatchedGrids(self):
+
+        self.writeLayer('b', self._b[:4])
+        sampler = SwdSampler(self._ascPaths)
+
+        with self.assertRaisesRegex(RuntimeError, 'same grid'):
+            sampler.extract(numpy.array([0]), numpy.array([0]))
+
+    # -------------------------------------------------------------------------
+    # testWrite
+    # -------------------------------------------------------------------------
+    def testWrite(self):
+
+        samplesPath = os.path.join(self._tempDir, 'samples.csv')
+        backgroundPath = os.path.join(self._tempDir, 'background.csv')
+
+        # The second point has no data in b and the third is off the grid.
+        xs = numpy.array([10.25, 11.25, 50.0])
+        ys = numpy.array([19.75, 19.25, 50.0])
+
+        sampler = SwdSampler(self._ascPaths, 10, seed=3)
+
+        numPresence, numBackground = sampler.write('Cassin\'s Sparrow',
+                                                   xs,
+                                                   ys,
+                                                   samplesPath,
+                                                   backgroundPath)
+
+        self.assertEqual((numPresence, numBackground), (1, 10))
+
+        header, samples = SwdSamplerTestCase.readSwd(samplesPath)
+
+        self.assertEqual(header, ['species', 'x', 'y', 'a', 'b'])
+        self.assertEqual(samples, [['Cassin\'s Sparrow', '10.25', '19.75',
+                                    '0', '0']])
+
+        header, background = SwdSamplerTestCase.readSwd(backgroundPath)
+
+        self.assertEqual(len(background), 10)
+        self.assertEqual(len(set((x, y) for s, x, y, a, b in background)),
+                         10)
+
+        for species, x, y, a, b in background:
+
+            self.assertEqual(species, SwdSampler.BACKGROUND_SPECIES)
+            self.assertNotEqual(float(b), LayerPreparer.NO_DATA)
+
+        # The same seed draws the same background, and another seed does
+        # not.
+        SwdSampler(self._ascPaths, 10, seed=3).write('s',
+                                                     xs,
+                                                     ys,
+                                                     samplesPath,
+                                                     backgroundPath)
+
+        self.assertEqual(SwdSamplerTestCase.readSwd(backgroundPath)[1],
+                         background)
+
+        SwdSampler(self._ascPaths, 10, seed=4).write('s',
+                                                     xs,
+                                                     ys,
+                                                     samplesPath,
+                                                     backgroundPath)
+
+        self.assertNotEqual(SwdSamplerTestCase.readSwd(backgroundPath)[1],
+                            background)
+
+    # -------------------------------------------------------------------------
+    # writeLayer
+    # -------------------------------------------------------------------------
+    def writeLayer(self, name, values):
+
+        ascPath = os.path.join(self._tempDir, name + '.asc')
+
+        with open(ascPath, 'w') as ascFile:
+
+            LayerPreparer.writeAsciiHeader(ascFile,
+                                           values.shape[1],
+                                           values.shape[0],
+                                           SwdSamplerTestCase.GEO_TRANSFORM)
+
+            LayerPreparer.writeAsciiBlock(ascFile, values)
+
+        return ascPath
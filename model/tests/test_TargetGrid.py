@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.IndexedImage import IndexedImage
+from maxent.model.LayerPreparer import LayerPreparer
+from maxent.model.TargetGrid import TargetGrid
+
+
+# -----------------------------------------------------------------------------
+# class TargetGridTestCase
+#
+# python -m unittest model.tests.test_TargetGrid
+# -----------------------------------------------------------------------------
+class TargetGridTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+        self._envelope = Envelope()
+        self._envelope.addPoint(374187, 4202663, 0, self._srs)
+        self._envelope.addPoint(501598, 4100640, 0, self._srs)
+        self._grid = TargetGrid.plan([], self._srs, self._envelope, 1000)
+        self._ascDir = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self._ascDir)
+
+    # -------------------------------------------------------------------------
+    # testCheckAlignment
+    # -------------------------------------------------------------------------
+    def testCheckAlignment(self):
+
+        aligned = self._writeHeader('aligned.asc', self._grid.ulx())
+        shifted = self._writeHeader('shifted.asc', self._grid.ulx() + 500)
+
+        self._grid.checkAlignment([aligned])
+
+        with self.assertRaisesRegex(RuntimeError, 'shifted.asc'):
+            self._grid.checkAlignment([aligned, shifted])
+
+    # -------------------------------------------------------------------------
+    # testPlan
+    # -------------------------------------------------------------------------
+    def testPlan(self):
+
+        grid = self._grid
+
+        self.assertEqual((grid.ulx(), grid.uly()), (374000, 4203000))
+        self.assertEqual((grid.lrx(), grid.lry()), (502000, 4100000))
+        self.assertEqual((grid.cols(), grid.rows()), (128, 103))
+
+        envelope = grid.envelope()
+
+        self.assertEqual([envelope.ulx(), envelope.uly(),
+                          envelope.lrx(), envelope.lry()],
+                         [374000, 4203000, 502000, 4100000])
+
+    # -------------------------------------------------------------------------
+    # testPlanFromIndex
+    # -------------------------------------------------------------------------
+    def testPlanFromIndex(self):
+
+        geographic = SpatialReference()
+        geographic.ImportFromEPSG(4326)
+
+        images = [IndexedImage('fine.tif',
+                               self._srs.ExportToWkt(),
+                               [300000, 4300000, 600000, 4000000],
+                               [250, 500]),
+                  IndexedImage('coarse.nc',
+                               geographic.ExportToWkt(),
+                               [-112, 38, -110, 37],
+                               [0.01, 0.01])]
+
+        # Like a transformation from degrees, so the diagonal of the
+        # transformed bounds spans as many cells of 1000.
+        def transform(xs, ys, fromSRS, toSRS):
+            return xs * 100000, ys * 100000
+
+        self.assertIsNone(IndexedImage('bare.tif',
+                                       self._srs.ExportToWkt())
+                          .naturalResolution(self._srs))
+
+        # Planning reads only the index entries, never the images.
+        with mock.patch.object(LayerPreparer,
+                               'naturalResolution',
+                               side_effect=AssertionError('Opened image')), \
+            mock.patch('maxent.model.IndexedImage.CoordinateTransformer.' +
+                       'transform',
+                       side_effect=transform):
+
+            self.assertAlmostEqual(images[1].naturalResolution(self._srs),
+                                   1000)
+
+            grid = TargetGrid.plan(images, self._srs, self._envelope)
+
+        self.assertEqual(grid.cellSize(), 250)
+        self.assertEqual((grid.ulx(), grid.uly()), (374000, 4202750))
+
+        # Images without metadata are still asked of GDAL.
+        with mock.patch.object(LayerPreparer,
+                               'naturalResolution',
+                               return_value=100) as natural:
+
+            grid = TargetGrid.plan([IndexedImage('bare.tif',
+                                                 self._srs.ExportToWkt())],
+                                   self._srs,
+                                   self._envelope)
+
+        natural.assert_called_once()
+        self.assertEqual(grid.cellSize(), 100)
+
+    # -------------------------------------------------------------------------
+    # _writeHeader
+    # -------------------------------------------------------------------------
+    def _writeHeader(self, name, ulx):
+
+        path = os.path.join(self._ascDir, name)
+        geoTransform = (ulx, 1000, 0, self._grid.uly(), 0, -1000)
+
+        with open(path, 'w') as ascFile:
+
+            LayerPreparer.writeAsciiHeader(ascFile,
+                                           self._grid.cols(),
+                                           self._grid.rows(),
+                                           geoTransform)
+
+        return path
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from celery import Celery
+
+from maxent.model.TaskCollector import TaskCollector
+
+
+# ---
+# An in-memory, eager Celery app: tasks run when they are submitted.
+# ---
+app = Celery('test_TaskCollector', broker='memory://')
+app.conf.task_always_eager = True
+
+
+@app.task
+def double(x):
+    return 2 * x
+
+
+@app.task
+def fail(x):
+    raise RuntimeError('Unable to open image ' + str(x))
+
+
+# -----------------------------------------------------------------------------
+# class FakeResult
+#
+# This is an AsyncResult that waits in the queue, PENDING, for queued
+# seconds, then runs, STARTED, for delay seconds.
+# -----------------------------------------------------------------------------
+class FakeResult(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, delay, value, queued=0):
+
+        self._startTime = time.time() + queued
+        self._readyTime = self._startTime + delay
+        self._value = value
+        self.revoked = False
+
+    # -------------------------------------------------------------------------
+    # get
+    # -------------------------------------------------------------------------
+    def get(self):
+
+        return self._value
+
+    # -------------------------------------------------------------------------
+    # ready
+    # -------------------------------------------------------------------------
+    def ready(self):
+
+        return time.time() >= self._readyTime
+
+    # -------------------------------------------------------------------------
+    # revoke
+    # -------------------------------------------------------------------------
+    def revoke(self, terminate=False):
+
+        self.revoked = True
+
+    # -------------------------------------------------------------------------
+    # state
+    # -------------------------------------------------------------------------
+    @property
+    def state(self):
+
+        if self.ready():
+            return 'SUCCESS'
+
+        return 'PENDING' if time.time() < self._startTime else 'STARTED'
+
+    # -------------------------------------------------------------------------
+    # successful
+    # -------------------------------------------------------------------------
+    def successful(self):
+
+        return True
+
+
+# -----------------------------------------------------------------------------
+# class FakeSignature
+#
+# Each submission takes the next delay in the list, after queued seconds in
+# the queue.
+# -----------------------------------------------------------------------------
+class FakeSignature(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, delays, value, queued=0):
+
+        self._delays = list(delays)
+        self._value = value
+        self._queued = queued
+        self.results = []
+
+    # -------------------------------------------------------------------------
+    # apply_async
+    # -------------------------------------------------------------------------
+    def apply_async(self):
+
+        self.results.append(FakeResult(self._delays.pop(0),
+                                       self._value,
+                                       self._queued))
+
+        return self.results[-1]
+
+
+# -----------------------------------------------------------------------------
+# class TaskCollectorTestCase
+#
+# python -m unittest model.tests.test_TaskCollector
+# -----------------------------------------------------------------------------
+class TaskCollectorTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # testEager
+    # -------------------------------------------------------------------------
+    def testEager(self):
+
+        results, failures = TaskCollector(pollInterval=0).collect(
+            [('a', double.s(1)), ('b', fail.s(2)), ('c', double.s(3))])
+
+        self.assertEqual(results, {'a': 2, 'c': 6})
+        self.assertEqual(list(failures), ['b'])
+        self.assertIn('Unable to open image 2', failures['b'])
+
+    # -------------------------------------------------------------------------
+    # testQueued
+    # -------------------------------------------------------------------------
+    def testQueued(self):
+
+        # Like more images than worker slots: each task waits behind the
+        # previous ones far longer than the timeout, but runs within it.
+        queued = [('queued' + str(i), FakeSignature([0.05], i, 0.05 * i))
+                  for i in range(8)]
+
+        collector = TaskCollector(0.2, 2.0, 0.01)
+        results, failures = collector.collect(queued)
+
+        self.assertEqual(failures, {})
+        self.assertEqual(results,
+                         dict(('queued' + str(i), i) for i in range(8)))
+
+        for label, signature in queued:
+            self.assertEqual(len(signature.results), 1)
+
+    # -------------------------------------------------------------------------
+    # testStraggler
+    # -------------------------------------------------------------------------
+    def testStraggler(self):
+
+        fast = [('fast' + str(i), FakeSignature([0.05], i))
+                for i in range(3)]
+
+        slow = FakeSignature([10, 0.05], 'slow')
+        collector = TaskCollector(stragglerFactor=2.0, pollInterval=0.01)
+
+        results, failures = collector.collect(fast + [('slow', slow)])
+
+        self.assertEqual(results['slow'], 'slow')
+        self.assertEqual(len(slow.results), 2)
+        self.assertTrue(slow.results[0].revoked)
+        self.assertEqual(failures, {})
+
+    # -------------------------------------------------------------------------
+    # testTimeout
+    # -------------------------------------------------------------------------
+    def testTimeout(self):
+
+        slow = FakeSignature([10], 'slow')
+        fast = FakeSignature([0], 1)
+        collector = TaskCollector(0.05, None, 0.01)
+
+        results, failures = collector.collect([('slow', slow),
+                                               ('fast', fast)])
+
+        self.assertEqual(results, {'fast': 1})
+        self.assertIn('Timed out', failures['slow'])
+        self.assertTrue(slow.results[0].revoked)
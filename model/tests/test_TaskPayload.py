@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import json
+import pickle
+import unittest
+
+from osgeo.osr import SpatialReference
+
+from core.model.Envelope import Envelope
+
+from maxent.model.TaskPayload import TaskPayload
+
+
+# -----------------------------------------------------------------------------
+# class TaskPayloadTestCase
+#
+# python -m unittest model.tests.test_TaskPayload
+# -----------------------------------------------------------------------------
+class TaskPayloadTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._srs = SpatialReference()
+        self._srs.ImportFromEPSG(32612)
+        self._envelope = Envelope()
+        self._envelope.addPoint(374187, 4202663, 0, self._srs)
+        self._envelope.addPoint(501598, 4100640, 0, self._srs)
+
+    # -------------------------------------------------------------------------
+    # testRoundTrip
+    # -------------------------------------------------------------------------
+    def testRoundTrip(self):
+
+        payload = TaskPayload.encode('/data/QV2M.nc',
+                                     self._srs,
+                                     self._envelope,
+                                     ascDir='/out/asc')
+
+        self.assertEqual(payload['srs'], 'EPSG:32612')
+
+        # The payload survives JSON, as Celery's JSON serializer sends it.
+        payload = json.loads(json.dumps(payload))
+        imagePath, srs, envelope = TaskPayload.decode(payload)
+
+        self.assertEqual(imagePath, '/data/QV2M.nc')
+        self.assertEqual(payload['ascDir'], '/out/asc')
+        self.assertTrue(srs.IsSame(self._srs))
+
+        self.assertEqual([envelope.ulx(), envelope.uly(),
+                          envelope.lrx(), envelope.lry()],
+                         [374187, 4202663, 501598, 4100640])
+
+        self.assertLess(TaskPayload.numBytes(payload),
+                        len(pickle.dumps((self._srs.ExportToProj4(),
+                                          self._envelope))))
+
+    # -------------------------------------------------------------------------
+    # testVersion
+    # -------------------------------------------------------------------------
+    def testVersion(self):
+
+        payload = TaskPayload.encode('/data/QV2M.nc',
+                                     self._srs,
+                                     self._envelope)
+
+        payload['version'] = TaskPayload.VERSION + 1
+
+        with self.assertRaisesRegex(RuntimeError, 'Unsupported'):
+            TaskPayload.decode(payload)
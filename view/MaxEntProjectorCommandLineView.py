@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import sys
+
+from maxent.model.MaxEntProjector import MaxEntProjector
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# view/MaxEntProjectorCommandLineView.py \
+#     -l /att/nobackup/rlgill/testMaxEnt/Cassin\'s_Sparrow.lambdas \
+#     -i /att/nobackup/rlgill/testMaxEnt2/asc \
+#     -o /att/nobackup/rlgill/testMaxEnt2/Cassins_projected.asc -p 16
+# -----------------------------------------------------------------------------
+def main():
+
+    # Process command-line args.
+    desc = 'This projects a trained MaxEnt model onto a set of layers.'
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('--format',
+                        default=MaxEntProjector.CLOGLOG,
+                        choices=[MaxEntProjector.CLOGLOG,
+                                 MaxEntProjector.LOGISTIC,
+                                 MaxEntProjector.RAW],
+                        help='Output format')
+
+    parser.add_argument('-i',
+                        default='.',
+                        help='Path to directory of prepared layers, or ' +
+                             'to a layer stack')
+
+    parser.add_argument('-l',
+                        required=True,
+                        help='Path to the .lambdas file maxent.jar wrote')
+
+    parser.add_argument('--no-clamp',
+                        action='store_true',
+                        help='Do not clamp features to their training range.')
+
+    parser.add_argument('-o',
+                        required=True,
+                        help='Path to the output ASCII grid')
+
+    parser.add_argument('-p',
+                        default=1,
+                        type=int,
+                        help='Number of processes')
+
+    args = parser.parse_args()
+
+    projector = MaxEntProjector(args.l, not args.no_clamp)
+    projector.project(args.i, args.o, args.format, args.p)
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
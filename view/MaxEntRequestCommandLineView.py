@@ -2,16 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import glob
+import os
 import sys
 
 from osgeo.osr import SpatialReference
 
-from core.model.GeospatialImageFile import GeospatialImageFile
-
+from maxent.model.ImageIndex import ImageIndex
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.LayerCache import LayerCache
+from maxent.model.MaxEntBatchRequest import MaxEntBatchRequest
+from maxent.model.MaxEntProjector import MaxEntProjector
 from maxent.model.MaxEntRequest import MaxEntRequest
-from maxent.model.MaxEntRequestCelery import MaxEntRequestCelery
+from maxent.model.MaxEntRequestParallel import MaxEntRequestParallel
 from maxent.model.ObservationFile import ObservationFile
+from maxent.model.PointThinner import PointThinner
+from maxent.model.ReplicateRunner import ReplicateRunner
+from maxent.model.RunTrace import RunTrace
+from maxent.model.SwdSampler import SwdSampler
 
 
 # -----------------------------------------------------------------------------
@@ -19,20 +26,87 @@ from maxent.model.ObservationFile import ObservationFile
 #
 # cd innovation-lab
 # export PYTHONPATH=`pwd`
-# view/MerraRequestCLV.py -e -125 50 -66 24 --epsg 4326 --start_date 2013-02-03 --end_date 2013-03-12 -c m2t1nxslv --vars QV2M TS --op avg -o /att/nobackup/rlgill/testMaxEnt/merra
-# view/MaxEntRequestCommandLineView.py -e 4326 -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra -o /att/nobackup/rlgill/testMaxEnt
+# view/MerraRequestCLV.py -e -125 50 -66 24 --epsg 4326 \
+#     --start_date 2013-02-03 --end_date 2013-03-12 -c m2t1nxslv \
+#     --vars QV2M TS --op avg -o /att/nobackup/rlgill/testMaxEnt/merra
+# view/MaxEntRequestCommandLineView.py -e 4326 \
+#     -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv \
+#     -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra \
+#     -o /att/nobackup/rlgill/testMaxEnt
+#
+# Several species
+# view/MaxEntRequestCommandLineView.py -e 4326 \
+#     -f /att/nobackup/rlgill/maxEntData/ebd_1989.csv --all-species \
+#     -i /att/nobackup/rlgill/testMaxEnt/merra \
+#     -o /att/nobackup/rlgill/testMaxEnt --jvms 8
+#
+# Ten-fold cross-validation
+# view/MaxEntRequestCommandLineView.py -e 4326 \
+#     -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv \
+#     -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra \
+#     -o /att/nobackup/rlgill/testMaxEnt --replicates 10
+#
+# Local process pool
+# view/MaxEntRequestCommandLineView.py -e 4326 \
+#     -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv \
+#     -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra \
+#     -o /att/nobackup/rlgill/testMaxEnt --workers 64
 #
 # Celery
 # redis-server&
 # celery -A maxent.model.CeleryConfiguration worker --loglevel=info&
-# view/MaxEntRequestCommandLineView.py -e 4326 -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra -o /att/nobackup/rlgill/testMaxEnt --celery
+# view/MaxEntRequestCommandLineView.py -e 4326 \
+#     -f /att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv \
+#     -s "Cassin's Sparrow" -i /att/nobackup/rlgill/testMaxEnt/merra \
+#     -o /att/nobackup/rlgill/testMaxEnt --celery
 # -----------------------------------------------------------------------------
 def main():
 
+    args = parseArgs()
+
+    if args.trace:
+        RunTrace.start()
+
+    try:
+        runRequest(args)
+
+    finally:
+
+        if args.trace:
+
+            tracePath = os.path.join(args.o, RunTrace.TRACE_FILE)
+            RunTrace.stop().save(tracePath)
+            print('Wrote trace ' + tracePath)
+
+
+# -----------------------------------------------------------------------------
+# parseArgs
+#
+# This parses and validates the command line, or argv.
+# -----------------------------------------------------------------------------
+def parseArgs(argv=None):
+
     # Process command-line args.
     desc = 'This application runs Maximum Entropy.'
     parser = argparse.ArgumentParser(description=desc)
 
+    parser.add_argument('--all-species',
+                        action='store_true',
+                        help='Model every species in the observation file.')
+
+    parser.add_argument('--background',
+                        default=SwdSampler.DEFAULT_NUM_BACKGROUND,
+                        type=int,
+                        help='Number of background points in SWD mode')
+
+    parser.add_argument('--cache',
+                        help='Path to a shared cache of prepared layers')
+
+    parser.add_argument('--cache-size',
+                        default=50,
+                        type=float,
+                        help='Size limit of the layer cache in GB')
+
     parser.add_argument('--celery',
                         action='store_true',
                         help='Use Celery for distributed processing.')
@@ -47,36 +121,251 @@ def main():
                         required=True,
                         help='Path to observation file')
 
+    parser.add_argument('--force',
+                        action='store_true',
+                        help='Re-run every stage, even those whose inputs ' +
+                             'are unchanged since the last run in the ' +
+                             'output directory.')
+
+    parser.add_argument('--heap',
+                        type=int,
+                        help='maxent.jar heap size in MB, instead of the ' +
+                             'planned size')
+
     parser.add_argument('-i',
                         default='.',
                         help='Path to directory of image files')
 
+    parser.add_argument('--jvms',
+                        default=1,
+                        type=int,
+                        help='Number of concurrent maxent.jar processes ' +
+                             'when modeling several species')
+
+    parser.add_argument('--mxe',
+                        action='store_true',
+                        help='Convert layers to maxent.jar\'s binary .mxe ' +
+                             'format before running it.')
+
     parser.add_argument('-o',
                         default='.',
                         help='Path to output directory')
 
+    parser.add_argument('--project',
+                        action='store_true',
+                        help='In SWD mode, also project the model onto ' +
+                             'the full grid.')
+
+    parser.add_argument('--projection',
+                        choices=[MaxEntProjector.CLOGLOG,
+                                 MaxEntProjector.LOGISTIC,
+                                 MaxEntProjector.RAW],
+                        help='After training, project the model onto the ' +
+                             'prepared layers in this format, without ' +
+                             'a JVM.')
+
+    parser.add_argument('--replicates',
+                        default=0,
+                        type=int,
+                        help='Number of replicate models, each run in ' +
+                             'its own maxent.jar')
+
+    parser.add_argument('--replicate-type',
+                        default=ReplicateRunner.CROSSVALIDATE,
+                        choices=[ReplicateRunner.BOOTSTRAP,
+                                 ReplicateRunner.CROSSVALIDATE,
+                                 ReplicateRunner.SUBSAMPLE],
+                        help='How samples are partitioned among replicates')
+
+    parser.add_argument('--resolution',
+                        type=float,
+                        help='Cell size of the grid every layer is warped ' +
+                             'onto, in units of the images\' SRS')
+
     parser.add_argument('-s',
-                        required=True,
-                        help='Name of species in observation file')
+                        nargs='+',
+                        help='Names of species in observation file')
+
+    parser.add_argument('--seed',
+                        default=0,
+                        type=int,
+                        help='Seed for sampling SWD background points')
+
+    parser.add_argument('--stack',
+                        action='store_true',
+                        help='Also write the prepared layers as one ' +
+                             'memory-mapped stack in the output directory.')
+
+    parser.add_argument('--task-timeout',
+                        type=float,
+                        help='With --celery, seconds an image\'s task may ' +
+                             'run before it fails')
+
+    parser.add_argument('--test-percent',
+                        default=25,
+                        type=int,
+                        help='Percentage of samples held out for testing ' +
+                             'subsample replicates')
+
+    parser.add_argument('--swd',
+                        action='store_true',
+                        help='Fit the model in samples-with-data mode.')
+
+    parser.add_argument('--thin',
+                        choices=[PointThinner.CELL,
+                                 PointThinner.DISTANCE,
+                                 PointThinner.MAX_PER_CELL],
+                        help='Thin presence points to one per cell of the ' +
+                             'target grid, to at most --thin-value per ' +
+                             'cell, or to points at least --thin-value ' +
+                             'apart.  Distance thinning is greedy, in ' +
+                             'file order, and loops over the points.')
+
+    parser.add_argument('--thin-value',
+                        type=float,
+                        help='Points per cell or minimum distance, in ' +
+                             'units of the images\' SRS, for --thin')
+
+    parser.add_argument('--threads',
+                        type=int,
+                        help='maxent.jar threads, instead of the planned ' +
+                             'number')
+
+    parser.add_argument('--tile-rows',
+                        type=int,
+                        help='With --celery, split images taller than ' +
+                             'this into tiles prepared by separate tasks.')
+
+    parser.add_argument('--trace',
+                        action='store_true',
+                        help='Write the time, CPU, memory and I/O of every ' +
+                             'stage to ' + RunTrace.TRACE_FILE + ' in the ' +
+                             'output directory, as a Chrome trace.')
+
+    parser.add_argument('--workers',
+                        default=1,
+                        type=int,
+                        help='Number of local processes preparing layers')
+
+    args = parser.parse_args(argv)
+
+    if args.celery and args.workers > 1:
+        parser.error('--celery and --workers are mutually exclusive.')
+
+    if args.tile_rows and (not args.celery or args.cache):
+        parser.error('--tile-rows requires --celery and excludes --cache.')
+
+    if not args.s and not args.all_species:
+        parser.error('Specify species with -s or --all-species.')
+
+    batch = args.all_species or len(args.s) > 1
+
+    if batch and (args.mxe or args.swd or args.replicates or args.thin or
+                  args.stack or args.projection):
+
+        parser.error('Several species run without --mxe, --swd, ' +
+                     '--replicates, --thin, --stack or --projection.')
+
+    if args.replicates == 1 or args.replicates < 0:
+        parser.error('--replicates must be zero or at least two.')
+
+    if args.replicates and args.projection:
+        parser.error('--projection requires one model, not --replicates.')
 
-    args = parser.parse_args()
+    return args
 
+
+# -----------------------------------------------------------------------------
+# runRequest
+# -----------------------------------------------------------------------------
+def runRequest(args):
+
+    batch = args.all_species or len(args.s) > 1
     srs = SpatialReference()
     srs.ImportFromEPSG(args.e)
 
-    imageFiles = glob.glob(args.i + '/*.nc')
-    geoImages = [GeospatialImageFile(i, srs) for i in imageFiles]
-    observationFile = ObservationFile(args.f, args.s)
+    # Only new or changed images are opened.  See ImageIndex.
+    imageIndex = ImageIndex(args.i).update()
+    geoImages = imageIndex.images(srs)
+
+    print('Indexed ' + str(len(geoImages)) + ' images, opening ' +
+          str(imageIndex.numOpened()) + '.')
+    jvmPlanner = JvmPlanner(args.heap, args.threads)
+    layerCache = None
+
+    if args.cache:
+
+        layerCache = LayerCache(args.cache,
+                                int(args.cache_size * 1024 ** 3))
+
+    # A batch's request only prepares its layers.
+    observationFile = None if batch else ObservationFile(args.f, args.s[0])
 
     if args.celery:
 
-        maxEntReq = MaxEntRequestCelery(observationFile, geoImages, args.o)
+        # Celery is slow to import, so it is only imported when used.
+        from maxent.model.MaxEntRequestCelery import MaxEntRequestCelery
+
+        maxEntReq = MaxEntRequestCelery(observationFile,
+                                        geoImages,
+                                        args.o,
+                                        layerCache)
+
+        maxEntReq.setTileRows(args.tile_rows)
+        maxEntReq.setTaskTimeout(args.task_timeout)
+
+    elif args.workers > 1:
+
+        maxEntReq = MaxEntRequestParallel(observationFile,
+                                          geoImages,
+                                          args.o,
+                                          layerCache,
+                                          args.workers)
 
     else:
-        maxEntReq = MaxEntRequest(observationFile, geoImages, args.o)
+        maxEntReq = MaxEntRequest(observationFile,
+                                  geoImages,
+                                  args.o,
+                                  layerCache)
+
+    if batch:
+
+        species = None if args.all_species else args.s
+
+        batchReq = MaxEntBatchRequest(args.f,
+                                      geoImages,
+                                      args.o,
+                                      species,
+                                      layerCache,
+                                      args.jvms,
+                                      maxEntReq)
+
+        batchReq.setForce(args.force)
+        batchReq.setJvmPlanner(jvmPlanner)
+        batchReq.setResolution(args.resolution)
+        batchReq.run()
+        return
+
+    maxEntReq.setForce(args.force)
+    maxEntReq.setJvmPlanner(jvmPlanner)
+    maxEntReq.setResolution(args.resolution)
+
+    if args.thin:
+        maxEntReq.setPointThinner(PointThinner(args.thin, args.thin_value))
+
+    maxEntReq.setUseMxe(args.mxe)
+    maxEntReq.setUseStack(args.stack)
+    maxEntReq.setProjection(args.projection)
+    maxEntReq.setSwd(args.swd, args.background, args.seed, args.project)
+
+    maxEntReq.setReplicates(args.replicates,
+                            args.replicate_type,
+                            args.test_percent,
+                            args.seed)
 
     maxEntReq.run()
 
+
 # ------------------------------------------------------------------------------
 # Invoke the main
 # ------------------------------------------------------------------------------
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import sys
+
+from maxent.model.JvmPlanner import JvmPlanner
+from maxent.model.LayerCache import LayerCache
+from maxent.model.MaxEntService import MaxEntService
+
+
+# -----------------------------------------------------------------------------
+# main
+#
+# view/MaxEntServiceCommandLineView.py --workers 4 \
+#     --cache /att/nobackup/rlgill/layerCache
+# curl -d '{"observationFile":
+#               "/att/nobackup/rlgill/maxEntData/ebd_Cassins_1989.csv",
+#           "species": "Cassin'"'"'s Sparrow",
+#           "epsg": 4326,
+#           "imageDir": "/att/nobackup/rlgill/testMaxEnt/merra",
+#           "outputDir": "/att/nobackup/rlgill/testMaxEnt"}' \
+#     localhost:8765/requests
+# curl localhost:8765/status
+# -----------------------------------------------------------------------------
+def main():
+
+    # Process command-line args.
+    desc = 'This application runs Maximum Entropy requests as a service.'
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument('--cache',
+                        help='Path to a shared cache of prepared layers')
+
+    parser.add_argument('--cache-size',
+                        default=50,
+                        type=float,
+                        help='Size limit of the layer cache in GB')
+
+    parser.add_argument('--heap',
+                        type=int,
+                        help='maxent.jar heap size in MB, instead of the ' +
+                             'planned size')
+
+    parser.add_argument('--host',
+                        default=MaxEntService.DEFAULT_HOST,
+                        help='Address to listen on')
+
+    parser.add_argument('--port',
+                        default=MaxEntService.DEFAULT_PORT,
+                        type=int,
+                        help='Port to listen on')
+
+    parser.add_argument('--preparing',
+                        default=1,
+                        type=int,
+                        help='Number of requests whose layers are ' +
+                             'prepared at once, while others train')
+
+    parser.add_argument('--queue',
+                        default=MaxEntService.DEFAULT_MAX_QUEUED,
+                        type=int,
+                        help='Number of requests that may wait for the ' +
+                             'pipeline before more are refused')
+
+    parser.add_argument('--threads',
+                        type=int,
+                        help='maxent.jar threads, instead of the planned ' +
+                             'number')
+
+    parser.add_argument('--workers',
+                        default=1,
+                        type=int,
+                        help='Number of requests, and maxent.jar ' +
+                             'processes, trained at once')
+
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.queue < 1 or args.preparing < 1:
+        parser.error('--workers, --preparing and --queue must be positive.')
+
+    layerCache = None
+
+    if args.cache:
+
+        layerCache = LayerCache(args.cache,
+                                int(args.cache_size * 1024 ** 3))
+
+    service = MaxEntService(args.workers,
+                            args.queue,
+                            layerCache,
+                            JvmPlanner(args.heap, args.threads),
+                            numPreparing=args.preparing).start()
+
+    host, port = service.listen(args.host, args.port)
+    print('Serving MaxEnt requests on ' + host + ':' + str(port))
+
+    try:
+        service.serveForever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        service.stop()
+
+
+# ------------------------------------------------------------------------------
+# Invoke the main
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import tempfile
+import unittest
+from unittest import mock
+
+from maxent.view import MaxEntRequestCommandLineView as view
+
+
+# -----------------------------------------------------------------------------
+# class MaxEntRequestCommandLineViewTestCase
+#
+# This drives runRequest with parsed arguments, replacing the requests and
+# the image index, so no images are read and maxent.jar does not run.
+#
+# python -m unittest view.tests.test_MaxEntRequestCommandLineView
+# -----------------------------------------------------------------------------
+class MaxEntRequestCommandLineViewTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # runRequest
+    #
+    # This runs runRequest on a command line, and returns the mocks of the
+    # batch and single-species request classes.
+    # -------------------------------------------------------------------------
+    def runRequest(self, argv):
+
+        with tempfile.TemporaryDirectory() as outputDir, \
+                mock.patch.object(view, 'SpatialReference'), \
+                mock.patch.object(view, 'ImageIndex'), \
+                mock.patch.object(view, 'ObservationFile'), \
+                mock.patch.object(view, 'MaxEntBatchRequest') as batch, \
+                mock.patch.object(view, 'MaxEntRequest') as single:
+
+            view.runRequest(view.parseArgs(['-e', '4326',
+                                            '-f', 'obs.csv',
+                                            '-o', outputDir] + argv))
+
+        return batch, single
+
+    # -------------------------------------------------------------------------
+    # testBatch
+    # -------------------------------------------------------------------------
+    def testBatch(self):
+
+        batch, single = self.runRequest(['-s', 'a', 'b', '--jvms', '2'])
+
+        self.assertEqual(batch.call_args[0][3], ['a', 'b'])
+        batch.return_value.run.assert_called_once_with()
+
+        # The single-species request only prepares the batch's layers.
+        self.assertIsNone(single.call_args[0][0])
+        self.assertIs(batch.call_args[0][6], single.return_value)
+        single.return_value.run.assert_not_called()
+
+    # -------------------------------------------------------------------------
+    # testSingleSpecies
+    # -------------------------------------------------------------------------
+    def testSingleSpecies(self):
+
+        batch, single = self.runRequest(['-s', 'a', '--stack'])
+
+        batch.assert_not_called()
+        single.return_value.setUseStack.assert_called_once_with(True)
+        single.return_value.run.assert_called_once_with()